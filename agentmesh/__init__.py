@@ -15,8 +15,12 @@ from agentmesh.protocal.task import Task
 from agentmesh.protocal.result import TeamResult
 from agentmesh.models import LLMModel
 from agentmesh.common.utils.log import setup_logging
+from agentmesh.common.utils.cancellation import CancellationToken
+from agentmesh.common.utils.hooks import RunHooks
+from agentmesh.common.utils.tracing import Tracer, set_tracer
 
 # Setup logging when the package is imported
 setup_logging()
 
-__all__ = ['AgentTeam', 'Agent', 'LLMModel', 'Task', 'TeamResult']
+__all__ = ['AgentTeam', 'Agent', 'LLMModel', 'Task', 'TeamResult', 'CancellationToken', 'RunHooks', 'Tracer',
+           'set_tracer']
@@ -1,7 +1,12 @@
 from agentmesh.common.config.config_manager import config, load_config
+from agentmesh.common.utils.cancellation import CancellationToken, TaskCancelledError
+from agentmesh.common.utils.hooks import RunHooks
 from agentmesh.common.utils.loading_indicator import LoadingIndicator
 from agentmesh.common.utils.log import logger, get_logger, setup_logging, set_log_level
+from agentmesh.common.utils.tracing import Tracer, InMemorySpanExporter, JsonlSpanExporter, SpanExporter, set_tracer, \
+    get_tracer
 from agentmesh.models.model_factory import ModelFactory
 
-__all__ = ['config', 'load_config', 'LoadingIndicator', 'ModelFactory',
+__all__ = ['config', 'load_config', 'LoadingIndicator', 'ModelFactory', 'CancellationToken', 'TaskCancelledError',
+           'RunHooks', 'Tracer', 'SpanExporter', 'InMemorySpanExporter', 'JsonlSpanExporter', 'set_tracer', 'get_tracer',
            'logger', 'setup_logging', 'get_logger', 'set_log_level']
@@ -0,0 +1,153 @@
+import threading
+import time
+from typing import Callable, Optional
+
+# Status code of model responses and stream chunks of calls aborted by a cancellation token
+CANCELLED_STATUS_CODE = 499
+
+
+class TaskCancelledError(Exception):
+    """Raised when work is abandoned because its cancellation token was cancelled or its deadline passed."""
+
+    def __init__(self, reason: str = "cancelled"):
+        super().__init__(f"Task {reason}")
+        self.reason = reason
+
+
+class CancellationToken:
+    """
+    Cooperative cancellation for a team run. The token is cancelled explicitly with `cancel` or implicitly
+    once its wall-clock deadline has passed. Model calls, agents and tools check it between units of work,
+    and callbacks registered with `on_cancel` abort work that is blocked, such as an in-flight stream.
+    """
+    CANCELLED = "cancelled"
+    TIMEOUT = "timeout"
+
+    def __init__(self, deadline: Optional[float] = None):
+        """
+        Initialize the CancellationToken.
+
+        :param deadline: Optional wall-clock deadline as a time.time() timestamp.
+        """
+        self.deadline = deadline
+        self._event = threading.Event()
+        self._reason = None
+        self._callbacks = []
+        self._lock = threading.Lock()
+        self._timer = None
+        self._detach = None
+        if deadline is not None:
+            # Fire the callbacks when the deadline passes, even if nobody checks the token
+            self._timer = threading.Timer(max(deadline - time.time(), 0), self.cancel, args=(self.TIMEOUT,))
+            self._timer.daemon = True
+            self._timer.start()
+
+    @classmethod
+    def with_timeout(cls, timeout: float) -> "CancellationToken":
+        """
+        Create a token whose deadline is `timeout` seconds from now.
+
+        :param timeout: Seconds until the deadline.
+        :return: A CancellationToken instance.
+        """
+        return cls(deadline=time.time() + timeout)
+
+    def child(self, deadline: Optional[float] = None) -> "CancellationToken":
+        """
+        Create a token that is cancelled together with this one, e.g. for one run of a shared token.
+        Closing the child detaches it from this token.
+
+        :param deadline: Optional deadline of the child, the earlier of both deadlines applies.
+        :return: A CancellationToken instance.
+        """
+        if self.deadline is not None:
+            deadline = self.deadline if deadline is None else min(deadline, self.deadline)
+        child = CancellationToken(deadline=deadline)
+        child._detach = self.on_cancel(lambda: child.cancel(self._reason))
+        return child
+
+    def cancel(self, reason: str = CANCELLED):
+        """
+        Cancel the token and run the registered callbacks. Later calls have no effect.
+
+        :param reason: Why the work is cancelled, CANCELLED or TIMEOUT.
+        """
+        with self._lock:
+            if self._reason is not None:
+                return
+            self._reason = reason
+            callbacks = list(self._callbacks)
+            self._callbacks.clear()
+        if self._timer is not None and reason != self.TIMEOUT:
+            self._timer.cancel()
+        self._event.set()
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+
+    @property
+    def is_cancelled(self) -> bool:
+        """Whether the token was cancelled or its deadline has passed."""
+        if self._reason is None and self.deadline is not None and time.time() >= self.deadline:
+            self.cancel(self.TIMEOUT)
+        return self._reason is not None
+
+    @property
+    def reason(self) -> Optional[str]:
+        """CANCELLED or TIMEOUT once the token is cancelled, otherwise None."""
+        return self._reason if self.is_cancelled else None
+
+    def remaining(self) -> Optional[float]:
+        """Seconds until the deadline, None if the token has no deadline."""
+        if self.deadline is None:
+            return None
+        return max(self.deadline - time.time(), 0.0)
+
+    def raise_if_cancelled(self):
+        """Raise TaskCancelledError if the token is cancelled."""
+        if self.is_cancelled:
+            raise TaskCancelledError(self._reason)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Sleep until the timeout elapses or the token is cancelled, whichever comes first.
+
+        :param timeout: Seconds to wait, None to wait until cancelled.
+        :return: True if the token is cancelled.
+        """
+        remaining = self.remaining()
+        if remaining is not None:
+            timeout = remaining if timeout is None else min(timeout, remaining)
+        self._event.wait(timeout)
+        return self.is_cancelled
+
+    def close(self):
+        """Stop the deadline timer once the work finished, the token can still be checked afterwards."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._detach is not None:
+            self._detach()
+            self._detach = None
+
+    def on_cancel(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """
+        Register a callback that runs once when the token is cancelled, immediately if it already is.
+
+        :param callback: Function without arguments, e.g. closing an in-flight response.
+        :return: A function that unregisters the callback.
+        """
+        with self._lock:
+            if self._reason is None:
+                self._callbacks.append(callback)
+
+                def unregister():
+                    with self._lock:
+                        if callback in self._callbacks:
+                            self._callbacks.remove(callback)
+
+                return unregister
+        callback()
+        return lambda: None
@@ -0,0 +1,160 @@
+from agentmesh.common.utils.log import logger
+
+
+class RunHooks:
+    """
+    Lifecycle callbacks of a team run. Subclass it and override the events to observe, then register the
+    hooks with `AgentTeam(hooks=[...])` or `team.add_hook`. All methods do nothing by default.
+
+    Hooks are called synchronously in the thread that reaches the event, tool events of parallel tool calls
+    come from worker threads. An exception raised by a hook is logged and does not affect the run.
+
+    The team and agents passed to the hooks are the copies running the task, they are different objects for
+    every run. Use `team.context.task` to tell concurrent runs apart.
+    """
+
+    def on_team_start(self, team, task):
+        """
+        Called when a team starts or resumes a run.
+
+        :param team: The AgentTeam.
+        :param task: The Task of the run.
+        """
+
+    def on_route_decision(self, team, agent, subtask):
+        """
+        Called when the coordinator or the last agent selected the next agent.
+
+        :param team: The AgentTeam.
+        :param agent: The selected Agent, None if the chain of agents ends.
+        :param subtask: The subtask of the selected agent.
+        """
+
+    def on_step_start(self, agent, step: int):
+        """
+        Called before an agent queries the model for a ReAct step.
+
+        :param agent: The Agent.
+        :param step: Number of the step within the agent's subtask, starting from 1.
+        """
+
+    def on_token(self, agent, text: str):
+        """
+        Called with each piece of reply text of a step as it streams, or once with the whole reply if the
+        reply is not streamed.
+
+        :param agent: The Agent.
+        :param text: The new text.
+        """
+
+    def on_tool_start(self, tool, params: dict):
+        """
+        Called before a tool is executed. Calls served from the tool result cache are not executed.
+
+        :param tool: The BaseTool.
+        :param params: The call params.
+        """
+
+    def on_tool_end(self, tool, params: dict, result):
+        """
+        Called after a tool was executed, also if it failed or was skipped because the run was cancelled.
+
+        :param tool: The BaseTool.
+        :param params: The call params.
+        :param result: The ToolResult.
+        """
+
+    def on_agent_end(self, agent, agent_result):
+        """
+        Called when an agent finished its subtask.
+
+        :param agent: The Agent.
+        :param agent_result: The AgentExecutionResult with its actions and model calls.
+        """
+
+    def on_team_end(self, team, result):
+        """
+        Called when a run is complete, whatever its status.
+
+        :param team: The AgentTeam.
+        :param result: The TeamResult.
+        """
+
+
+class HookDispatcher(RunHooks):
+    """
+    Forwards every event to the registered hooks. It is falsy while no hooks are registered,
+    so callers skip building the event arguments with a plain `if hooks:` check.
+    """
+
+    def __init__(self, hooks: list = None):
+        """
+        Initialize the HookDispatcher.
+
+        :param hooks: Optional RunHooks to register, objects implementing only some of the events also work.
+        """
+        self.hooks = list(hooks or [])
+        # on_token runs for every streamed chunk, so its callbacks are looked up once per registration
+        self._token_callbacks = []
+        self._update_token_callbacks()
+
+    def add(self, hook):
+        """Register hooks, they receive the events after the hooks registered before them"""
+        self.hooks.append(hook)
+        self._update_token_callbacks()
+
+    def remove(self, hook):
+        """Unregister hooks"""
+        if hook in self.hooks:
+            self.hooks.remove(hook)
+            self._update_token_callbacks()
+
+    def _update_token_callbacks(self):
+        callbacks = []
+        for hook in self.hooks:
+            callback = getattr(hook, "on_token", None)
+            # Hooks keeping the do-nothing RunHooks.on_token do not observe tokens
+            if callback is not None and getattr(callback, "__func__", None) is not RunHooks.on_token:
+                callbacks.append(callback)
+        self._token_callbacks = callbacks
+
+    def __bool__(self):
+        return bool(self.hooks)
+
+    def _dispatch(self, event: str, *args):
+        for hook in self.hooks:
+            callback = getattr(hook, event, None)
+            if callback is None:
+                continue
+            try:
+                callback(*args)
+            except Exception as e:
+                logger.warning(f"Hook {type(hook).__name__}.{event} failed: {e}")
+
+    def on_team_start(self, team, task):
+        self._dispatch("on_team_start", team, task)
+
+    def on_route_decision(self, team, agent, subtask):
+        self._dispatch("on_route_decision", team, agent, subtask)
+
+    def on_step_start(self, agent, step: int):
+        self._dispatch("on_step_start", agent, step)
+
+    def on_token(self, agent, text: str):
+        for callback in self._token_callbacks:
+            try:
+                callback(agent, text)
+            except Exception as e:
+                logger.warning(f"Hook {type(getattr(callback, '__self__', callback)).__name__}.on_token failed: {e}")
+
+    def on_tool_start(self, tool, params: dict):
+        self._dispatch("on_tool_start", tool, params)
+
+    def on_tool_end(self, tool, params: dict, result):
+        self._dispatch("on_tool_end", tool, params, result)
+
+    def on_agent_end(self, agent, agent_result):
+        self._dispatch("on_agent_end", agent, agent_result)
+
+    def on_team_end(self, team, result):
+        self._dispatch("on_team_end", team, result)
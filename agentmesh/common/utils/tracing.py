@@ -0,0 +1,282 @@
+import contextlib
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+# Span kinds and status codes, named as in OpenTelemetry
+SPAN_KIND_INTERNAL = "INTERNAL"
+SPAN_KIND_CLIENT = "CLIENT"
+STATUS_UNSET = "UNSET"
+STATUS_OK = "OK"
+STATUS_ERROR = "ERROR"
+
+# Names of the spans of a team run, from the outside in
+SPAN_TEAM_RUN = "team.run"  # A run or resumed run of a team
+SPAN_TEAM_ROUTE = "team.route"  # The coordinator selecting the first agent
+SPAN_AGENT_STEP = "agent.step"  # An agent working on its subtask
+SPAN_REACT_STEP = "agent.react_step"  # One ReAct step of an agent
+SPAN_AGENT_DECIDE = "agent.decide"  # An agent selecting the next agent
+SPAN_MODEL_CALL = "model.call"  # A model API call, including its retries
+SPAN_TOOL_EXECUTE = "tool.execute"  # A tool call
+
+# The span new spans of the current thread or task are nested in
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+# Tracer of the process, None while tracing is off
+_tracer = None
+
+# Returned instead of a span while tracing is off
+_NO_SPAN = contextlib.nullcontext()
+
+
+class Span:
+    """
+    A timed operation of a run with attributes, in the shape of an OpenTelemetry span.
+    Spans are created by a Tracer and exported when they end.
+    """
+
+    def __init__(self, tracer: "Tracer", name: str, trace_id: str, parent_span_id: Optional[str] = None,
+                 kind: str = SPAN_KIND_INTERNAL, attributes: Dict[str, Any] = None):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_span_id = parent_span_id
+        self.kind = kind
+        self.attributes = {}
+        self.events = []
+        self.status_code = STATUS_UNSET
+        self.status_message = ""
+        self.start_time_ns = time.time_ns()
+        self.end_time_ns = None
+        self._token = None  # Reset token of the current span, if the span was activated
+        self.set_attributes(attributes)
+
+    def set_attribute(self, key: str, value: Any):
+        """Set an attribute, None values are skipped"""
+        if value is not None:
+            self.attributes[key] = value
+
+    def set_attributes(self, attributes: Optional[Dict[str, Any]]):
+        for key, value in (attributes or {}).items():
+            self.set_attribute(key, value)
+
+    def add_event(self, name: str, attributes: Dict[str, Any] = None):
+        """Record a point in time within the span, e.g. the first streamed chunk"""
+        self.events.append({"name": name, "time_unix_nano": time.time_ns(), "attributes": attributes or {}})
+
+    def set_status(self, code: str, message: str = ""):
+        """
+        Set the status of the span.
+
+        :param code: STATUS_OK or STATUS_ERROR.
+        :param message: Description of the error.
+        """
+        self.status_code = code
+        self.status_message = message
+
+    def record_exception(self, e: BaseException):
+        self.set_status(STATUS_ERROR, str(e) or type(e).__name__)
+        self.add_event("exception", {"exception.type": type(e).__name__, "exception.message": str(e)})
+
+    @property
+    def duration(self) -> float:
+        """Seconds from the start to the end of the span, or to now if it has not ended"""
+        end_time_ns = self.end_time_ns if self.end_time_ns is not None else time.time_ns()
+        return (end_time_ns - self.start_time_ns) / 1e9
+
+    def end(self):
+        """End the span and export it, later calls have no effect"""
+        if self.end_time_ns is not None:
+            return
+        self.end_time_ns = time.time_ns()
+        if self._token is not None:
+            try:
+                _current_span.reset(self._token)
+            except ValueError:
+                # Ended in another context than the one it was activated in, nothing to restore there
+                pass
+            self._token = None
+        self.tracer.export(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert the span to a dictionary in the shape of the OpenTelemetry JSON export"""
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_time_unix_nano": self.start_time_ns,
+            "end_time_unix_nano": self.end_time_ns,
+            "duration_ms": self.duration * 1000,
+            "attributes": self.attributes,
+            "events": self.events,
+            "status": {"code": self.status_code, "message": self.status_message},
+            "resource": self.tracer.resource
+        }
+
+
+class SpanExporter:
+    """Base class of the destinations finished spans are sent to"""
+
+    def export(self, span: Span):
+        raise NotImplementedError
+
+    def shutdown(self):
+        """Flush and release the resources of the exporter"""
+        pass
+
+
+class InMemorySpanExporter(SpanExporter):
+    """Keeps finished spans in memory, e.g. to inspect a run in tests"""
+
+    def __init__(self):
+        self._spans = []
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        with self._lock:
+            self._spans.append(span)
+
+    def get_finished_spans(self) -> List[Span]:
+        """The finished spans in the order they ended"""
+        with self._lock:
+            return list(self._spans)
+
+    def clear(self):
+        with self._lock:
+            self._spans.clear()
+
+
+class JsonlSpanExporter(SpanExporter):
+    """Appends every finished span as one JSON line to a file"""
+
+    def __init__(self, path: str):
+        """
+        Initialize the JsonlSpanExporter.
+
+        :param path: Path of the JSONL file, created if it does not exist.
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str)
+        with self._lock:
+            if not self._file.closed:
+                self._file.write(line + "\n")
+                self._file.flush()
+
+    def shutdown(self):
+        with self._lock:
+            self._file.close()
+
+
+class Tracer:
+    """Creates the spans of the runs in the process and sends finished spans to its exporters"""
+
+    def __init__(self, exporters: List[SpanExporter] = None, service_name: str = "agentmesh"):
+        """
+        Initialize the Tracer.
+
+        :param exporters: Destinations of the finished spans.
+        :param service_name: Reported as the `service.name` resource attribute of the spans.
+        """
+        self.exporters = list(exporters or [])
+        self.resource = {"service.name": service_name}
+
+    def start_span(self, name: str, attributes: Dict[str, Any] = None, kind: str = SPAN_KIND_INTERNAL,
+                   activate: bool = True) -> Span:
+        """
+        Start a span nested in the current span.
+
+        :param name: Name of the span, e.g. SPAN_MODEL_CALL.
+        :param attributes: Attributes known at the start.
+        :param kind: SPAN_KIND_INTERNAL or SPAN_KIND_CLIENT for calls to remote services.
+        :param activate: Whether spans started until this one ends are nested in it.
+        :return: The Span, to be ended with its end method.
+        """
+        parent = _current_span.get()
+        span = Span(self, name, trace_id=parent.trace_id if parent else os.urandom(16).hex(),
+                    parent_span_id=parent.span_id if parent else None, kind=kind, attributes=attributes)
+        if activate:
+            span._token = _current_span.set(span)
+        return span
+
+    @contextlib.contextmanager
+    def span(self, name: str, attributes: Dict[str, Any] = None, kind: str = SPAN_KIND_INTERNAL):
+        """Context manager running its block in a new current span, see start_span"""
+        span = self.start_span(name, attributes, kind)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_exception(e)
+            raise
+        finally:
+            span.end()
+
+    def export(self, span: Span):
+        for exporter in self.exporters:
+            try:
+                exporter.export(span)
+            except Exception:
+                # Tracing must never break a run
+                pass
+
+    def shutdown(self):
+        for exporter in self.exporters:
+            exporter.shutdown()
+
+
+def set_tracer(tracer: Optional[Tracer]):
+    """Turn tracing on with the given tracer, or off with None"""
+    global _tracer
+    _tracer = tracer
+
+
+def get_tracer() -> Optional[Tracer]:
+    """The tracer of the process, None while tracing is off"""
+    return _tracer
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def trace_span(name: str, attributes: Dict[str, Any] = None, kind: str = SPAN_KIND_INTERNAL):
+    """
+    Context manager running its block in a new span of the process tracer.
+
+    :return: A context manager yielding the Span, or None while tracing is off.
+    """
+    tracer = _tracer
+    if tracer is None:
+        return _NO_SPAN
+    return tracer.span(name, attributes, kind)
+
+
+def start_span(name: str, attributes: Dict[str, Any] = None, kind: str = SPAN_KIND_INTERNAL,
+               activate: bool = True) -> Optional[Span]:
+    """Start a span of the process tracer, see Tracer.start_span. Returns None while tracing is off."""
+    tracer = _tracer
+    if tracer is None:
+        return None
+    return tracer.start_span(name, attributes, kind, activate)
+
+
+def bind_context(func: Callable, *args) -> Callable:
+    """
+    Bind a call to the current context, so spans it starts in an executor thread keep their parent.
+
+    :return: A function without arguments for executor.submit or loop.run_in_executor.
+    """
+    return functools.partial(contextvars.copy_context().run, func, *args)
@@ -1,4 +1,10 @@
 import json
+import re
+
+# An action and its input, only separated by whitespace
+ACTION_PAIR_PATTERN = re.compile(r"<action>(.*?)</action>\s*<action_input>(.*?)(?:</action_input>|$)", re.S)
+
+JSON_DECODER = json.JSONDecoder()
 
 
 class XmlResParser:
@@ -6,7 +12,13 @@ class XmlResParser:
     A utility class for parsing streaming XML responses, supporting the handling of content that includes < > characters.
     """
 
-    def __init__(self):
+    def __init__(self, parallel_tool_calls: bool = False):
+        """
+        :param parallel_tool_calls: Whether the reply may hold several tool calls, which are then collected
+                                    into the "actions" of the parsed data
+        """
+        self.parallel_tool_calls = parallel_tool_calls
+
         # Store parsed data
         self.parsed_data = {}
 
@@ -232,10 +244,92 @@ class XmlResParser:
             # Not inside any tag, but output has started, treat invalid tag as normal text
             print(tag_text, end="", flush=True)
 
+    def _has_action(self):
+        action = self.parsed_data.get("action")
+        return bool(action) and action.lower() not in ["null", "none"] and not self.has_final_answer_start
+
+    def is_tool_call_complete(self):
+        """
+        Check whether a non-null action and its complete action_input have been received. The input is complete
+        once its tag is closed, or once it holds a closed JSON object: the closing tag is usually a stop sequence
+        that providers do not stream.
+        """
+        if not self._has_action():
+            return False
+        return "action_input" in self.parsed_data or self._is_action_input_json_closed()
+
+    def _is_action_input_json_closed(self):
+        """
+        Check whether the open action_input tag holds a complete JSON object and nothing else. A closing tag
+        being streamed is not part of the content yet.
+        """
+        if self.current_tag != "action_input":
+            return False
+        content = self.current_content.strip()
+        if not content.startswith("{") or not content.endswith("}"):
+            return False
+        try:
+            _, end = JSON_DECODER.raw_decode(content)
+        except json.JSONDecodeError:
+            return False
+        # raw_decode stops after the first object, e.g. {"a": 1} {"b": 2} is not one complete object
+        return end == len(content)
+
+    def is_tool_batch_complete(self):
+        """Check whether one or more tool calls have been received and the reply has moved past them."""
+        # The batch ends with what is written after the last closed action_input
+        if not self._has_action() or "action_input" not in self.parsed_data:
+            return False
+        end = self.raw_response.rfind("</action_input>")
+        tail = self.raw_response[end + len("</action_input>"):].lstrip()
+        if not tail:
+            return False
+        # Another action may follow, wait until it is complete or something else is written
+        return not ("<action>".startswith(tail) or tail.startswith("<action>"))
+
+    def get_tool_calls(self):
+        """
+        Get the consecutive action and action_input pairs at the start of the reply.
+
+        :return: A list of dicts with action and action_input, the input parsed as JSON if possible
+        """
+        tool_calls = []
+        last_end = None
+        for match in ACTION_PAIR_PATTERN.finditer(self.raw_response):
+            if last_end is not None and self.raw_response[last_end:match.start()].strip():
+                # Anything written between two calls (e.g. an imagined observation) ends the batch
+                break
+            action = match.group(1).strip()
+            if action.lower() in ["null", "none", ""]:
+                break
+            tool_calls.append({"action": action, "action_input": self._parse_action_input(match.group(2))})
+            last_end = match.end()
+        return tool_calls
+
+    @staticmethod
+    def _parse_action_input(content):
+        """Parse the content of an action_input tag, keeping it as a string if it is not JSON."""
+        content = content.strip()
+        if content.lower() in ["null", "none", ""]:
+            return {}
+        if content.startswith("{"):
+            last_brace_index = content.rfind("}")
+            try:
+                return json.loads(content[:last_brace_index + 1] if last_brace_index != -1 else content)
+            except json.JSONDecodeError:
+                pass
+        return content
+
     def get_parsed_data(self):
         """Get parsing results."""
         result = self.parsed_data.copy()
 
+        if self.parallel_tool_calls:
+            # Several tool calls in one reply, the last one is also parsed into action and action_input
+            tool_calls = self.get_tool_calls()
+            if len(tool_calls) > 1:
+                result["actions"] = tool_calls
+
         # Handle incomplete final_answer tag
         if self.has_final_answer_start and "final_answer" not in result:
             # Extract everything after the final_answer start tag
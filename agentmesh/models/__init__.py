@@ -1,6 +1,10 @@
 from agentmesh.models.llm.claude_model import ClaudeModel
 from agentmesh.models.llm.deepseek_model import DeepSeekModel
 from agentmesh.models.llm.openai_model import OpenAIModel
-from .llm.base_model import LLMModel, LLMRequest
+from .llm.base_model import LLMModel, LLMRequest, LLMResponse, parse_usage, merge_tool_call_deltas
+from .llm.http_session import HttpConfig
+from .llm.cached_model import CachedModel, LLMCache
+from .llm.retry import RetryPolicy
+from .llm.rate_limiter import RateLimiter
 
-__all__ = ['LLMModel', 'LLMRequest', 'OpenAIModel', 'ClaudeModel', 'DeepSeekModel']
+__all__ = ['LLMModel', 'LLMRequest', 'LLMResponse', 'parse_usage', 'merge_tool_call_deltas', 'OpenAIModel', 'ClaudeModel', 'DeepSeekModel', 'HttpConfig', 'CachedModel', 'LLMCache', 'RetryPolicy', 'RateLimiter']
@@ -1,6 +1,10 @@
-from .base_model import LLMModel, LLMRequest
+from .base_model import LLMModel, LLMRequest, LLMResponse, parse_usage, merge_tool_call_deltas
 from .openai_model import OpenAIModel
 from .claude_model import ClaudeModel
 from .deepseek_model import DeepSeekModel
+from .http_session import HttpConfig, SessionPool
+from .cached_model import CachedModel, LLMCache
+from .retry import RetryPolicy
+from .rate_limiter import RateLimiter
 
-__all__ = ['LLMModel', 'LLMRequest', 'OpenAIModel', 'ClaudeModel', 'DeepSeekModel'] 
\ No newline at end of file
+__all__ = ['LLMModel', 'LLMRequest', 'LLMResponse', 'parse_usage', 'merge_tool_call_deltas', 'OpenAIModel', 'ClaudeModel', 'DeepSeekModel', 'HttpConfig', 'CachedModel', 'LLMCache', 'RetryPolicy', 'RateLimiter', 'SessionPool'] 
\ No newline at end of file
@@ -1,7 +1,18 @@
-from abc import abstractmethod
+import asyncio
+import socket
+import threading
+import time
 import requests
 import json
 from agentmesh.common.enums import ModelApiBase, ModelProvider
+from agentmesh.common.utils.cancellation import CANCELLED_STATUS_CODE, TaskCancelledError
+from agentmesh.common.utils.log import logger
+from agentmesh.common.utils.tracing import trace_span, start_span, Span, SPAN_MODEL_CALL, SPAN_KIND_CLIENT, \
+    STATUS_OK, STATUS_ERROR
+from agentmesh.models.llm.http_session import HttpConfig, SessionPool, AsyncClientPool, _import_httpx
+from agentmesh.models.llm.rate_limiter import RateLimiter, estimate_tokens
+from agentmesh.models.llm.retry import RetryPolicy
+from agentmesh.models.llm.tokenizer import get_context_window
 from typing import Optional, Dict, Any
 
 
@@ -12,7 +23,8 @@ class LLMRequest:
     """
 
     def __init__(self, messages: list,
-                 temperature=0.5, json_format=False, stream=False):
+                 temperature=0.5, json_format=False, stream=False, prompt_cache=True, cache_prefixes=None,
+                 max_tokens=None, stop=None, tools=None, cancel_token=None):
         """
         Initialize the BaseRequest with the necessary fields.
 
@@ -20,11 +32,71 @@ class LLMRequest:
         :param temperature: The sampling temperature for the model.
         :param json_format: Whether to request JSON formatted response.
         :param stream: Whether to enable streaming for the response.
+        :param prompt_cache: Whether providers with explicit prompt caching may cache stable prompt prefixes.
+        :param cache_prefixes: Optional dict of message index -> number of leading characters of that message
+                               that stay the same across calls, used to place cache breakpoints.
+        :param max_tokens: Maximum number of tokens to generate, None for the provider default.
+        :param stop: Optional list of sequences where the model stops generating; the sequence itself
+                     is not included in the output.
+        :param tools: Optional list of tool definitions the model may call natively, each a dict with name,
+                      description and JSON Schema parameters as returned by BaseTool.get_json_schema.
+        :param cancel_token: Optional CancellationToken, the call is aborted with status 499 once it is
+                             cancelled and its deadline bounds the read timeout.
         """
         self.messages = messages
         self.temperature = temperature
         self.json_format = json_format
         self.stream = stream
+        self.prompt_cache = prompt_cache
+        self.cache_prefixes = cache_prefixes or {}
+        self.max_tokens = max_tokens
+        self.stop = stop
+        self.tools = tools
+        self.cancel_token = cancel_token
+
+
+def parse_usage(usage: Optional[dict]) -> Dict[str, int]:
+    """
+    Normalize the usage block of an OpenAI-shaped response or stream chunk.
+
+    :param usage: The `usage` dict reported by the provider.
+    :return: A dict with prompt_tokens, completion_tokens, total_tokens, cached_prompt_tokens
+             and cache_creation_tokens.
+    """
+    usage = usage or {}
+    prompt_tokens = usage.get("prompt_tokens") or 0
+    completion_tokens = usage.get("completion_tokens") or 0
+    # OpenAI reports cached prompt tokens in prompt_tokens_details, DeepSeek in prompt_cache_hit_tokens
+    cached_prompt_tokens = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") \
+        or usage.get("prompt_cache_hit_tokens") or 0
+    # Only providers with explicit prompt caching bill for writing the cache
+    cache_creation_tokens = (usage.get("prompt_tokens_details") or {}).get("cache_creation_tokens") or 0
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": usage.get("total_tokens") or prompt_tokens + completion_tokens,
+        "cached_prompt_tokens": cached_prompt_tokens,
+        "cache_creation_tokens": cache_creation_tokens
+    }
+
+
+def merge_tool_call_deltas(tool_calls: dict, deltas: Optional[list]) -> dict:
+    """
+    Accumulate the tool call fragments carried by OpenAI-shaped stream chunks.
+
+    :param tool_calls: Tool calls accumulated so far, keyed by their index.
+    :param deltas: The `tool_calls` list of one chunk delta.
+    :return: The updated tool_calls dict.
+    """
+    for delta in deltas or []:
+        index = delta.get("index", len(tool_calls))
+        call = tool_calls.setdefault(index, {"id": "", "type": "function", "function": {"name": "", "arguments": ""}})
+        if delta.get("id"):
+            call["id"] = delta["id"]
+        function = delta.get("function") or {}
+        call["function"]["name"] += function.get("name") or ""
+        call["function"]["arguments"] += function.get("arguments") or ""
+    return tool_calls
 
 
 class LLMResponse:
@@ -33,16 +105,28 @@ class LLMResponse:
     """
 
     def __init__(self, success: bool = True, data: Optional[Dict[str, Any]] = None,
-                 error_message: str = "", status_code: int = 200):
+                 error_message: str = "", status_code: int = 200, cached: bool = False,
+                 retry_after: Optional[float] = None):
         self.success = success
         self.data = data or {}
         self.error_message = error_message
         self.status_code = status_code
+        self.cached = cached  # Whether the response was served from the LLM cache
+        self.retry_after = retry_after  # Delay requested by the server's Retry-After header
+        self.retry_count = 0  # Number of retries made before this response
+        self.retry_wait = 0.0  # Total seconds spent waiting between retries
 
     @property
     def is_error(self) -> bool:
         return not self.success
 
+    @property
+    def usage(self) -> Dict[str, int]:
+        """Token usage of the call, all zero for errors and cache hits"""
+        if not self.success or self.cached:
+            return parse_usage(None)
+        return parse_usage(self.data.get("usage"))
+
     def get_error_msg(self) -> str:
         """Return a user-friendly error message based on status code and error details"""
         if not self.is_error:
@@ -73,66 +157,366 @@ class LLMModel:
     Base class for all AI models. This class provides a common interface for AI model 
     instantiation and calling the model with requests. Subclasses should implement 
     the specific model logic.
+
+    The sync (`call`, `call_stream`) and async (`acall`, `acall_stream`) methods are thin transport
+    wrappers around the same request building and response parsing hooks, so providers only need to
+    override `_build_headers`, `_build_url`, `_build_body`, `_parse_response` and `_parse_stream_event`.
     """
 
-    def __init__(self, model: str, api_key: str, api_base: str = None):
+    def __init__(self, model: str, api_key: str, api_base: str = None, http_config: HttpConfig = None,
+                 retry_policy: RetryPolicy = None, rate_limiter: RateLimiter = None):
         self.model = model
         self.api_key = api_key
         self.api_base = api_base
+        self.http_config = http_config or HttpConfig()
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.rate_limiter = rate_limiter  # Optional limiter shared with other models of the same account
+        self.context_window = get_context_window(model)  # Maximum prompt plus output tokens of the model
         if not api_base:
             provider = ModelProvider.from_model_name(model)
             self.api_base = ModelApiBase.get_api_base(provider)
 
-    @abstractmethod
-    def call(self, request: LLMRequest) -> LLMResponse:
+    def _get_session(self) -> requests.Session:
+        """Get the pooled keep-alive session shared by all models using the same API base"""
+        return SessionPool.get_session(self.api_base, self.http_config)
+
+    def _get_async_client(self):
+        """Get the pooled async client shared by all models using the same API base on this event loop"""
+        return AsyncClientPool.get_client(self.api_base, self.http_config)
+
+    def _estimate_request_tokens(self, request: LLMRequest) -> int:
+        """Estimate the tokens a request will consume from the tokens-per-minute budget"""
+        return estimate_tokens(request.messages)
+
+    def _reserve_rate_limit(self, request: LLMRequest) -> int:
+        """Wait for the budgets of the provider account, returning the tokens reserved for the request"""
+        reserved = self.rate_limiter.reservation(self._estimate_request_tokens(request))
+        self.rate_limiter.acquire(reserved)
+        return reserved
+
+    async def _areserve_rate_limit(self, request: LLMRequest) -> int:
+        """Coroutine version of _reserve_rate_limit"""
+        reserved = self.rate_limiter.reservation(self._estimate_request_tokens(request))
+        await self.rate_limiter.aacquire(reserved)
+        return reserved
+
+    def _settle_rate_limit(self, reserved: int, response_data: Optional[dict]):
         """
-        Call the API with the given request parameters.
+        Replace the reservation with the usage reported by the provider. A successful response without usage
+        keeps the reservation.
 
-        :param request: An instance of ModelRequest containing parameters for the API call.
-        :return: An LLMResponse object containing the response or error information.
+        :param reserved: Tokens reserved for the call.
+        :param response_data: The response or stream chunk carrying the usage, None if the call failed or was
+                              cancelled, which returns the whole reservation
         """
-        headers = {
+        if not self.rate_limiter:
+            return
+        if response_data is None:
+            self.rate_limiter.release(reserved)
+            return
+        usage = response_data.get("usage") or {}
+        self.rate_limiter.settle(reserved, usage.get("total_tokens", 0))
+
+    def _build_headers(self) -> dict:
+        return {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
 
+    def _build_url(self) -> str:
+        return f"{self.api_base}/chat/completions"
+
+    def _build_body(self, request: LLMRequest, stream: bool = False) -> dict:
+        """
+        Build the provider request body.
+
+        :param request: The LLMRequest to convert.
+        :param stream: Whether the body is for a streaming call.
+        :return: The JSON body to post.
+        """
         data = {
             "model": self.model,
             "messages": request.messages,
             "temperature": request.temperature,
         }
+        if stream:
+            data["stream"] = True  # Enable streaming
+            # Ask for a final chunk carrying the token usage of the stream
+            data["stream_options"] = {"include_usage": True}
         if request.json_format:
             data["response_format"] = {"type": "json_object"}
+        if request.max_tokens:
+            data["max_tokens"] = request.max_tokens
+        if request.stop:
+            data["stop"] = request.stop
+        if request.tools:
+            data["tools"] = [{"type": "function", "function": tool} for tool in request.tools]
+        return data
+
+    def _parse_response(self, response_data: dict) -> dict:
+        """Convert a successful provider response into the OpenAI chat completion format"""
+        return response_data
+
+    def _parse_stream_event(self, line: str, state: dict) -> Optional[dict]:
+        """
+        Convert one line of the server-sent event stream into an OpenAI-shaped chunk.
+
+        :param line: A decoded, non-empty line of the event stream.
+        :param state: Scratch dict that lives for one stream, for providers that spread data over events.
+        :return: The chunk dict, or None if the line carries no chunk.
+        """
+        if not line.startswith('data: '):
+            return None
+        line = line[6:]  # Remove 'data: ' prefix
+        if line == '[DONE]':
+            return None
+        try:
+            return json.loads(line)
+        except json.JSONDecodeError:
+            return None
+
+    @staticmethod
+    def _extract_error_message(response) -> str:
+        """Extract the error message from a failed response of either transport"""
+        try:
+            error_data = response.json()
+            if "error" in error_data:
+                if isinstance(error_data["error"], dict) and "message" in error_data["error"]:
+                    return error_data["error"]["message"]
+                return str(error_data["error"])
+            elif "message" in error_data:
+                return error_data["message"]
+            return response.text or "Unknown error"
+        except:
+            return response.text or "Could not parse error response"
+
+    def _to_llm_response(self, response) -> LLMResponse:
+        # Check if the request was successful
+        if response.status_code == 200:
+            return LLMResponse(success=True, data=self._parse_response(response.json()),
+                               status_code=response.status_code)
+        return LLMResponse(
+            success=False,
+            error_message=self._extract_error_message(response),
+            status_code=response.status_code,
+            retry_after=RetryPolicy.parse_retry_after(response.headers)
+        )
+
+    @staticmethod
+    def _error_chunk(status_code: int, message: str, retry_after: Optional[float] = None) -> dict:
+        # An error object that can be detected by the caller of the stream
+        return {
+            "error": True,
+            "status_code": status_code,
+            "message": message,
+            "retry_after": retry_after
+        }
+
+    @staticmethod
+    def _is_cancelled(request: LLMRequest) -> bool:
+        return request.cancel_token is not None and request.cancel_token.is_cancelled
+
+    @staticmethod
+    def _cancelled_response(request: LLMRequest) -> LLMResponse:
+        return LLMResponse(success=False, error_message=f"Request {request.cancel_token.reason}",
+                           status_code=CANCELLED_STATUS_CODE)
+
+    def _cancelled_chunk(self, request: LLMRequest) -> dict:
+        return self._error_chunk(CANCELLED_STATUS_CODE, f"Request {request.cancel_token.reason}")
+
+    @staticmethod
+    def _sleep_before_retry(request: LLMRequest, wait: float) -> bool:
+        """Wait before a retry, returning True if the request was cancelled meanwhile"""
+        if request.cancel_token is None:
+            time.sleep(wait)
+            return False
+        return request.cancel_token.wait(wait)
+
+    def _request_timeout(self, request: LLMRequest):
+        """The (connect, read) timeout of a sync request, the read timeout is cut to the deadline"""
+        connect_timeout, read_timeout = self.http_config.timeout
+        remaining = request.cancel_token.remaining() if request.cancel_token else None
+        if remaining is not None:
+            read_timeout = max(min(read_timeout, remaining), 0.001)
+        return connect_timeout, read_timeout
+
+    def _next_retry_wait(self, status_code: int, attempt: int, retry_after: Optional[float],
+                         waited: float) -> Optional[float]:
+        wait = self.retry_policy.next_wait(status_code, attempt, retry_after, waited)
+        if wait is not None:
+            logger.warning(f"Model {self.model} call failed (Status code: {status_code}), "
+                           f"retrying in {wait:.2f}s (retry {attempt + 1})")
+        return wait
+
+    @staticmethod
+    def _with_retry_info(chunk: dict, attempt: int, waited: float) -> dict:
+        # Report retries on the first chunk of a stream, or on its error chunk
+        if attempt or chunk.get("error", False):
+            chunk = dict(chunk, retry_count=attempt, retry_wait=waited)
+        return chunk
+
+    def _span_attributes(self, request: LLMRequest, stream: bool = False) -> dict:
+        """Attributes of the model.call span of a request, named after the OpenTelemetry GenAI conventions"""
+        return {
+            "gen_ai.operation.name": "chat",
+            "gen_ai.request.model": self.model,
+            "gen_ai.request.temperature": request.temperature,
+            "gen_ai.request.max_tokens": request.max_tokens,
+            "gen_ai.request.stream": stream,
+            "server.address": self.api_base
+        }
+
+    @staticmethod
+    def _trace_usage(span: Span, usage: dict):
+        span.set_attributes({
+            "gen_ai.usage.input_tokens": usage.get("prompt_tokens", 0),
+            "gen_ai.usage.output_tokens": usage.get("completion_tokens", 0),
+            "agentmesh.usage.cached_prompt_tokens": usage.get("cached_prompt_tokens", 0)
+        })
+
+    def _trace_response(self, span: Span, response: LLMResponse):
+        span.set_attribute("agentmesh.retry_count", response.retry_count)
+        if response.success:
+            self._trace_usage(span, response.usage)
+            span.set_status(STATUS_OK)
+        else:
+            span.set_attribute("http.response.status_code", response.status_code)
+            span.set_status(STATUS_ERROR, response.error_message or "")
+
+    def _trace_chunk(self, span: Span, chunk: dict):
+        if not span.events:
+            span.add_event("first_chunk")
+        if chunk.get("error", False):
+            span.set_attribute("http.response.status_code", chunk.get("status_code"))
+            span.set_status(STATUS_ERROR, chunk.get("message", ""))
+            return
+        if chunk.get("retry_count"):
+            span.set_attribute("agentmesh.retry_count", chunk["retry_count"])
+        if chunk.get("usage"):
+            self._trace_usage(span, parse_usage(chunk["usage"]))
+
+    def call(self, request: LLMRequest) -> LLMResponse:
+        """
+        Call the API with the given request parameters, retrying transient failures
+        according to the retry policy.
+
+        :param request: An instance of ModelRequest containing parameters for the API call.
+        :return: An LLMResponse object containing the response or error information.
+        """
+        with trace_span(SPAN_MODEL_CALL, self._span_attributes(request), SPAN_KIND_CLIENT) as span:
+            response = self._call_with_retry(request)
+            if span is not None:
+                self._trace_response(span, response)
+            return response
+
+    def _call_with_retry(self, request: LLMRequest) -> LLMResponse:
+        attempt, waited = 0, 0.0
+        while True:
+            if self._is_cancelled(request):
+                return self._cancelled_response(request)
+            response = self._call_once(request)
+            wait = None if response.success else \
+                self._next_retry_wait(response.status_code, attempt, response.retry_after, waited)
+            if wait is None:
+                response.retry_count, response.retry_wait = attempt, waited
+                return response
+            if self._sleep_before_retry(request, wait):
+                return self._cancelled_response(request)
+            waited += wait
+            attempt += 1
+
+    def _call_once(self, request: LLMRequest) -> LLMResponse:
+        if not self.rate_limiter:
+            return self._post(request, 0)
+        # Wait for the rpm/tpm budgets before taking a slot, a slot is not held while the budgets refill
+        reserved = self._reserve_rate_limit(request)
+        # Wait for a call slot of the provider account if its concurrency is capped
+        if not self.rate_limiter.acquire_slot(request.cancel_token):
+            self._settle_rate_limit(reserved, None)
+            return self._cancelled_response(request)
+        try:
+            return self._post(request, reserved)
+        finally:
+            self.rate_limiter.release_slot()
+
+    def _send(self, request: LLMRequest, body: dict, stream: bool = False) -> requests.Response:
+        """
+        POST a request with the pooled session. With a cancellation token the request is sent from a helper thread,
+        so a call waiting for the server returns as soon as the token is cancelled. The response of an abandoned
+        request is closed when it arrives.
+
+        :raises TaskCancelledError: If the token was cancelled before the response arrived
+        """
+        session = self._get_session()
+        url, headers, timeout = self._build_url(), self._build_headers(), self._request_timeout(request)
+        cancel_token = request.cancel_token
+        if cancel_token is None:
+            return session.post(url, headers=headers, json=body, stream=stream, timeout=timeout)
+        cancel_token.raise_if_cancelled()
+
+        outcome = {}
+        lock = threading.Lock()
+        done = threading.Event()
+
+        def send():
+            try:
+                result = session.post(url, headers=headers, json=body, stream=stream, timeout=timeout), None
+            except Exception as e:
+                result = None, e
+            with lock:
+                if outcome.get("abandoned"):
+                    if result[0] is not None:
+                        result[0].close()
+                    return
+                outcome["result"] = result
+            done.set()
 
+        threading.Thread(target=send, daemon=True, name="model-call").start()
+        unregister = cancel_token.on_cancel(done.set)
         try:
-            response = requests.post(f"{self.api_base}/chat/completions", headers=headers, json=data)
-
-            # Check if the request was successful
-            if response.status_code == 200:
-                return LLMResponse(success=True, data=response.json(), status_code=response.status_code)
-            else:
-                # Try to extract error message from response
-                error_msg = "Unknown error"
-                try:
-                    error_data = response.json()
-                    if "error" in error_data:
-                        if isinstance(error_data["error"], dict) and "message" in error_data["error"]:
-                            error_msg = error_data["error"]["message"]
-                        else:
-                            error_msg = str(error_data["error"])
-                    elif "message" in error_data:
-                        error_msg = error_data["message"]
-                except:
-                    error_msg = response.text or "Could not parse error response"
-
-                return LLMResponse(
-                    success=False,
-                    error_message=error_msg,
-                    status_code=response.status_code
-                )
+            done.wait()
+        finally:
+            unregister()
+        with lock:
+            if "result" not in outcome:
+                outcome["abandoned"] = True
+                raise TaskCancelledError(cancel_token.reason)
+        response, error = outcome["result"]
+        if error is not None:
+            raise error
+        return response
 
+    @staticmethod
+    def _abort_response(response: requests.Response):
+        """
+        Close a streamed response from another thread. Closing alone does not wake a read blocked on the socket,
+        shutting the socket down does.
+        """
+        connection = getattr(response.raw, "_connection", None)
+        sock = getattr(connection, "sock", None)
+        if sock is None:
+            # The connection is not kept on the response, take the socket of the http.client response
+            fp = getattr(getattr(response.raw, "_fp", None), "fp", None)
+            sock = getattr(getattr(fp, "raw", None), "_sock", None)
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        response.close()
+
+    def _post(self, request: LLMRequest, reserved: int) -> LLMResponse:
+        try:
+            response = self._send(request, self._build_body(request))
+            llm_response = self._to_llm_response(response)
+            self._settle_rate_limit(reserved, llm_response.data if llm_response.success else None)
+            return llm_response
+        except TaskCancelledError:
+            self._settle_rate_limit(reserved, None)
+            return self._cancelled_response(request)
         except requests.RequestException as e:
             # Handle connection errors, timeouts, etc.
+            self._settle_rate_limit(reserved, None)
             return LLMResponse(
                 success=False,
                 error_message=f"Request failed: {str(e)}",
@@ -140,6 +524,7 @@ class LLMModel:
             )
         except Exception as e:
             # Handle any other exceptions
+            self._settle_rate_limit(reserved, None)
             return LLMResponse(
                 success=False,
                 error_message=f"Unexpected error: {str(e)}",
@@ -148,81 +533,319 @@ class LLMModel:
 
     def call_stream(self, request: LLMRequest):
         """
-        Call the OpenAI API with streaming enabled.
+        Call the API with streaming enabled. Failures are retried according to the retry policy
+        only while no chunk has been yielded yet.
 
         :param request: An instance of LLMRequest containing parameters for the API call.
-        :return: A generator yielding chunks of the response from the OpenAI API.
+        :return: A generator yielding OpenAI-shaped chunks of the response.
         """
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
+        # The span is not made current, the caller runs its own code between the chunks
+        span = start_span(SPAN_MODEL_CALL, self._span_attributes(request, stream=True), SPAN_KIND_CLIENT,
+                          activate=False)
+        stream = self._call_stream_with_retry(request)
+        try:
+            for chunk in stream:
+                if span is not None:
+                    self._trace_chunk(span, chunk)
+                yield chunk
+            if span is not None and span.status_code != STATUS_ERROR:
+                span.set_status(STATUS_OK)
+        except GeneratorExit:
+            # The caller stopped reading, e.g. after the first complete tool call of an XML reply
+            if span is not None:
+                span.set_attribute("agentmesh.stream.closed_early", True)
+            raise
+        finally:
+            stream.close()
+            if span is not None:
+                span.end()
 
-        data = {
-            "model": self.model,
-            "messages": request.messages,
-            "temperature": request.temperature,
-            "stream": True  # Enable streaming
-        }
-        if request.json_format:
-            data["response_format"] = {"type": "json_object"}
+    def _call_stream_with_retry(self, request: LLMRequest):
+        attempt, waited = 0, 0.0
+        while True:
+            wait = None
+            stream = self._call_stream_once(request)
+            try:
+                for chunk in stream:
+                    if chunk.get("error", False):
+                        wait = self._next_retry_wait(chunk["status_code"], attempt, chunk.get("retry_after"), waited)
+                        if wait is not None:
+                            break
+                    yield self._with_retry_info(chunk, attempt, waited)
+                    # Tokens have been handed to the caller, the call can no longer be retried
+                    for chunk in stream:
+                        yield chunk
+                    return
+            finally:
+                stream.close()
+            if wait is None:
+                return
+            if self._sleep_before_retry(request, wait):
+                yield self._cancelled_chunk(request)
+                return
+            waited += wait
+            attempt += 1
+
+    def _call_stream_once(self, request: LLMRequest):
+        if not self.rate_limiter:
+            yield from self._post_stream(request, 0)
+            return
+        reserved = self._reserve_rate_limit(request)
+        # The slot is held until the stream is read to the end or closed
+        if not self.rate_limiter.acquire_slot(request.cancel_token):
+            self._settle_rate_limit(reserved, None)
+            yield self._cancelled_chunk(request)
+            return
+        try:
+            yield from self._post_stream(request, reserved)
+        finally:
+            self.rate_limiter.release_slot()
 
+    def _post_stream(self, request: LLMRequest, reserved: int):
+        # Once the first chunk arrived the provider has charged the prompt, the reservation is kept
+        received = False
         try:
-            response = requests.post(
-                f"{self.api_base}/chat/completions",
-                headers=headers,
-                json=data,
-                stream=True
+            response = self._send(request, self._build_body(request, stream=True), stream=True)
+            # Aborting the response from another thread ends a read that is waiting for the server
+            unregister = request.cancel_token.on_cancel(lambda: self._abort_response(response)) \
+                if request.cancel_token else None
+            try:
+                # Check for error response
+                if response.status_code != 200:
+                    self._settle_rate_limit(reserved, None)
+                    yield self._error_chunk(response.status_code, self._extract_error_message(response),
+                                            RetryPolicy.parse_retry_after(response.headers))
+                    return
+
+                # Read to the end so the connection goes back to the pool drained
+                state = {}
+                for line in response.iter_lines():
+                    if self._is_cancelled(request):
+                        if not received:
+                            self._settle_rate_limit(reserved, None)
+                        yield self._cancelled_chunk(request)
+                        return
+                    if line:
+                        chunk = self._parse_stream_event(line.decode('utf-8'), state)
+                        if chunk is not None and chunk.get("error", False):
+                            # An error event of the provider ends the stream
+                            if not received:
+                                self._settle_rate_limit(reserved, None)
+                            yield chunk
+                            return
+                        if chunk is not None:
+                            received = True
+                            if chunk.get("usage"):
+                                self._settle_rate_limit(reserved, chunk)
+                            yield chunk
+                if self._is_cancelled(request):
+                    # Closing the response on cancellation ends the lines without an error
+                    if not received:
+                        self._settle_rate_limit(reserved, None)
+                    yield self._cancelled_chunk(request)
+            finally:
+                # Release the connection even if the caller stops consuming early
+                if unregister:
+                    unregister()
+                response.close()
+        except requests.RequestException as e:
+            # Yield an error object for connection errors, or for the read aborted by a cancellation
+            if not received:
+                self._settle_rate_limit(reserved, None)
+            yield self._cancelled_chunk(request) if self._is_cancelled(request) else \
+                self._error_chunk(0, f"Connection error: {str(e)}")
+        except Exception as e:
+            # Yield an error object for unexpected errors
+            if not received:
+                self._settle_rate_limit(reserved, None)
+            yield self._cancelled_chunk(request) if self._is_cancelled(request) else \
+                self._error_chunk(500, f"Unexpected error: {str(e)}")
+
+    async def acall(self, request: LLMRequest) -> LLMResponse:
+        """
+        Asynchronously call the API with the given request parameters, retrying transient
+        failures according to the retry policy.
+
+        :param request: An instance of LLMRequest containing parameters for the API call.
+        :return: An LLMResponse object containing the response or error information.
+        """
+        with trace_span(SPAN_MODEL_CALL, self._span_attributes(request), SPAN_KIND_CLIENT) as span:
+            response = await self._acall_with_retry(request)
+            if span is not None:
+                self._trace_response(span, response)
+            return response
+
+    async def _acall_with_retry(self, request: LLMRequest) -> LLMResponse:
+        attempt, waited = 0, 0.0
+        while True:
+            # Async calls are aborted by cancelling the task, the token is only checked between attempts
+            if self._is_cancelled(request):
+                return self._cancelled_response(request)
+            response = await self._acall_once(request)
+            wait = None if response.success else \
+                self._next_retry_wait(response.status_code, attempt, response.retry_after, waited)
+            if wait is None:
+                response.retry_count, response.retry_wait = attempt, waited
+                return response
+            await asyncio.sleep(wait)
+            waited += wait
+            attempt += 1
+
+    async def _acall_once(self, request: LLMRequest) -> LLMResponse:
+        if not self.rate_limiter:
+            return await self._apost(request, 0)
+        reserved = await self._areserve_rate_limit(request)
+        if not await self.rate_limiter.aacquire_slot(request.cancel_token):
+            self._settle_rate_limit(reserved, None)
+            return self._cancelled_response(request)
+        try:
+            return await self._apost(request, reserved)
+        finally:
+            self.rate_limiter.release_slot()
+
+    def _arequest_timeout(self, request: LLMRequest):
+        """The httpx timeout of an async request, the read timeout is cut to the deadline like a sync request"""
+        httpx = _import_httpx()
+        connect_timeout, read_timeout = self._request_timeout(request)
+        return httpx.Timeout(read_timeout, connect=connect_timeout)
+
+    async def _apost(self, request: LLMRequest, reserved: int) -> LLMResponse:
+        httpx = _import_httpx()
+        try:
+            response = await self._get_async_client().post(self._build_url(), headers=self._build_headers(),
+                                                           json=self._build_body(request),
+                                                           timeout=self._arequest_timeout(request))
+            llm_response = self._to_llm_response(response)
+            self._settle_rate_limit(reserved, llm_response.data if llm_response.success else None)
+            return llm_response
+        except httpx.HTTPError as e:
+            # Handle connection errors, timeouts, etc.
+            self._settle_rate_limit(reserved, None)
+            return LLMResponse(
+                success=False,
+                error_message=f"Request failed: {str(e)}",
+                status_code=0  # Use 0 for connection errors
+            )
+        except Exception as e:
+            # Handle any other exceptions
+            self._settle_rate_limit(reserved, None)
+            return LLMResponse(
+                success=False,
+                error_message=f"Unexpected error: {str(e)}",
+                status_code=500
             )
 
-            # Check for error response
-            if response.status_code != 200:
-                # Try to extract error message
-                try:
-                    error_data = json.loads(response.text)
-                    if "error" in error_data:
-                        if isinstance(error_data["error"], dict) and "message" in error_data["error"]:
-                            error_msg = error_data["error"]["message"]
-                        else:
-                            error_msg = str(error_data["error"])
-                    elif "message" in error_data:
-                        error_msg = error_data["message"]
-                    else:
-                        error_msg = response.text
-                except:
-                    error_msg = response.text or "Unknown error"
-
-                # Yield an error object that can be detected by the caller
-                yield {
-                    "error": True,
-                    "status_code": response.status_code,
-                    "message": error_msg
-                }
-                return
+    async def acall_stream(self, request: LLMRequest):
+        """
+        Asynchronously call the API with streaming enabled. Failures are retried according to the
+        retry policy only while no chunk has been yielded yet.
+
+        :param request: An instance of LLMRequest containing parameters for the API call.
+        :return: An async generator yielding OpenAI-shaped chunks of the response.
+        """
+        span = start_span(SPAN_MODEL_CALL, self._span_attributes(request, stream=True), SPAN_KIND_CLIENT,
+                          activate=False)
+        stream = self._acall_stream_with_retry(request)
+        try:
+            async for chunk in stream:
+                if span is not None:
+                    self._trace_chunk(span, chunk)
+                yield chunk
+            if span is not None and span.status_code != STATUS_ERROR:
+                span.set_status(STATUS_OK)
+        except GeneratorExit:
+            # The caller stopped reading, e.g. after the first complete tool call of an XML reply
+            if span is not None:
+                span.set_attribute("agentmesh.stream.closed_early", True)
+            raise
+        finally:
+            await stream.aclose()
+            if span is not None:
+                span.end()
 
-            for line in response.iter_lines():
-                if line:
-                    line = line.decode('utf-8')
-                    if line.startswith('data: '):
-                        line = line[6:]  # Remove 'data: ' prefix
-                        if line == '[DONE]':
+    async def _acall_stream_with_retry(self, request: LLMRequest):
+        attempt, waited = 0, 0.0
+        while True:
+            wait = None
+            stream = self._acall_stream_once(request)
+            try:
+                async for chunk in stream:
+                    if chunk.get("error", False):
+                        wait = self._next_retry_wait(chunk["status_code"], attempt, chunk.get("retry_after"), waited)
+                        if wait is not None:
                             break
-                        try:
-                            chunk = json.loads(line)
+                    yield self._with_retry_info(chunk, attempt, waited)
+                    # Tokens have been handed to the caller, the call can no longer be retried
+                    async for chunk in stream:
+                        yield chunk
+                    return
+            finally:
+                await stream.aclose()
+            if wait is None:
+                return
+            await asyncio.sleep(wait)
+            waited += wait
+            attempt += 1
+
+    async def _acall_stream_once(self, request: LLMRequest):
+        reserved = 0
+        if self.rate_limiter:
+            reserved = await self._areserve_rate_limit(request)
+            if not await self.rate_limiter.aacquire_slot(request.cancel_token):
+                self._settle_rate_limit(reserved, None)
+                yield self._cancelled_chunk(request)
+                return
+        stream = self._apost_stream(request, reserved)
+        try:
+            async for chunk in stream:
+                yield chunk
+        finally:
+            await stream.aclose()
+            if self.rate_limiter:
+                self.rate_limiter.release_slot()
+
+    async def _apost_stream(self, request: LLMRequest, reserved: int):
+        httpx = _import_httpx()
+        received = False
+        try:
+            async with self._get_async_client().stream("POST", self._build_url(), headers=self._build_headers(),
+                                                       json=self._build_body(request, stream=True),
+                                                       timeout=self._arequest_timeout(request)) as response:
+                # Check for error response
+                if response.status_code != 200:
+                    await response.aread()
+                    self._settle_rate_limit(reserved, None)
+                    yield self._error_chunk(response.status_code, self._extract_error_message(response),
+                                            RetryPolicy.parse_retry_after(response.headers))
+                    return
+
+                state = {}
+                async for line in response.aiter_lines():
+                    if self._is_cancelled(request):
+                        if not received:
+                            self._settle_rate_limit(reserved, None)
+                        yield self._cancelled_chunk(request)
+                        return
+                    if line:
+                        chunk = self._parse_stream_event(line, state)
+                        if chunk is not None and chunk.get("error", False):
+                            # An error event of the provider ends the stream
+                            if not received:
+                                self._settle_rate_limit(reserved, None)
                             yield chunk
-                        except json.JSONDecodeError:
-                            continue
-        except requests.RequestException as e:
+                            return
+                        if chunk is not None:
+                            received = True
+                            if chunk.get("usage"):
+                                self._settle_rate_limit(reserved, chunk)
+                            yield chunk
+        except httpx.HTTPError as e:
             # Yield an error object for connection errors
-            yield {
-                "error": True,
-                "status_code": 0,
-                "message": f"Connection error: {str(e)}"
-            }
+            if not received:
+                self._settle_rate_limit(reserved, None)
+            yield self._error_chunk(0, f"Connection error: {str(e)}")
         except Exception as e:
             # Yield an error object for unexpected errors
-            yield {
-                "error": True,
-                "status_code": 500,
-                "message": f"Unexpected error: {str(e)}"
-            }
+            if not received:
+                self._settle_rate_limit(reserved, None)
+            yield self._error_chunk(500, f"Unexpected error: {str(e)}")
@@ -0,0 +1,346 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from agentmesh.common.utils.log import logger
+from agentmesh.models.llm.base_model import LLMModel, LLMRequest, LLMResponse, merge_tool_call_deltas
+
+
+class LLMCache:
+    """
+    Two-tier cache for deterministic model responses: an in-memory LRU in front of an optional
+    on-disk SQLite store. Entries expire after `ttl` seconds, and the disk tier evicts the least
+    recently used entries once it grows beyond `max_disk_bytes`.
+    """
+
+    def __init__(self, ttl: float = 86400, max_memory_entries: int = 1024, db_path: Optional[str] = None,
+                 max_disk_bytes: int = 256 * 1024 * 1024):
+        """
+        Initialize the LLMCache.
+
+        :param ttl: Seconds an entry stays valid, 0 or None means never expire.
+        :param max_memory_entries: Maximum number of entries kept in the memory tier.
+        :param db_path: Path of the SQLite file for the disk tier, None for a memory-only cache.
+        :param max_disk_bytes: Maximum total size of values stored in the disk tier.
+        """
+        self.ttl = ttl
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._db = None
+        self.hits = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.writes = 0
+        if db_path:
+            self._init_db(db_path)
+
+    @classmethod
+    def from_config(cls, cache_config: dict) -> "LLMCache":
+        """
+        Create an LLMCache from the `llm_cache` config section.
+
+        :param cache_config: Dictionary with ttl, max_memory_entries, db_path and max_disk_mb.
+        :return: An LLMCache instance.
+        """
+        return cls(
+            ttl=cache_config.get("ttl", 86400),
+            max_memory_entries=cache_config.get("max_memory_entries", 1024),
+            db_path=cache_config.get("db_path"),
+            max_disk_bytes=int(cache_config.get("max_disk_mb", 256) * 1024 * 1024)
+        )
+
+    def _init_db(self, db_path: str):
+        db_dir = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(db_dir, exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "expires_at REAL, last_access REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache (last_access)")
+        self._db.commit()
+
+    def _expires_at(self) -> Optional[float]:
+        return time.time() + self.ttl if self.ttl else None
+
+    def get(self, key: str) -> Optional[dict]:
+        """
+        Look up a cached response.
+
+        :param key: The cache key.
+        :return: The cached response data, or None on a miss.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at is None or expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    self.memory_hits += 1
+                    return value
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute("SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    value, expires_at = row
+                    if expires_at is None or expires_at > now:
+                        self._db.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+                        self._db.commit()
+                        value = json.loads(value)
+                        self._put_memory(key, value, expires_at)
+                        self.hits += 1
+                        self.disk_hits += 1
+                        return value
+                    self._db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    self._db.commit()
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value: dict):
+        """
+        Store a response in both tiers.
+
+        :param key: The cache key.
+        :param value: The response data to cache.
+        """
+        expires_at = self._expires_at()
+        with self._lock:
+            self._put_memory(key, value, expires_at)
+            self.writes += 1
+            if self._db is not None:
+                try:
+                    serialized = json.dumps(value, ensure_ascii=False)
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO llm_cache (key, value, size, expires_at, last_access) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (key, serialized, len(serialized), expires_at, time.time())
+                    )
+                    self._evict_disk()
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logger.warning(f"Failed to write LLM cache entry: {e}")
+
+    def _put_memory(self, key: str, value: dict, expires_at: Optional[float]):
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self):
+        """Drop expired entries, then the least recently used ones until the size budget is met"""
+        self._db.execute("DELETE FROM llm_cache WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+        total_size = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        if total_size <= self.max_disk_bytes:
+            return
+        for key, size in self._db.execute("SELECT key, size FROM llm_cache ORDER BY last_access").fetchall():
+            self._db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            total_size -= size
+            if total_size <= self.max_disk_bytes:
+                break
+
+    def clear(self):
+        """Remove every entry from both tiers."""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM llm_cache")
+                self._db.commit()
+
+    def stats(self) -> dict:
+        """Get hit/miss counters of the cache."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory)
+        }
+
+
+class CachedModel(LLMModel):
+    """
+    Wraps any LLMModel and serves repeated temperature-0 requests from an LLMCache. Calls with a
+    non-zero temperature are passed through untouched.
+    """
+
+    def __init__(self, inner: LLMModel, cache: LLMCache):
+        """
+        Initialize the CachedModel.
+
+        :param inner: The model that actually serves cache misses.
+        :param cache: The cache to read from and write to.
+        """
+        # Mirror the public attributes of the wrapped model instead of re-initializing transports
+        self.inner = inner
+        self.cache = cache
+        self.model = inner.model
+        self.api_key = inner.api_key
+        self.api_base = inner.api_base
+        self.http_config = inner.http_config
+        self.context_window = inner.context_window
+
+    def __getattr__(self, name):
+        # Delegate provider specific attributes to the wrapped model
+        inner = self.__dict__.get("inner")
+        if inner is None:
+            raise AttributeError(name)
+        return getattr(inner, name)
+
+    @staticmethod
+    def is_cacheable(request: LLMRequest) -> bool:
+        """Only deterministic requests can be answered from the cache"""
+        return request.temperature == 0
+
+    def cache_key(self, request: LLMRequest) -> str:
+        """Hash everything that influences a deterministic response"""
+        payload = json.dumps({
+            "model": self.model,
+            "messages": request.messages,
+            "temperature": request.temperature,
+            "json_format": request.json_format,
+            "max_tokens": request.max_tokens,
+            "stop": request.stop,
+            "tools": request.tools
+        }, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _lookup(self, request: LLMRequest):
+        if not self.is_cacheable(request):
+            return None, None
+        key = self.cache_key(request)
+        return key, self.cache.get(key)
+
+    def _replay_chunk(self, data: dict) -> dict:
+        # Replay a cached completion as a single streaming chunk, including its native tool calls
+        message = data.get("choices", [{}])[0].get("message", {})
+        delta = {"content": message.get("content") or ""}
+        if message.get("tool_calls"):
+            delta["tool_calls"] = [dict(tool_call, index=i) for i, tool_call in enumerate(message["tool_calls"])]
+        finish_reason = data.get("choices", [{}])[0].get("finish_reason")
+        return {
+            "id": data.get("id", ""),
+            "object": "chat.completion.chunk",
+            "cached": True,
+            "model": self.model,
+            "choices": [
+                {
+                    "index": 0,
+                    "delta": delta,
+                    "finish_reason": finish_reason or ("tool_calls" if delta.get("tool_calls") else "stop")
+                }
+            ]
+        }
+
+    def _completion_from_stream(self, content: str, tool_calls: dict, finish_reason: Optional[str]) -> dict:
+        message = {"role": "assistant", "content": content}
+        if tool_calls:
+            message["tool_calls"] = [tool_calls[index] for index in sorted(tool_calls)]
+        return {
+            "object": "chat.completion",
+            "model": self.model,
+            "choices": [
+                {
+                    "index": 0,
+                    "message": message,
+                    # Keep the reason the provider gave, older streams without one ended normally
+                    "finish_reason": finish_reason or ("tool_calls" if tool_calls else "stop")
+                }
+            ]
+        }
+
+    @staticmethod
+    def is_storable(data: dict) -> bool:
+        """A reply cut off at max_tokens is not stored, a retry with a larger budget must reach the model"""
+        choices = data.get("choices") or [{}]
+        return choices[0].get("finish_reason") != "length"
+
+    @staticmethod
+    def _chunk_content(chunk: dict) -> str:
+        choices = chunk.get("choices") or [{}]
+        return choices[0].get("delta", {}).get("content") or ""
+
+    @staticmethod
+    def _chunk_tool_calls(chunk: dict) -> Optional[list]:
+        choices = chunk.get("choices") or [{}]
+        return choices[0].get("delta", {}).get("tool_calls")
+
+    @staticmethod
+    def _chunk_finish_reason(chunk: dict) -> Optional[str]:
+        choices = chunk.get("choices") or [{}]
+        return choices[0].get("finish_reason")
+
+    def call(self, request: LLMRequest) -> LLMResponse:
+        key, cached = self._lookup(request)
+        if cached is not None:
+            return LLMResponse(success=True, data=cached, cached=True)
+        response = self.inner.call(request)
+        if key and response.success and self.is_storable(response.data):
+            self.cache.set(key, response.data)
+        return response
+
+    def call_stream(self, request: LLMRequest):
+        key, cached = self._lookup(request)
+        if cached is not None:
+            yield self._replay_chunk(cached)
+            return
+        content = ""
+        tool_calls = {}
+        finish_reason = None
+        for chunk in self.inner.call_stream(request):
+            if isinstance(chunk, dict) and chunk.get("error", False):
+                # Errors are never cached
+                key = None
+            elif isinstance(chunk, dict):
+                content += self._chunk_content(chunk)
+                merge_tool_call_deltas(tool_calls, self._chunk_tool_calls(chunk))
+                finish_reason = self._chunk_finish_reason(chunk) or finish_reason
+            yield chunk
+        # Only a fully consumed stream is stored
+        completion = self._completion_from_stream(content, tool_calls, finish_reason)
+        if key and self.is_storable(completion):
+            self.cache.set(key, completion)
+
+    async def acall(self, request: LLMRequest) -> LLMResponse:
+        key, cached = self._lookup(request)
+        if cached is not None:
+            return LLMResponse(success=True, data=cached, cached=True)
+        response = await self.inner.acall(request)
+        if key and response.success and self.is_storable(response.data):
+            self.cache.set(key, response.data)
+        return response
+
+    async def acall_stream(self, request: LLMRequest):
+        key, cached = self._lookup(request)
+        if cached is not None:
+            yield self._replay_chunk(cached)
+            return
+        content = ""
+        tool_calls = {}
+        finish_reason = None
+        async for chunk in self.inner.acall_stream(request):
+            if isinstance(chunk, dict) and chunk.get("error", False):
+                key = None
+            elif isinstance(chunk, dict):
+                content += self._chunk_content(chunk)
+                merge_tool_call_deltas(tool_calls, self._chunk_tool_calls(chunk))
+                finish_reason = self._chunk_finish_reason(chunk) or finish_reason
+            yield chunk
+        completion = self._completion_from_stream(content, tool_calls, finish_reason)
+        if key and self.is_storable(completion):
+            self.cache.set(key, completion)
@@ -1,34 +1,54 @@
-from agentmesh.models.llm.base_model import LLMModel, LLMRequest, LLMResponse
+from agentmesh.models.llm.base_model import LLMModel, LLMRequest
+from agentmesh.models.llm.http_session import HttpConfig
+from agentmesh.models.llm.rate_limiter import RateLimiter
+from agentmesh.models.llm.retry import RetryPolicy
 from agentmesh.common.enums import ModelApiBase
-import requests
+from typing import Optional
 import json
 
 
 class ClaudeModel(LLMModel):
-    def __init__(self, model: str, api_key: str, api_base: str = None):
+    # Claude accepts at most 4 cache_control breakpoints per request
+    MAX_CACHE_BREAKPOINTS = 4
+    # Claude stop reasons as OpenAI finish reasons
+    FINISH_REASONS = {"end_turn": "stop", "stop_sequence": "stop", "tool_use": "tool_calls", "max_tokens": "length"}
+    # HTTP status codes of the error types of streamed error events, so they are retried like HTTP errors
+    ERROR_STATUS_CODES = {"invalid_request_error": 400, "authentication_error": 401, "permission_error": 403,
+                          "not_found_error": 404, "request_too_large": 413, "rate_limit_error": 429,
+                          "api_error": 500, "overloaded_error": 529}
+
+    def __init__(self, model: str, api_key: str, api_base: str = None, http_config: HttpConfig = None,
+                 retry_policy: RetryPolicy = None, rate_limiter: RateLimiter = None):
         api_base = api_base or ModelApiBase.CLAUDE.value
-        super().__init__(model, api_key=api_key, api_base=api_base)
+        super().__init__(model, api_key=api_key, api_base=api_base, http_config=http_config,
+                         retry_policy=retry_policy, rate_limiter=rate_limiter)
 
-    def call(self, request: LLMRequest) -> LLMResponse:
-        """
-        Call the Claude API with the given request parameters.
-
-        :param request: An instance of LLMRequest containing parameters for the API call.
-        :return: An LLMResponse object containing the response or error information.
-        """
-        headers = {
+    def _build_headers(self) -> dict:
+        return {
             "x-api-key": self.api_key,
             "anthropic-version": "2023-06-01",
             "content-type": "application/json"
         }
 
+    def _build_url(self) -> str:
+        return f"{self.api_base}/messages"
+
+    def _build_body(self, request: LLMRequest, stream: bool = False) -> dict:
         # Extract system prompt if present and prepare Claude-compatible messages
         system_prompt = None
         claude_messages = []
 
-        for msg in request.messages:
+        for i, msg in enumerate(request.messages):
             if msg["role"] == "system":
                 system_prompt = msg["content"]
+                continue
+            msg = self._convert_message(msg)
+            if request.prompt_cache and request.cache_prefixes.get(i):
+                msg = self._split_cacheable(msg, request.cache_prefixes[i])
+            if claude_messages and claude_messages[-1]["role"] == msg["role"]:
+                # Claude requires alternating roles, e.g. several tool results form one user message
+                claude_messages[-1] = {"role": msg["role"], "content": self._as_blocks(claude_messages[-1]["content"])
+                                       + self._as_blocks(msg["content"])}
             else:
                 claude_messages.append(msg)
 
@@ -36,209 +56,193 @@ class ClaudeModel(LLMModel):
         data = {
             "model": self.model,
             "messages": claude_messages,
-            "max_tokens": self._get_max_tokens(),
+            "max_tokens": request.max_tokens or self._get_max_tokens(),
             "temperature": request.temperature
         }
+        if request.stop:
+            data["stop_sequences"] = request.stop
+        if request.tools:
+            data["tools"] = [{"name": tool["name"], "description": tool.get("description", ""),
+                              "input_schema": tool.get("parameters") or {"type": "object", "properties": {}}}
+                             for tool in request.tools]
+        if stream:
+            data["stream"] = True
 
         # Add system parameter if system prompt is present
         if system_prompt:
+            if request.prompt_cache and isinstance(system_prompt, str):
+                # The system prompt is the most stable prefix, so it always gets a breakpoint
+                system_prompt = [{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}]
             data["system"] = system_prompt
-
-        try:
-            response = requests.post(
-                f"{self.api_base}/messages",
-                headers=headers,
-                json=data
-            )
-
-            # Check if the request was successful
-            if response.status_code == 200:
-                claude_response = response.json()
-
-                # Format the response to match OpenAI's structure
-                openai_format_response = {
-                    "id": claude_response.get("id", ""),
-                    "object": "chat.completion",
-                    "created": int(claude_response.get("created_at", 0)),
-                    "model": self.model,
-                    "choices": [
-                        {
-                            "index": 0,
-                            "message": {
-                                "role": "assistant",
-                                "content": claude_response.get("content", [{}])[0].get("text", "")
-                            },
-                            "finish_reason": claude_response.get("stop_reason", "stop")
-                        }
-                    ],
-                    "usage": {
-                        "prompt_tokens": claude_response.get("usage", {}).get("input_tokens", 0),
-                        "completion_tokens": claude_response.get("usage", {}).get("output_tokens", 0),
-                        "total_tokens": claude_response.get("usage", {}).get("input_tokens", 0) +
-                                        claude_response.get("usage", {}).get("output_tokens", 0)
-                    }
-                }
-
-                return LLMResponse(success=True, data=openai_format_response, status_code=response.status_code)
-            else:
-                # Try to extract error message from response
-                error_msg = "Unknown error"
+        self._limit_cache_breakpoints(data)
+        return data
+
+    @staticmethod
+    def _as_blocks(content) -> list:
+        return [{"type": "text", "text": content}] if isinstance(content, str) else list(content)
+
+    @staticmethod
+    def _convert_message(msg: dict) -> dict:
+        """Convert OpenAI-shaped tool calls and tool results into Claude content blocks"""
+        if msg["role"] == "tool":
+            return {"role": "user", "content": [{"type": "tool_result", "tool_use_id": msg.get("tool_call_id", ""),
+                                                 "content": msg.get("content", "")}]}
+        if msg["role"] == "assistant" and msg.get("tool_calls"):
+            blocks = [{"type": "text", "text": msg["content"]}] if msg.get("content") else []
+            for tool_call in msg["tool_calls"]:
+                function = tool_call.get("function", {})
                 try:
-                    error_data = response.json()
-                    if "error" in error_data:
-                        if isinstance(error_data["error"], dict) and "message" in error_data["error"]:
-                            error_msg = error_data["error"]["message"]
-                        else:
-                            error_msg = str(error_data["error"])
-                    elif "message" in error_data:
-                        error_msg = error_data["message"]
-                    else:
-                        error_msg = response.text
-                except:
-                    error_msg = response.text or "Could not parse error response"
-
-                return LLMResponse(
-                    success=False,
-                    error_message=error_msg,
-                    status_code=response.status_code
-                )
-
-        except requests.RequestException as e:
-            # Handle connection errors, timeouts, etc.
-            return LLMResponse(
-                success=False,
-                error_message=f"Request failed: {str(e)}",
-                status_code=0  # Use 0 for connection errors
-            )
-        except Exception as e:
-            # Handle any other exceptions
-            return LLMResponse(
-                success=False,
-                error_message=f"Unexpected error: {str(e)}",
-                status_code=500
-            )
-
-    def call_stream(self, request: LLMRequest):
-        """
-        Call the Claude API with streaming enabled.
-
-        :param request: An instance of LLMRequest containing parameters for the API call.
-        :return: A generator yielding chunks of the response from the Claude API.
-        """
-        headers = {
-            "x-api-key": self.api_key,
-            "anthropic-version": "2023-06-01",
-            "content-type": "application/json"
-        }
-
-        # Extract system prompt if present and prepare Claude-compatible messages
-        system_prompt = None
-        claude_messages = []
-
-        for msg in request.messages:
-            if msg["role"] == "system":
-                system_prompt = msg["content"]
+                    tool_input = json.loads(function.get("arguments") or "{}")
+                except json.JSONDecodeError:
+                    tool_input = {}
+                blocks.append({"type": "tool_use", "id": tool_call.get("id", ""), "name": function.get("name", ""),
+                               "input": tool_input})
+            return {"role": "assistant", "content": blocks}
+        return msg
+
+    @staticmethod
+    def _split_cacheable(msg: dict, prefix_len: int) -> dict:
+        """Split a message into a cached stable prefix block and an uncached remainder"""
+        content = msg["content"]
+        if isinstance(content, list) and content:
+            # Block content is cached as a whole up to its last block
+            return {**msg, "content": content[:-1] + [{**content[-1], "cache_control": {"type": "ephemeral"}}]}
+        if not isinstance(content, str) or prefix_len <= 0:
+            return msg
+        blocks = [{"type": "text", "text": content[:prefix_len], "cache_control": {"type": "ephemeral"}}]
+        if content[prefix_len:]:
+            blocks.append({"type": "text", "text": content[prefix_len:]})
+        return {**msg, "content": blocks}
+
+    def _limit_cache_breakpoints(self, data: dict):
+        """Keep the system breakpoint and the latest message breakpoints within the provider limit"""
+        system = data.get("system")
+        budget = self.MAX_CACHE_BREAKPOINTS
+        if isinstance(system, list):
+            budget -= sum(1 for block in system if isinstance(block, dict) and "cache_control" in block)
+        marked = [block for msg in data["messages"] if isinstance(msg.get("content"), list)
+                  for block in msg["content"] if isinstance(block, dict) and "cache_control" in block]
+        # A later breakpoint covers a longer prefix, so drop the earliest message breakpoints first
+        for block in marked[:max(len(marked) - budget, 0)]:
+            del block["cache_control"]
+
+    def _parse_response(self, claude_response: dict) -> dict:
+        # Text blocks become the message content, tool_use blocks become OpenAI tool calls
+        content = ""
+        tool_calls = []
+        for block in claude_response.get("content", []):
+            if block.get("type") == "tool_use":
+                tool_calls.append({
+                    "id": block.get("id", ""),
+                    "type": "function",
+                    "function": {"name": block.get("name", ""),
+                                 "arguments": json.dumps(block.get("input", {}), ensure_ascii=False)}
+                })
             else:
-                claude_messages.append(msg)
-
-        # Prepare the request data using messages format
-        data = {
+                content += block.get("text", "")
+        message = {
+            "role": "assistant",
+            "content": content
+        }
+        if tool_calls:
+            message["tool_calls"] = tool_calls
+        stop_reason = claude_response.get("stop_reason") or "end_turn"
+
+        # Format the response to match OpenAI's structure
+        return {
+            "id": claude_response.get("id", ""),
+            "object": "chat.completion",
+            "created": int(claude_response.get("created_at", 0)),
             "model": self.model,
-            "messages": claude_messages,
-            "max_tokens": self._get_max_tokens(),
-            "temperature": request.temperature,
-            "stream": True
+            "choices": [
+                {
+                    "index": 0,
+                    "message": message,
+                    "finish_reason": self.FINISH_REASONS.get(stop_reason, stop_reason)
+                }
+            ],
+            "usage": self._parse_usage(claude_response.get("usage", {}))
         }
 
-        # Add system parameter if system prompt is present
-        if system_prompt:
-            data["system"] = system_prompt
-
-        # Add response format if JSON is requested
-        if request.json_format:
-            data["response_format"] = {"type": "json_object"}
+    @staticmethod
+    def _parse_usage(claude_usage: dict) -> dict:
+        # Claude reports cache reads and writes separately from input_tokens, while OpenAI counts them in prompt_tokens
+        cache_read = claude_usage.get("cache_read_input_tokens") or 0
+        cache_creation = claude_usage.get("cache_creation_input_tokens") or 0
+        prompt_tokens = (claude_usage.get("input_tokens") or 0) + cache_read + cache_creation
+        completion_tokens = claude_usage.get("output_tokens") or 0
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": cache_read, "cache_creation_tokens": cache_creation}
+        }
 
+    def _parse_stream_event(self, line: str, state: dict) -> Optional[dict]:
+        if not line.startswith('data: '):
+            return None
+        line = line[6:]  # Remove 'data: ' prefix
+        if line == '[DONE]':
+            return None
         try:
-            response = requests.post(
-                f"{self.api_base}/messages",
-                headers=headers,
-                json=data,
-                stream=True
-            )
-
-            # Check for error response
-            if response.status_code != 200:
-                # Try to extract error message
-                try:
-                    error_data = json.loads(response.text)
-                    if "error" in error_data:
-                        if isinstance(error_data["error"], dict) and "message" in error_data["error"]:
-                            error_msg = error_data["error"]["message"]
-                        else:
-                            error_msg = str(error_data["error"])
-                    elif "message" in error_data:
-                        error_msg = error_data["message"]
-                    else:
-                        error_msg = response.text
-                except:
-                    error_msg = response.text or "Unknown error"
-
-                # Yield an error object that can be detected by the caller
-                yield {
-                    "error": True,
-                    "status_code": response.status_code,
-                    "message": error_msg
+            chunk = json.loads(line)
+        except json.JSONDecodeError:
+            return None
+
+        # Errors after the response started, e.g. an overloaded API, arrive as an error event
+        if chunk.get("type") == "error":
+            error = chunk.get("error") or {}
+            return self._error_chunk(self.ERROR_STATUS_CODES.get(error.get("type"), 500),
+                                     f"{error.get('type', 'error')}: {error.get('message', '')}")
+
+        # Extract content from the delta
+        content = ""
+        if "delta" in chunk and "text" in chunk["delta"]:
+            content = chunk["delta"]["text"]
+        delta = {
+            "content": content
+        }
+
+        # Tool use blocks stream their name first and their input as partial JSON
+        block = chunk.get("content_block") or {}
+        if chunk.get("type") == "content_block_start" and block.get("type") == "tool_use":
+            delta["tool_calls"] = [{"index": chunk.get("index", 0), "id": block.get("id", ""), "type": "function",
+                                    "function": {"name": block.get("name", ""), "arguments": ""}}]
+        elif chunk.get("type") == "content_block_delta" and chunk["delta"].get("type") == "input_json_delta":
+            delta["tool_calls"] = [{"index": chunk.get("index", 0),
+                                    "function": {"arguments": chunk["delta"].get("partial_json", "")}}]
+
+        # Convert Claude streaming format to OpenAI format
+        openai_chunk = {
+            "id": chunk.get("id", ""),
+            "object": "chat.completion.chunk",
+            "created": int(chunk.get("created_at", 0)),
+            "model": self.model,
+            "choices": [
+                {
+                    "index": 0,
+                    "delta": delta,
+                    "finish_reason": None
                 }
-                return
-
-            for line in response.iter_lines():
-                if line:
-                    line = line.decode('utf-8')
-                    if line.startswith('data: '):
-                        line = line[6:]  # Remove 'data: ' prefix
-                        if line == '[DONE]':
-                            break
-                        try:
-                            chunk = json.loads(line)
-                            # Extract content from the delta
-                            content = ""
-                            if "delta" in chunk and "text" in chunk["delta"]:
-                                content = chunk["delta"]["text"]
-
-                            # Convert Claude streaming format to OpenAI format
-                            yield {
-                                "id": chunk.get("id", ""),
-                                "object": "chat.completion.chunk",
-                                "created": int(chunk.get("created_at", 0)),
-                                "model": self.model,
-                                "choices": [
-                                    {
-                                        "index": 0,
-                                        "delta": {
-                                            "content": content
-                                        },
-                                        "finish_reason": None
-                                    }
-                                ]
-                            }
-                        except json.JSONDecodeError:
-                            continue
-        except requests.RequestException as e:
-            # Yield an error object for connection errors
-            yield {
-                "error": True,
-                "status_code": 0,
-                "message": f"Connection error: {str(e)}"
-            }
-        except Exception as e:
-            # Yield an error object for unexpected errors
-            yield {
-                "error": True,
-                "status_code": 500,
-                "message": f"Unexpected error: {str(e)}"
-            }
+            ]
+        }
+
+        # Input usage arrives with message_start and output usage with message_delta,
+        # report them together on the message_delta chunk like OpenAI's final usage chunk
+        if chunk.get("type") == "message_start":
+            state["usage"] = dict(chunk.get("message", {}).get("usage") or {})
+        elif chunk.get("type") == "message_delta":
+            stop_reason = (chunk.get("delta") or {}).get("stop_reason")
+            if stop_reason:
+                openai_chunk["choices"][0]["finish_reason"] = self.FINISH_REASONS.get(stop_reason, stop_reason)
+            if chunk.get("usage"):
+                usage = dict(state.get("usage") or {})
+                usage.update(chunk["usage"])
+                openai_chunk["usage"] = self._parse_usage(usage)
+        return openai_chunk
 
     def _get_max_tokens(self) -> int:
+        """Default output budget when the request does not set max_tokens"""
         model = self.model
         if model and (model.startswith("claude-3-5") or model.startswith("claude-3-7")):
             return 8192
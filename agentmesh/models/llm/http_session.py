@@ -0,0 +1,180 @@
+import asyncio
+import threading
+import weakref
+from typing import Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from agentmesh.common.utils.log import logger
+
+
+# Use lazy import, only import when the async API is actually used
+def _import_httpx():
+    try:
+        import httpx
+        return httpx
+    except ImportError:
+        raise ImportError(
+            "The 'httpx' package is required to use the async model API. "
+            "Please install it with 'pip install httpx[http2]' or "
+            "'pip install agentmesh-sdk[full]'."
+        )
+
+
+class HttpConfig:
+    """
+    Connection settings shared by all HTTP calls made to a model provider.
+    """
+
+    def __init__(self, pool_connections: int = 10, pool_maxsize: int = 20, keep_alive: bool = True,
+                 connect_timeout: float = 10, read_timeout: float = 600, http2: bool = False):
+        """
+        Initialize the HttpConfig.
+
+        :param pool_connections: Number of connection pools to cache (one per host).
+        :param pool_maxsize: Maximum number of connections kept alive per host.
+        :param keep_alive: Whether to reuse connections between calls.
+        :param connect_timeout: Seconds to wait for the TCP/TLS connection to be established.
+        :param read_timeout: Seconds to wait between bytes received from the server.
+        :param http2: Whether to negotiate HTTP/2 when the transport supports it.
+        """
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.keep_alive = keep_alive
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.http2 = http2
+
+    @classmethod
+    def from_dict(cls, data: Optional[dict]) -> "HttpConfig":
+        """
+        Create an HttpConfig from the `http` section of a model provider config.
+
+        :param data: Dictionary with any of the constructor arguments.
+        :return: An HttpConfig instance, using defaults for missing keys.
+        """
+        data = data or {}
+        return cls(
+            pool_connections=data.get("pool_connections", 10),
+            pool_maxsize=data.get("pool_maxsize", 20),
+            keep_alive=data.get("keep_alive", True),
+            connect_timeout=data.get("connect_timeout", 10),
+            read_timeout=data.get("read_timeout", 600),
+            http2=data.get("http2", False)
+        )
+
+    @property
+    def timeout(self) -> Tuple[float, float]:
+        """The (connect, read) timeout tuple accepted by requests."""
+        return self.connect_timeout, self.read_timeout
+
+    def key(self) -> tuple:
+        return self.pool_connections, self.pool_maxsize, self.keep_alive, self.http2
+
+
+class SessionPool:
+    """
+    Process-wide pool of keep-alive HTTP sessions keyed by API base URL, so every model instance
+    pointing at the same provider reuses its TCP/TLS connections instead of reconnecting on each call.
+    """
+    _sessions: Dict[tuple, requests.Session] = {}
+    _lock = threading.Lock()
+    _http2_warned = False
+
+    @classmethod
+    def get_session(cls, api_base: str, http_config: HttpConfig) -> requests.Session:
+        """
+        Get the shared session for an API base, creating it on first use.
+
+        :param api_base: The API base URL of the provider.
+        :param http_config: Connection settings for the session.
+        :return: A requests.Session with a pooled adapter mounted.
+        """
+        key = (api_base,) + http_config.key()
+        session = cls._sessions.get(key)
+        if session is not None:
+            return session
+
+        with cls._lock:
+            session = cls._sessions.get(key)
+            if session is None:
+                if http_config.http2 and not cls._http2_warned:
+                    cls._http2_warned = True
+                    logger.warning("HTTP/2 is only supported by the async transport, sync calls use HTTP/1.1 keep-alive")
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=http_config.pool_connections,
+                                      pool_maxsize=http_config.pool_maxsize,
+                                      max_retries=0)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                if not http_config.keep_alive:
+                    session.headers["Connection"] = "close"
+                cls._sessions[key] = session
+        return session
+
+    @classmethod
+    def close_all(cls):
+        """Close every pooled session and drop their connections."""
+        with cls._lock:
+            for session in cls._sessions.values():
+                try:
+                    session.close()
+                except Exception as e:
+                    logger.warning(f"Error closing HTTP session: {e}")
+            cls._sessions.clear()
+
+
+class AsyncClientPool:
+    """
+    Pool of httpx.AsyncClient instances keyed by event loop and API base URL. Async clients hold
+    connections bound to the loop that created them, so each running loop gets its own client.
+    """
+    _clients: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_client(cls, api_base: str, http_config: HttpConfig):
+        """
+        Get the shared async client for an API base on the running event loop.
+
+        :param api_base: The API base URL of the provider.
+        :param http_config: Connection settings for the client.
+        :return: An httpx.AsyncClient instance.
+        """
+        loop = asyncio.get_running_loop()
+        key = (api_base,) + http_config.key()
+        with cls._lock:
+            loop_clients = cls._clients.setdefault(loop, {})
+            client = loop_clients.get(key)
+            if client is None or client.is_closed:
+                client = cls._create_client(http_config)
+                loop_clients[key] = client
+        return client
+
+    @staticmethod
+    def _create_client(http_config: HttpConfig):
+        httpx = _import_httpx()
+        keepalive = http_config.pool_maxsize if http_config.keep_alive else 0
+        kwargs = dict(
+            limits=httpx.Limits(max_connections=http_config.pool_maxsize, max_keepalive_connections=keepalive),
+            timeout=httpx.Timeout(http_config.read_timeout, connect=http_config.connect_timeout)
+        )
+        try:
+            return httpx.AsyncClient(http2=http_config.http2, **kwargs)
+        except ImportError:
+            # HTTP/2 support needs the optional 'h2' package
+            logger.warning("HTTP/2 requested but 'h2' is not installed, falling back to HTTP/1.1")
+            return httpx.AsyncClient(**kwargs)
+
+    @classmethod
+    async def aclose_all(cls):
+        """Close every async client created on the running event loop."""
+        loop = asyncio.get_running_loop()
+        with cls._lock:
+            loop_clients = cls._clients.pop(loop, {})
+        for client in loop_clients.values():
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.warning(f"Error closing async HTTP client: {e}")
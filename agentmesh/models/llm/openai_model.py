@@ -1,8 +1,13 @@
 from agentmesh.models.llm.base_model import LLMModel
+from agentmesh.models.llm.http_session import HttpConfig
+from agentmesh.models.llm.rate_limiter import RateLimiter
+from agentmesh.models.llm.retry import RetryPolicy
 from agentmesh.common.enums import ModelApiBase
 
 
 class OpenAIModel(LLMModel):
-    def __init__(self, model: str, api_key: str, api_base: str = None):
+    def __init__(self, model: str, api_key: str, api_base: str = None, http_config: HttpConfig = None,
+                 retry_policy: RetryPolicy = None, rate_limiter: RateLimiter = None):
         api_base = api_base or ModelApiBase.OPENAI.value
-        super().__init__(model, api_key=api_key, api_base=api_base)
+        super().__init__(model, api_key=api_key, api_base=api_base, http_config=http_config,
+                         retry_policy=retry_policy, rate_limiter=rate_limiter)
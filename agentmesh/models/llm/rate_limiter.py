@@ -0,0 +1,315 @@
+import asyncio
+import collections
+import hashlib
+import threading
+import time
+from typing import Dict, Optional
+
+from agentmesh.common.utils.log import logger
+
+
+def estimate_tokens(messages: list) -> int:
+    """
+    Roughly estimate the prompt tokens of a message list (about 4 characters per token).
+
+    :param messages: The chat messages of a request.
+    :return: Estimated number of tokens.
+    """
+    chars = 0
+    for msg in messages:
+        content = msg.get("content", "")
+        chars += len(content) if isinstance(content, str) else len(str(content))
+    return chars // 4 + 4 * len(messages)
+
+
+class TokenBucket:
+    """
+    A token bucket that refills continuously at `capacity` tokens per minute. Reservations may
+    take the balance negative, which queues later callers behind earlier ones.
+    """
+
+    def __init__(self, capacity: float):
+        self.capacity = capacity
+        self.rate = capacity / 60.0  # tokens per second
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        """
+        Take `amount` tokens from the bucket.
+
+        :return: Seconds the caller must wait before the reservation is covered.
+        """
+        self._refill(now)
+        # A single request can never need more than a full bucket
+        amount = min(amount, self.capacity)
+        self.tokens -= amount
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    def refund(self, amount: float):
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class _SlotWaiter:
+    """A caller waiting for a call slot of a RateLimiter, a thread or a coroutine of an event loop"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop = None):
+        self.granted = False
+        self.abandoned = False  # The caller stopped waiting, the slot goes to the next waiter
+        self.loop = loop
+        self.event = threading.Event() if loop is None else None
+        self.future = loop.create_future() if loop is not None else None
+
+    def grant(self) -> bool:
+        """Hand a slot to the waiter, called with the lock of the limiter held"""
+        if self.abandoned:
+            return False
+        self.granted = True
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self._resolve)
+        return True
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class RateLimiter:
+    """
+    Process-wide limiter that enforces requests-per-minute and tokens-per-minute budgets and a cap on the
+    calls in flight for one provider account. Callers wait instead of failing, from threads (`acquire`,
+    `acquire_slot`) or coroutines (`aacquire`, `aacquire_slot`).
+    """
+    _limiters: Dict[str, "RateLimiter"] = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, name: str, rpm: Optional[int] = None, tpm: Optional[int] = None,
+                 max_concurrency: Optional[int] = None):
+        """
+        Initialize the RateLimiter.
+
+        :param name: Name of the limiter, used in logs and metrics.
+        :param rpm: Maximum requests per minute, None for no limit.
+        :param tpm: Maximum tokens per minute, None for no limit.
+        :param max_concurrency: Maximum calls in flight, including streams being read, None for no limit.
+        """
+        self.name = name
+        self.request_bucket = TokenBucket(rpm) if rpm else None
+        self.token_bucket = TokenBucket(tpm) if tpm else None
+        self.max_concurrency = max_concurrency
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._slot_waiters = collections.deque()
+        self.waiting = 0
+        self.max_waiting = 0
+        self.acquired = 0
+        self.throttled = 0
+        self.total_wait = 0.0
+
+    @classmethod
+    def get_shared(cls, provider: str, api_key: Optional[str], rpm: Optional[int] = None,
+                   tpm: Optional[int] = None, max_concurrency: Optional[int] = None) -> Optional["RateLimiter"]:
+        """
+        Get the limiter shared by every model using the same provider account.
+
+        :param provider: The model provider name.
+        :param api_key: The API key, budgets are enforced per key.
+        :param rpm: Maximum requests per minute.
+        :param tpm: Maximum tokens per minute.
+        :param max_concurrency: Maximum calls in flight.
+        :return: The shared RateLimiter, or None if no budget is configured.
+        """
+        if not rpm and not tpm and not max_concurrency:
+            return None
+        key_hash = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:8]
+        name = f"{provider}:{key_hash}"
+        with cls._registry_lock:
+            limiter = cls._limiters.get(name)
+            if limiter is None:
+                limiter = cls(name, rpm=rpm, tpm=tpm, max_concurrency=max_concurrency)
+                cls._limiters[name] = limiter
+        return limiter
+
+    def reservation(self, tokens: int) -> int:
+        """
+        Get the tokens a call estimated at `tokens` takes from the token budget, a call never takes more
+        than a full minute of budget.
+
+        :param tokens: Estimated tokens of the request.
+        :return: The tokens to pass to acquire, and later to settle or release.
+        """
+        if not self.token_bucket:
+            return 0
+        return int(min(tokens, self.token_bucket.capacity))
+
+    def _reserve(self, tokens: int) -> float:
+        now = time.monotonic()
+        with self._lock:
+            delay = 0.0
+            if self.request_bucket:
+                delay = max(delay, self.request_bucket.reserve(1, now))
+            if self.token_bucket and tokens:
+                delay = max(delay, self.token_bucket.reserve(tokens, now))
+            self.acquired += 1
+            if delay > 0:
+                self.throttled += 1
+                self.total_wait += delay
+                self.waiting += 1
+                self.max_waiting = max(self.max_waiting, self.waiting)
+        if delay > 1:
+            logger.debug(f"Rate limiter {self.name} delaying call by {delay:.2f}s, {self.waiting} waiting")
+        return delay
+
+    def _done_waiting(self):
+        with self._lock:
+            self.waiting -= 1
+
+    def acquire(self, tokens: int = 0) -> float:
+        """
+        Block until the budgets allow one more request using `tokens` tokens.
+
+        :param tokens: Estimated tokens of the request.
+        :return: Seconds spent waiting.
+        """
+        delay = self._reserve(tokens)
+        if delay > 0:
+            try:
+                time.sleep(delay)
+            finally:
+                self._done_waiting()
+        return delay
+
+    async def aacquire(self, tokens: int = 0) -> float:
+        """
+        Wait without blocking the event loop until the budgets allow one more request.
+
+        :param tokens: Estimated tokens of the request.
+        :return: Seconds spent waiting.
+        """
+        delay = self._reserve(tokens)
+        if delay > 0:
+            try:
+                await asyncio.sleep(delay)
+            finally:
+                self._done_waiting()
+        return delay
+
+    def _take_slot(self, loop: asyncio.AbstractEventLoop = None) -> Optional[_SlotWaiter]:
+        """Take a free call slot, or queue a waiter for the next released one"""
+        with self._lock:
+            if self.in_flight < self.max_concurrency and not self._slot_waiters:
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+                return None
+            waiter = _SlotWaiter(loop)
+            self._slot_waiters.append(waiter)
+            return waiter
+
+    def _abandon_slot(self, waiter: _SlotWaiter) -> bool:
+        """Stop waiting for a slot, returning whether the slot was granted in the meantime"""
+        with self._lock:
+            if not waiter.granted:
+                waiter.abandoned = True
+            return waiter.granted
+
+    def acquire_slot(self, cancel_token=None) -> bool:
+        """
+        Block until fewer than max_concurrency calls are in flight, slots are handed out in the order they
+        were requested. Every acquired slot must be released with `release_slot`.
+
+        :param cancel_token: Optional CancellationToken that stops the wait.
+        :return: True if a slot was acquired, False if the token was cancelled first.
+        """
+        if not self.max_concurrency:
+            return True
+        waiter = self._take_slot()
+        if waiter is None:
+            return True
+        unregister = cancel_token.on_cancel(waiter.event.set) if cancel_token is not None else None
+        try:
+            waiter.event.wait()
+        finally:
+            if unregister:
+                unregister()
+        return self._abandon_slot(waiter)
+
+    async def aacquire_slot(self, cancel_token=None) -> bool:
+        """Wait without blocking the event loop until a call slot is free, see acquire_slot"""
+        if not self.max_concurrency:
+            return True
+        waiter = self._take_slot(asyncio.get_running_loop())
+        if waiter is None:
+            return True
+        # The token may be cancelled from another thread, the future is resolved on its loop
+        unregister = cancel_token.on_cancel(lambda: waiter.loop.call_soon_threadsafe(waiter._resolve)) \
+            if cancel_token is not None else None
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if self._abandon_slot(waiter):
+                self.release_slot()
+            raise
+        finally:
+            if unregister:
+                unregister()
+        return self._abandon_slot(waiter)
+
+    def release_slot(self):
+        """Release a slot acquired with acquire_slot or aacquire_slot, handing it to the next waiter"""
+        if not self.max_concurrency:
+            return
+        with self._lock:
+            while self._slot_waiters:
+                if self._slot_waiters.popleft().grant():
+                    return
+            self.in_flight -= 1
+
+    def settle(self, reserved: int, actual: int):
+        """
+        Correct the token budget once the real usage of a call is known.
+
+        :param reserved: Tokens reserved before the call, see reservation.
+        :param actual: Tokens reported by the provider.
+        """
+        if not self.token_bucket or not actual:
+            return
+        with self._lock:
+            self.token_bucket.refund(reserved - actual)
+
+    def release(self, reserved: int):
+        """
+        Return the tokens reserved for a call that failed or was cancelled, they were never used.
+
+        :param reserved: Tokens reserved before the call, see reservation.
+        """
+        if not self.token_bucket or not reserved:
+            return
+        with self._lock:
+            self.token_bucket.refund(reserved)
+
+    def metrics(self) -> dict:
+        """Get queue depth and throttling counters of the limiter."""
+        return {
+            "name": self.name,
+            "waiting": self.waiting,
+            "max_waiting": self.max_waiting,
+            "acquired": self.acquired,
+            "throttled": self.throttled,
+            "total_wait": self.total_wait,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "waiting_for_slot": len(self._slot_waiters)
+        }
+
+    @classmethod
+    def all_metrics(cls) -> list:
+        """Get the metrics of every shared limiter."""
+        with cls._registry_lock:
+            return [limiter.metrics() for limiter in cls._limiters.values()]
@@ -0,0 +1,116 @@
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+
+class RetryPolicy:
+    """
+    Decides whether and how long to wait before retrying a failed model call, using exponential
+    backoff with jitter and honoring the server's Retry-After hint.
+    """
+
+    DEFAULT_RETRY_STATUSES = (0, 408, 409, 429, 500, 502, 503, 504, 529)
+
+    def __init__(self, max_retries: int = 3, base_delay: float = 1.0, max_delay: float = 30.0,
+                 max_total_wait: float = 60.0, jitter: bool = True, retry_statuses=DEFAULT_RETRY_STATUSES,
+                 status_max_retries: Optional[Dict[int, int]] = None):
+        """
+        Initialize the RetryPolicy.
+
+        :param max_retries: Maximum number of retries after the first attempt.
+        :param base_delay: Delay in seconds before the first retry, doubled on each retry.
+        :param max_delay: Upper bound in seconds for a single backoff delay.
+        :param max_total_wait: Upper bound in seconds for the sum of all waits of one call.
+        :param jitter: Whether to randomize the backoff delay to spread out concurrent callers.
+        :param retry_statuses: Status codes that are retried (0 means a connection error).
+        :param status_max_retries: Optional per-status override of max_retries, e.g. {429: 6, 500: 1}.
+        """
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_total_wait = max_total_wait
+        self.jitter = jitter
+        self.retry_statuses = set(retry_statuses)
+        self.status_max_retries = status_max_retries or {}
+
+    @classmethod
+    def from_dict(cls, data: Optional[dict]) -> "RetryPolicy":
+        """
+        Create a RetryPolicy from the `retry` section of a model provider config.
+
+        :param data: Dictionary with any of the constructor arguments.
+        :return: A RetryPolicy instance, using defaults for missing keys.
+        """
+        data = data or {}
+        return cls(
+            max_retries=data.get("max_retries", 3),
+            base_delay=data.get("base_delay", 1.0),
+            max_delay=data.get("max_delay", 30.0),
+            max_total_wait=data.get("max_total_wait", 60.0),
+            jitter=data.get("jitter", True),
+            retry_statuses=data.get("retry_statuses", cls.DEFAULT_RETRY_STATUSES),
+            status_max_retries={int(k): v for k, v in (data.get("status_max_retries") or {}).items()}
+        )
+
+    @classmethod
+    def disabled(cls) -> "RetryPolicy":
+        """A policy that never retries"""
+        return cls(max_retries=0)
+
+    def next_wait(self, status_code: int, attempt: int, retry_after: Optional[float] = None,
+                  waited: float = 0.0) -> Optional[float]:
+        """
+        Get the delay before the next attempt.
+
+        :param status_code: Status code of the failed attempt.
+        :param attempt: Number of retries already made.
+        :param retry_after: Seconds requested by the server's Retry-After header, if any.
+        :param waited: Seconds already spent waiting for this call.
+        :return: Seconds to wait, or None if the call should not be retried.
+        """
+        if status_code not in self.retry_statuses:
+            return None
+        if attempt >= self.status_max_retries.get(status_code, self.max_retries):
+            return None
+
+        if retry_after is not None:
+            delay = max(retry_after, 0.0)
+        else:
+            delay = min(self.base_delay * (2 ** attempt), self.max_delay)
+            if self.jitter:
+                # Equal jitter: keep half of the backoff and randomize the rest
+                delay = delay / 2 + random.uniform(0, delay / 2)
+
+        if waited + delay > self.max_total_wait:
+            return None
+        return delay
+
+    @staticmethod
+    def parse_retry_after(headers) -> Optional[float]:
+        """
+        Read the retry delay requested by the server.
+
+        :param headers: Response headers (case-insensitive mapping).
+        :return: Delay in seconds, or None if the server gave no hint.
+        """
+        if not headers:
+            return None
+        retry_after_ms = headers.get("retry-after-ms")
+        if retry_after_ms:
+            try:
+                return float(retry_after_ms) / 1000
+            except ValueError:
+                pass
+        retry_after = headers.get("retry-after")
+        if not retry_after:
+            return None
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+        try:
+            # Retry-After may also be an HTTP date
+            return max(parsedate_to_datetime(retry_after).timestamp() - time.time(), 0.0)
+        except (TypeError, ValueError):
+            return None
@@ -0,0 +1,106 @@
+import threading
+from typing import Dict, Optional
+
+from agentmesh.common.utils.log import logger
+
+# Context window sizes in tokens, matched by the longest model name prefix
+MODEL_CONTEXT_WINDOWS: Dict[str, int] = {
+    "gpt-4.1": 1047576,
+    "gpt-4o": 128000,
+    "gpt-4-turbo": 128000,
+    "gpt-4": 8192,
+    "gpt-3.5-turbo": 16385,
+    "o1": 200000,
+    "o3": 200000,
+    "o4": 200000,
+    "claude": 200000,
+    "deepseek": 65536,
+    "qwen": 131072,
+    "qwq": 131072,
+}
+
+DEFAULT_CONTEXT_WINDOW = 32768
+
+_encodings = {}
+_encodings_lock = threading.Lock()
+_tiktoken_missing = False
+
+
+# Use lazy import, tiktoken is optional and only gives more accurate counts
+def _import_tiktoken():
+    global _tiktoken_missing
+    if _tiktoken_missing:
+        return None
+    try:
+        import tiktoken
+        return tiktoken
+    except ImportError:
+        _tiktoken_missing = True
+        logger.debug("tiktoken is not installed, token counts are estimated from the text length. "
+                     "Install it with 'pip install tiktoken' for exact counts.")
+        return None
+
+
+def _get_encoding(model: Optional[str]):
+    tiktoken = _import_tiktoken()
+    if tiktoken is None:
+        return None
+    key = model or ""
+    encoding = _encodings.get(key)
+    if encoding is not None:
+        return encoding
+    with _encodings_lock:
+        try:
+            encoding = tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding("cl100k_base")
+        except (KeyError, ValueError):
+            # Models unknown to tiktoken (e.g. Claude, DeepSeek) are counted with a close general encoding
+            encoding = tiktoken.get_encoding("o200k_base" if model and model.startswith(("gpt-4.1", "o")) else
+                                             "cl100k_base")
+        _encodings[key] = encoding
+    return encoding
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """
+    Count the tokens of a text with a local tokenizer.
+
+    :param text: The text to count.
+    :param model: Name of the model whose tokenizer should be used.
+    :return: Number of tokens, estimated at about 4 characters per token when tiktoken is not installed.
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages: list, model: Optional[str] = None) -> int:
+    """
+    Count the prompt tokens of a message list, including a small per-message overhead.
+
+    :param messages: The chat messages of a request.
+    :param model: Name of the model whose tokenizer should be used.
+    :return: Number of tokens.
+    """
+    tokens = 0
+    for msg in messages:
+        content = msg.get("content", "")
+        tokens += 4 + count_tokens(content if isinstance(content, str) else str(content), model)
+    return tokens
+
+
+def get_context_window(model: Optional[str]) -> int:
+    """
+    Get the context window of a model.
+
+    :param model: The model name.
+    :return: Context window size in tokens, DEFAULT_CONTEXT_WINDOW for unknown models.
+    """
+    if not model:
+        return DEFAULT_CONTEXT_WINDOW
+    for prefix in sorted(MODEL_CONTEXT_WINDOWS, key=len, reverse=True):
+        if model.startswith(prefix):
+            return MODEL_CONTEXT_WINDOWS[prefix]
+    return DEFAULT_CONTEXT_WINDOW
@@ -3,12 +3,33 @@ from typing import Optional
 from agentmesh.common import config
 from agentmesh.common.enums import ModelProvider, ModelApiBase
 from agentmesh.models.llm.base_model import LLMModel
+from agentmesh.models.llm.cached_model import CachedModel, LLMCache
 from agentmesh.models.llm.claude_model import ClaudeModel
 from agentmesh.models.llm.deepseek_model import DeepSeekModel
+from agentmesh.models.llm.http_session import HttpConfig
 from agentmesh.models.llm.openai_model import OpenAIModel
+from agentmesh.models.llm.rate_limiter import RateLimiter
+from agentmesh.models.llm.retry import RetryPolicy
 
 
 class ModelFactory:
+    # Process-wide response cache shared by every model created by the factory
+    _llm_cache: Optional[LLMCache] = None
+
+    @classmethod
+    def get_llm_cache(cls) -> Optional[LLMCache]:
+        """
+        Get the shared LLM response cache if `llm_cache.enabled` is set in the config.
+
+        :return: The LLMCache instance, or None if caching is disabled.
+        """
+        cache_config = config().get("llm_cache", {})
+        if not cache_config.get("enabled", False):
+            return None
+        if cls._llm_cache is None:
+            cls._llm_cache = LLMCache.from_config(cache_config)
+        return cls._llm_cache
+
     def _determine_model_provider(self, model_name: str, model_provider: Optional[str] = None) -> str:
         """
         Determine the appropriate model provider based on model name and configuration.
@@ -56,20 +77,41 @@ class ModelFactory:
         provider = self._determine_model_provider(model_name, model_provider)
 
         # If api_base and api_key are not provided, load from config
-        if not api_base or not api_key:
-            model_config = config().get("models", {}).get(provider, {})
-            api_base = api_base or model_config.get("api_base")
-            api_key = api_key or model_config.get("api_key")
+        model_config = config().get("models", {}).get(provider, {})
+        api_base = api_base or model_config.get("api_base")
+        api_key = api_key or model_config.get("api_key")
+
+        # Connection pool, timeout and retry settings for the provider
+        http_config = HttpConfig.from_dict(model_config.get("http"))
+        retry_policy = RetryPolicy.from_dict(model_config.get("retry"))
+
+        # Per minute budgets and the cap on calls in flight, shared by every model using the same account
+        rate_limiter = RateLimiter.get_shared(provider, api_key, rpm=model_config.get("rpm"),
+                                              tpm=model_config.get("tpm"),
+                                              max_concurrency=model_config.get("max_concurrency"))
+
+        model_kwargs = dict(model=model_name, api_base=api_base, api_key=api_key, http_config=http_config,
+                            retry_policy=retry_policy, rate_limiter=rate_limiter)
 
         if provider == ModelProvider.OPENAI.value:
-            return OpenAIModel(model=model_name, api_base=api_base, api_key=api_key)
+            model = OpenAIModel(**model_kwargs)
         elif provider == ModelProvider.CLAUDE.value:
             if not api_base or api_base == ModelApiBase.CLAUDE.value:
-                return ClaudeModel(model=model_name, api_base=api_base, api_key=api_key)
+                model = ClaudeModel(**model_kwargs)
             else:
-                return LLMModel(model=model_name, api_base=api_base, api_key=api_key)
+                model = LLMModel(**model_kwargs)
         elif provider == ModelProvider.DEEPSEEK.value:
-            return DeepSeekModel(model=model_name, api_base=api_base, api_key=api_key)
+            model = DeepSeekModel(**model_kwargs)
         else:
             # Default to base LLMModel if provider is not recognized
-            return LLMModel(model=model_name, api_base=api_base, api_key=api_key)
+            model = LLMModel(**model_kwargs)
+
+        # Override the built-in context window, e.g. for fine-tuned or self-hosted models
+        if model_config.get("context_window"):
+            model.context_window = model_config["context_window"]
+
+        # Serve repeated deterministic calls from the cache when it is enabled
+        llm_cache = self.get_llm_cache()
+        if llm_cache:
+            model = CachedModel(model, llm_cache)
+        return model
@@ -1,5 +1,8 @@
 from .agent import Agent
 from .team import AgentTeam
 from .task import Task
+from .result import TeamResult, TokenUsage, ModelCall, ModelCallPurpose, StepTiming, BatchStats
+from .checkpoint import CheckpointStore, FileCheckpointStore, SQLiteCheckpointStore
 
-__all__ = ['Agent', 'AgentTeam', 'Task']  # Update as necessary
+__all__ = ['Agent', 'AgentTeam', 'Task', 'TeamResult', 'TokenUsage', 'ModelCall', 'ModelCallPurpose', 'StepTiming',
+           'BatchStats', 'CheckpointStore', 'FileCheckpointStore', 'SQLiteCheckpointStore']  # Update as necessary
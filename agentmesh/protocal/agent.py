@@ -1,20 +1,33 @@
+import asyncio
+import copy
 import json
+import re
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
 
-from agentmesh.common import LoadingIndicator
+from agentmesh.common import LoadingIndicator, config
 from agentmesh.common.utils import string_util
 from agentmesh.common.utils.log import logger
+from agentmesh.common.utils.tracing import trace_span, start_span, bind_context, SPAN_AGENT_STEP, SPAN_REACT_STEP, \
+    STATUS_OK, STATUS_ERROR
 from agentmesh.common.utils.xml_util import XmlResParser
-from agentmesh.models import LLMRequest, LLMModel
+from agentmesh.models import LLMRequest, LLMModel, parse_usage, merge_tool_call_deltas
+from agentmesh.models.llm.rate_limiter import estimate_tokens
+from agentmesh.models.llm.tokenizer import count_message_tokens, count_tokens
 from agentmesh.protocal.context import TeamContext, AgentOutput
-from agentmesh.protocal.result import AgentAction, AgentActionType, ToolResult, AgentResult
+from agentmesh.protocal.context_budget import ContextBudget
+from agentmesh.protocal.result import AgentAction, AgentActionType, ToolResult, AgentResult, ModelCall, \
+    ModelCallPurpose, TokenUsage, StepTiming
 from agentmesh.tools.base_tool import BaseTool
 from agentmesh.tools.base_tool import ToolStage
 
 
 class Agent:
     def __init__(self, name: str, system_prompt: str, description: str, model: LLMModel = None, team_context=None,
-                 tools=None, output_mode="print", max_steps=None):
+                 tools=None, output_mode="print", max_steps=None, tool_call_mode="xml", history_mode="snapshot",
+                 context_budget: ContextBudget = None, parallel_tool_calls=False, max_tool_workers=4):
         """
         Initialize the Agent with a name, system prompt, model, description, and optional group context.
 
@@ -27,23 +40,70 @@ class Agent:
         :param output_mode: Control how execution progress is displayed: 
                            "print" for console output or "logger" for using logger
         :param max_steps: Maximum number of steps the agent can take (default: None, meaning no limit)
+        :param tool_call_mode: How the model calls tools: "xml" for the <action>/<action_input> reply format,
+                               "native" for the provider's function calling API (falls back to "xml"
+                               if the provider rejects it)
+        :param history_mode: How steps are sent to the model: "snapshot" rebuilds one user message with the
+                             recent history every step, "append" keeps a stable system and task prefix and
+                             appends assistant and observation turns, so provider prefix caches can hit
+        :param context_budget: Optional budget that keeps the prompt within the model's context window,
+                               defaults to the `context_budget` config section
+        :param parallel_tool_calls: Whether the model may call several tools in one step. The calls run
+                                    concurrently and all observations are returned in the next turn
+        :param max_tool_workers: Max number of tool calls of one step running at the same time
         """
+        if tool_call_mode not in TOOL_CALL_MODES:
+            raise ValueError(f"Invalid tool_call_mode '{tool_call_mode}', must be one of {TOOL_CALL_MODES}")
+        if history_mode not in HISTORY_MODES:
+            raise ValueError(f"Invalid history_mode '{history_mode}', must be one of {HISTORY_MODES}")
         self.name = name
         self.system_prompt = system_prompt
         self.model: LLMModel = model  # Instance of LLMModel
         self.description = description
         self.team_context: TeamContext = team_context  # Store reference to group context if provided
-        self.subtask: str = ""
         self.tools: list = []
         self.max_steps = max_steps  # max ReAct steps, None means no limit
-        self.conversation_history = []
-        self.action_history = []
-        self.ext_data = ""
         self.output_mode = output_mode
+        self.tool_call_mode = tool_call_mode
+        self.history_mode = history_mode
+        self.context_budget = context_budget or ContextBudget.from_config(config().get("context_budget"))
+        self.parallel_tool_calls = parallel_tool_calls
+        self.max_tool_workers = max(max_tool_workers, 1)
+        self._reset_state()
         if tools:
             for tool in tools:
                 self.add_tool(tool)
 
+    def _reset_state(self):
+        """Clear the state of a run, everything else defines the agent"""
+        self.subtask: str = ""
+        self.conversation_history = []
+        self.action_history = []
+        self.ext_data = ""
+        self.final_answer = ""
+        self.model_calls = []  # Model calls of the current step, collected by the team
+        self.captured_actions = []
+        self.task_start_time = None  # When the agent started its subtask, shown as the current time
+        self._formatted_actions = {}  # id of an action history entry -> (entry, json text)
+        self.resume_step = None  # Finished steps of a subtask restored from a checkpoint, see AgentTeam.resume
+        self.handoff = None  # Next member proposed in the final reply, see AgentTeam(fold_handoff=True)
+
+    def copy(self, team_context: TeamContext = None) -> "Agent":
+        """
+        Create an agent with the same definition and copies of the tools, without the state of any run.
+        Teams run their tasks with copies of their agents, so one team can run several tasks at the same time.
+
+        :param team_context: The context of the run the copy belongs to.
+        :return: The new Agent.
+        """
+        agent = copy.copy(self)
+        agent.team_context = team_context
+        agent._reset_state()
+        agent.tools = []
+        for tool in self.tools:
+            agent.add_tool(tool.copy())
+        return agent
+
     def add_tool(self, tool: BaseTool):
         """
         Add a tool to the agent.
@@ -64,19 +124,37 @@ class Agent:
 
     def _build_react_prompt(self) -> str:
         """Build the initial prompt template"""
-        tools_list = self._build_tools_prompt()
+        return self._build_react_prompt_head() + self._build_react_prompt_context()
 
-        # Get the current timestamp
-        timestamp = time.time()
+    def _build_tool_schemas(self) -> list:
+        """Build the native tool definitions, only including pre-process tools"""
+        schemas = []
+        for tool in self.tools:
+            if tool.stage == ToolStage.PRE_PROCESS:
+                schema = tool.get_json_schema()
+                # Function calling APIs require an object schema even for tools without parameters
+                schema["parameters"] = schema.get("parameters") or {"type": "object", "properties": {}}
+                schemas.append(schema)
+        return schemas
+
+    def _build_react_prompt_head(self) -> str:
+        """Build the static head of the prompt (role, tools and reply format), stable across steps"""
+        if self.tool_call_mode == "native":
+            # Tools are sent as native definitions, so the prompt only explains how to reply
+            return f"""## Role
+Your role: {self.name}
+Your role description: {self.description}
+You are handling the subtask: {self.subtask}, as a member of the {self.team_context.name} team. Please answer in the same language as the user's original task.
 
-        # Convert the timestamp to local time
-        local_time = time.localtime(timestamp)
+## Reply format
+1. Briefly explain your analysis of the current situation, then call the tools you need. Independent tools can be called together in one reply.
+2. When the final answer is obtained, reply with the final answer directly without calling any tool. The final answer should be as detailed and rich as possible.
+3. Your analysis and final answer need to be consistent with the language used by the user original task.
+""" + self._build_handoff_prompt()
 
-        # Format the time
-        formatted_time = time.strftime("%Y-%m-%d %H:%M:%S", local_time)
-        ext_data_prompt = self.ext_data
+        tools_list = self._build_tools_prompt()
 
-        tools_prompt = f"""## Role
+        return f"""## Role
 Your role: {self.name}
 Your role description: {self.description}
 You are handling the subtask: {self.subtask}, as a member of the {self.team_context.name} team. Please answer in the same language as the user's original task.
@@ -87,14 +165,44 @@ You are handling the subtask: {self.subtask}, as a member of the {self.team_cont
 ## Reply format 
 Please respond strictly in the following format:
 <thought> Analyze the current situation and the next action </thought>
-<action> Tool name, must be one of available tools. The value can be null when final_answer is obtained </action>
+<action> Tool name, must be one of available tools. Omit this label and action_input when final_answer is obtained </action>
 <action_input> Tool parameters in JSON format </action_input>
 <final_answer> The final answer should be as detailed and rich as possible. If there is no final answer, do not show this label </final_answer>
 
 ## Attention
 1. The content of thought and final_answer needs to be consistent with the language used by the user original task.
-2. Make only one decision at a time. Do not generate multiple tool calls in a single response.
-"""
+2. {self._build_tool_call_rule()}
+""" + self._build_handoff_prompt()
+
+    def _build_tool_call_rule(self) -> str:
+        """Build the rule on how many tool calls a reply may contain"""
+        if self.parallel_tool_calls:
+            return "To call several independent tools at once, repeat the <action> and <action_input> pair " \
+                   "for each call. They run at the same time and all observations are returned together, " \
+                   "so only combine calls that do not depend on each other's results."
+        return "Make only one decision at a time. Do not generate multiple tool calls in a single response."
+
+    def _build_handoff_prompt(self) -> str:
+        """Build the rule on proposing the next member in the final answer, empty unless the team folds handoffs"""
+        if not self.team_context.fold_handoff:
+            return ""
+        members_str = self._build_members_str()
+        if not members_str:
+            return ""
+        return HANDOFF_PROMPT.format(agents_str=members_str, group_rules=self.team_context.rule)
+
+    def _build_react_prompt_context(self) -> str:
+        """Build the dynamic part of the prompt that changes between steps"""
+        # Use the time the subtask started, so the prompt does not change on every step
+        timestamp = self.task_start_time or time.time()
+
+        # Convert the timestamp to local time
+        local_time = time.localtime(timestamp)
+
+        # Format the time
+        formatted_time = time.strftime("%Y-%m-%d %H:%M:%S", local_time)
+        ext_data_prompt = self.context_budget.fit_text(ContextBudget.EXT_DATA, self.ext_data, self._get_model(),
+                                                       self._record_budget_call)
 
         current_task_prompt = f"""
 ## Current task context:
@@ -102,12 +210,12 @@ Current time: {formatted_time}
 Team description: {self.team_context.description}
 
 ## Other agents output:
-{self._fetch_agents_outputs()}
+{self._fetch_agents_outputs(self._record_budget_call)}
 
 ## Your sub task
 {self.subtask}"""
 
-        return tools_prompt + ext_data_prompt + current_task_prompt
+        return ext_data_prompt + current_task_prompt
 
     def _find_tool(self, tool_name: str):
         """Find and return a tool with the specified name"""
@@ -137,184 +245,758 @@ Team description: {self.team_context.description}
 
         :return: A StepResult object containing the final answer and step count
         """
-        final_answer = None
-        current_step = 0
+        with trace_span(SPAN_AGENT_STEP, self._span_attributes()) as span:
+            state = self._begin_step()
+            try:
+                result = self._run_steps(state)
+            finally:
+                self._end_step_span(state)
+            self._trace_step_result(span, result)
+            return result
+
+    def _run_steps(self, state: "StepState"):
+        """The ReAct loop of step"""
+        # Use max_steps if set, otherwise continue until final answer is found
+        while (self.max_steps is None or state.current_step < self.max_steps) and not state.final_answer:
+            error_result = self._count_team_step(state)
+            if error_result:
+                return error_result
+            hooks = self._get_hooks()
+            if hooks:
+                hooks.on_step_start(self, state.current_step + 1)
+            self._start_step_span(state)
+
+            model_to_use, request = self._build_step_request(state)
+
+            # Get model response based on tool call mode and output mode
+            if self.tool_call_mode == "native":
+                parsed, error_result = self._call_model_native(model_to_use, request, state)
+            elif request.stream:
+                parsed, error_result = self._call_model_stream(model_to_use, request, state)
+            else:
+                # Non-streaming mode for logger
+                request_start = time.time()
+                response = model_to_use.call(request)
+                state.timing.model_latency = time.time() - request_start
+                parsed, error_result = self._handle_xml_response(response, model_to_use, state)
+            if error_result:
+                return self._cancelled_result(state) or error_result
+            if parsed is None:
+                # The provider rejected native tools, redo this step in the XML reply format
+                self.team_context.current_steps -= 1
+                continue
+
+            self._capture_step(parsed, request, state)
+            outcome, tool_calls = self._resolve_reply(parsed, state)
+            if outcome == STEP_FINAL:
+                # Execute all post-process tools
+                self._execute_post_process_tools()
+                break
+            if outcome == STEP_RETRY:
+                continue
+            if outcome == STEP_STOP:
+                break
 
-        # Initialize captured actions list (if it doesn't exist)
-        if not hasattr(self, 'captured_actions'):
-            self.captured_actions = []
+            tools_start = time.time()
+            self._run_tool_calls(tool_calls)
+            state.timing.tool_time = time.time() - tools_start
+            if state.drain:
+                # The rest of the reply was read while the tools ran, the call now has its real usage
+                state.drain.join()
+            self._record_step_turns(parsed, tool_calls, state, model_to_use)
+            state.current_step += 1
+            self._checkpoint_step(state)
 
-        # Initialize final answer (if it doesn't exist)
-        if not hasattr(self, 'final_answer'):
-            self.final_answer = ""
+        return self._end_step(state)
+
+    async def astep(self):
+        """
+        Coroutine version of step. Model calls are awaited, blocking tools run in an executor and
+        prompt building, which may summarize sections with the model, runs in the default executor.
+
+        :return: A StepResult object containing the final answer and step count
+        """
+        with trace_span(SPAN_AGENT_STEP, self._span_attributes()) as span:
+            state = self._begin_step()
+            try:
+                result = await self._arun_steps(state)
+            finally:
+                self._end_step_span(state)
+            self._trace_step_result(span, result)
+            return result
+
+    async def _arun_steps(self, state: "StepState"):
+        """Coroutine version of _run_steps"""
+        loop = asyncio.get_running_loop()
+        while (self.max_steps is None or state.current_step < self.max_steps) and not state.final_answer:
+            error_result = self._count_team_step(state)
+            if error_result:
+                return error_result
+            hooks = self._get_hooks()
+            if hooks:
+                hooks.on_step_start(self, state.current_step + 1)
+            self._start_step_span(state)
+
+            model_to_use, request = await loop.run_in_executor(None, bind_context(self._build_step_request, state))
+
+            if self.tool_call_mode == "native":
+                parsed, error_result = await self._acall_model_native(model_to_use, request, state)
+            elif request.stream:
+                parsed, error_result = await self._acall_model_stream(model_to_use, request, state)
+            else:
+                request_start = time.time()
+                response = await model_to_use.acall(request)
+                state.timing.model_latency = time.time() - request_start
+                parsed, error_result = self._handle_xml_response(response, model_to_use, state)
+            if error_result:
+                return self._cancelled_result(state) or error_result
+            if parsed is None:
+                self.team_context.current_steps -= 1
+                continue
+
+            self._capture_step(parsed, request, state)
+            outcome, tool_calls = self._resolve_reply(parsed, state)
+            if outcome == STEP_FINAL:
+                await self._aexecute_post_process_tools()
+                break
+            if outcome == STEP_RETRY:
+                continue
+            if outcome == STEP_STOP:
+                break
+
+            tools_start = time.time()
+            await self._arun_tool_calls(tool_calls)
+            state.timing.tool_time = time.time() - tools_start
+            if state.drain:
+                await state.drain.ajoin()
+            await loop.run_in_executor(None, bind_context(self._record_step_turns, parsed, tool_calls, state,
+                                                          model_to_use))
+            state.current_step += 1
+            await loop.run_in_executor(None, bind_context(self._checkpoint_step, state))
+
+        return self._end_step(state)
+
+    def _begin_step(self) -> "StepState":
+        """Reset the records of the previous step and create the state of the step loop"""
+        # Actions are captured per step, like the model calls
+        self.captured_actions = []
+
+        # Model calls are collected per step
+        self.model_calls = []
+        self.task_start_time = time.time()
 
         # Print agent name and subtask
         self.output(f"🤖 {self.name.strip()}: {self.subtask}")
 
-        # Use max_steps if set, otherwise continue until final answer is found
-        while (self.max_steps is None or current_step < self.max_steps) and not final_answer:
-            # Check if team's max_steps will be exceeded with this step
-            if self.team_context.current_steps >= self.team_context.max_steps:
-                logger.warning(f"Team's max steps ({self.team_context.max_steps}) reached. Stopping agent execution.")
-                return AgentResult.error("Team's max steps reached", current_step)
+        # Stop right after the tool call, the model must not go on to imagine the observation.
+        # Several tool calls can only be received if the reply does not end at the first one
+        state = StepState(stop_sequences=PARALLEL_REACT_STOP_SEQUENCES if self.parallel_tool_calls
+                          else REACT_STOP_SEQUENCES, ext_data=self.ext_data)
+
+        resume_step, self.resume_step = self.resume_step, None
+        if resume_step is not None:
+            # Continue the subtask of a resumed run after its last finished step
+            state.current_step = resume_step.current_step
+            state.turns = list(resume_step.turns)
+            state.sent_ext_data = resume_step.sent_ext_data
+            self.model_calls = list(resume_step.model_calls)
+            self.captured_actions = list(resume_step.captured_actions)
+            self.task_start_time = resume_step.task_start_time or self.task_start_time
+        state.checkpoint_marks = (len(self.action_history), len(self.conversation_history), len(self.model_calls),
+                                  len(state.turns), len(self.captured_actions))
+        return state
+
+    def _span_attributes(self) -> dict:
+        return {"agentmesh.agent.name": self.name, "agentmesh.agent.subtask": self.subtask,
+                "agentmesh.agent.tool_call_mode": self.tool_call_mode}
+
+    @staticmethod
+    def _trace_step_result(span, result: AgentResult):
+        """Set the outcome of the subtask on its agent.step span"""
+        if span is None:
+            return
+        span.set_attributes({"agentmesh.agent.status": result.status, "agentmesh.agent.steps": result.step_count})
+        if result.status == "success":
+            span.set_status(STATUS_OK)
+        else:
+            span.set_status(STATUS_ERROR, result.error_message or result.status)
+
+    def _start_step_span(self, state: "StepState"):
+        """End the span of the previous ReAct step and start the span of the next one"""
+        self._end_step_span(state)
+        state.span = start_span(SPAN_REACT_STEP, {"agentmesh.agent.name": self.name,
+                                                  "agentmesh.step": state.current_step + 1})
+
+    @staticmethod
+    def _end_step_span(state: "StepState"):
+        span, state.span = state.span, None
+        if span is None:
+            return
+        if state.timing is not None:
+            span.set_attributes({"agentmesh.{}".format(key): value for key, value in state.timing.to_dict().items()
+                                 if key != "step"})
+        span.end()
+
+    def _checkpoint_step(self, state: "StepState"):
+        """Write the finished step to the checkpoint of the run, if the run is checkpointed"""
+        checkpoint = getattr(self.team_context, "checkpoint", None)
+        if checkpoint is not None:
+            checkpoint.step(self.team_context.agents.index(self), self, state)
+
+    def _end_step(self, state: "StepState"):
+        # Return a StepResult object
+        return AgentResult.success(
+            final_answer=self.final_answer,
+            step_count=state.current_step + 1  # +1 because we count steps starting from 1
+        )
+
+    def _count_team_step(self, state: "StepState"):
+        """
+        Count a step against the team's max_steps.
+
+        :return: The result ending the step loop if the run was cancelled or the steps are used up, else None
+        """
+        cancelled_result = self._cancelled_result(state)
+        if cancelled_result:
+            return cancelled_result
+
+        # Check if team's max_steps will be exceeded with this step
+        if self.team_context.current_steps >= self.team_context.max_steps:
+            logger.warning(f"Team's max steps ({self.team_context.max_steps}) reached. Stopping agent execution.")
+            return AgentResult.error("Team's max steps reached", state.current_step)
+
+        # Increment team's step counter
+        self.team_context.current_steps += 1
+        return None
+
+    def _get_hooks(self):
+        """Get the HookDispatcher of the team, None if no hooks are registered"""
+        hooks = getattr(self.team_context, "hooks", None)
+        return hooks if hooks else None
+
+    def _get_cancel_token(self):
+        """Get the cancellation token of the current team run, None if it cannot be cancelled"""
+        return getattr(self.team_context, "cancel_token", None)
 
-            # Increment team's step counter
-            self.team_context.current_steps += 1
+    def _cancelled_result(self, state: "StepState"):
+        """Get the result of a step stopped by the cancellation token, None if the run goes on"""
+        cancel_token = self._get_cancel_token()
+        if cancel_token is None or not cancel_token.is_cancelled:
+            return None
+        self.output(f"Agent {self.name} stopped: {cancel_token.reason}")
+        return AgentResult.cancelled(cancel_token.reason, state.current_step)
 
-            user_prompt = self._build_react_prompt() + "\n\n## Historical steps:\n"
+    def _build_step_request(self, state: "StepState"):
+        """
+        Build the model request of the next step.
+
+        :param state: The state of the step loop
+        :return: A (model, request) tuple
+        """
+        build_start = time.time()
+        state.raw_response = ""
+        prompt_head = self._build_react_prompt_head()
+        if self.history_mode == "append":
+            if state.task_prefix is None:
+                state.task_prefix = prompt_head + self._build_react_prompt_context()
+            messages = [
+                {"role": "system", "content": self.system_prompt},
+                {"role": "user", "content": state.task_prefix}
+            ] + self._window_turns(state.turns)
+            # Cache the task prefix and everything up to the latest observation
+            cache_prefixes = {1: len(prompt_head)}
+            if len(messages) > 2 and isinstance(messages[-1]["content"], str):
+                cache_prefixes[len(messages) - 1] = len(messages[-1]["content"])
+        else:
+            user_prompt = prompt_head + self._build_react_prompt_context() + "\n\n## Historical steps:\n"
             if self.action_history:
-                user_prompt += f"\n{json.dumps(self.action_history[-10:], ensure_ascii=False, indent=4)}"
+                user_prompt += f"\n{self._format_action_history()}"
             messages = [
                 {"role": "system", "content": self.system_prompt},
                 {"role": "user", "content": user_prompt}
             ]
+            cache_prefixes = {1: len(prompt_head)}
 
-            # Get the model to use - use agent's model if set, otherwise use team's model
-            model_to_use = self.model if self.model else self.team_context.model
+        # Get the model to use - use agent's model if set, otherwise use team's model
+        model_to_use = self._get_model()
 
-            # Generate model request
-            request = LLMRequest(
-                messages=messages,
-                temperature=0,
-                json_format=False,
-                stream=self.output_mode == "print"  # Only stream in print mode
-            )
+        native = self.tool_call_mode == "native"
 
-            # Get model response based on output mode
-            if self.output_mode == "print":
-                # Start loading animation before getting model response (only in print mode)
-                print()
-                loading = LoadingIndicator(message="Thinking...", animation_type="spinner")
-                loading.start()
+        # Generate model request
+        request = LLMRequest(
+            messages=messages,
+            temperature=0,
+            json_format=False,
+            stream=self.output_mode == "print",  # Only stream in print mode
+            cache_prefixes=cache_prefixes,  # Stable prefixes can be served from the prompt cache
+            # No max_tokens: tool steps end at the stop sequence, and a final answer may be a whole document
+            stop=None if native else state.stop_sequences,
+            tools=self._build_tool_schemas() if native else None,
+            cancel_token=self._get_cancel_token()
+        )
+        state.timing = StepTiming(step=state.current_step + 1,
+                                  prompt_chars=sum(len(message["content"]) for message in messages
+                                                   if isinstance(message.get("content"), str)),
+                                  prompt_build_time=time.time() - build_start)
+        return model_to_use, request
 
-                # Stream response in print mode
-                stream_response = model_to_use.call_stream(request)
-                parser = XmlResParser()
-                raw_response = ""
-
-                first_token = True
-                for chunk in stream_response:
-                    # Check if this is an error chunk
-                    if isinstance(chunk, dict) and chunk.get("error", False):
-                        if loading:
-                            loading.stop()
-                        error_message = chunk.get("message", "Unknown error")
-                        status_code = chunk.get("status_code", 0)
-                        # Use logger to record errors, no need to duplicate printing
-                        logger.error(f"Error: {error_message} (Status code: {status_code})")
-                        return AgentResult.error(error_message, current_step)
-
-                    if first_token:
-                        first_token = False
-                        if loading:
-                            loading.stop()
-                        print(f"Step {current_step + 1}:")
-
-                    # Ensure chunk is in the correct format
-                    if isinstance(chunk, dict):
-                        if "choices" in chunk and len(chunk["choices"]) > 0:
-                            delta = chunk["choices"][0].get("delta", {})
-                            if "content" in delta:
-                                content = delta["content"]
-                                raw_response += content
-                                # Use parser to process each streaming content chunk
-                                parser.process_chunk(content)
-                    else:
-                        # If chunk is a string, process it directly
-                        raw_response += chunk
-                        parser.process_chunk(chunk)
-
-                # Get parsing results
-                parsed = parser.get_parsed_data()
-            else:
-                # Non-streaming mode for logger
-                response = model_to_use.call(request)
+    def _call_model_stream(self, model: LLMModel, request: LLMRequest, state: "StepState"):
+        """
+        Stream an XML reply, dispatching tools as soon as the tool calls are complete.
 
-                # Check if the API call was successful
-                if response.is_error:
-                    error_message = response.get_error_msg()
-                    # Use logger to record errors, no need to duplicate printing
-                    logger.error(f"Error: {error_message}")
-                    return AgentResult.error(error_message, current_step)
+        :return: A (parsed, error_result) tuple
+        """
+        # Start loading animation before getting model response (only in print mode)
+        print()
+        loading = LoadingIndicator(message="Thinking...", animation_type="spinner")
+        loading.start()
 
-                raw_response = response.data["choices"][0]["message"]["content"]
+        reader = XmlStreamReader(self, state.current_step, loading, timing=state.timing)
+        stream_response = model.call_stream(request)
+        for chunk in stream_response:
+            if not reader.feed(chunk):
+                break
 
-                # Parse the response
-                parser = XmlResParser()
-                parser.process_chunk(raw_response)
-                parsed = parser.get_parsed_data()
-
-                # Log the parsed data in a structured way
-                if "thought" in parsed:
-                    logger.info(f"🧠 {parsed['thought']}")
-                if "action" in parsed and parsed["action"] and parsed["action"].lower() not in ["null", "none"]:
-                    action_input = parsed.get("action_input", {})
-                    action_input_str = json.dumps(action_input, ensure_ascii=False) if action_input else ""
-                    logger.info(f"🛠️ {parsed['action']}: {action_input_str}")
-                if "final_answer" in parsed and parsed["final_answer"] and parsed["final_answer"].lower() not in [
-                    "null", "none"]:
-                    logger.info(f"💬 {parsed['final_answer']}")
-
-            # Handle final answer
-            if "final_answer" in parsed and parsed["final_answer"] and parsed["final_answer"].lower() not in ["null",
-                                                                                                              "none"]:
-                final_answer = parsed["final_answer"]
-                self.final_answer = final_answer
-
-                # Store the final answer in team context
-                self.team_context.agent_outputs.append(
-                    AgentOutput(agent_name=self.name, output=final_answer)
-                )
+        state.raw_response = reader.raw_response
+        result = reader.finish(model, request)
+        state.drain = reader.release(stream_response, request)
+        return result
 
-                # Execute all post-process tools
-                self._execute_post_process_tools()
+    async def _acall_model_stream(self, model: LLMModel, request: LLMRequest, state: "StepState"):
+        """Coroutine version of _call_model_stream, without the loading animation thread"""
+        print()
+        reader = XmlStreamReader(self, state.current_step, timing=state.timing)
+        stream_response = model.acall_stream(request)
+        try:
+            async for chunk in stream_response:
+                if not reader.feed(chunk):
+                    break
+        except BaseException:
+            await stream_response.aclose()
+            raise
+
+        state.raw_response = reader.raw_response
+        result = reader.finish(model, request)
+        state.drain = await reader.arelease(stream_response, request)
+        return result
+
+    def _handle_xml_response(self, response, model: LLMModel, state: "StepState"):
+        """
+        Parse a non-streamed XML reply.
 
-                break
+        :return: A (parsed, error_result) tuple
+        """
+        # Check if the API call was successful
+        if response.is_error:
+            error_message = response.get_error_msg()
+            # Use logger to record errors, no need to duplicate printing
+            logger.error(f"Error: {error_message}")
+            return None, AgentResult.error(error_message, state.current_step)
+
+        self.record_model_call(ModelCallPurpose.REACT_STEP, response.usage, model=model.model,
+                               cached=response.cached)
+        state.raw_response = response.data["choices"][0]["message"]["content"]
+        hooks = self._get_hooks()
+        if hooks:
+            hooks.on_token(self, state.raw_response)
+
+        # Parse the response
+        parse_start = time.time()
+        parser = XmlResParser(parallel_tool_calls=self.parallel_tool_calls)
+        parser.process_chunk(state.raw_response)
+        parsed = parser.get_parsed_data()
+        state.timing.parse_time = time.time() - parse_start
+
+        # Log the parsed data in a structured way
+        if "thought" in parsed:
+            logger.info(f"🧠 {parsed['thought']}")
+        if parsed.get("actions"):
+            for tool_call in parsed["actions"]:
+                logger.info(f"🛠️ {tool_call['action']}: "
+                            f"{json.dumps(tool_call['action_input'], ensure_ascii=False)}")
+        elif "action" in parsed and parsed["action"] and parsed["action"].lower() not in ["null", "none"]:
+            action_input = parsed.get("action_input", {})
+            action_input_str = json.dumps(action_input, ensure_ascii=False) if action_input else ""
+            logger.info(f"🛠️ {parsed['action']}: {action_input_str}")
+        if "final_answer" in parsed and parsed["final_answer"] and parsed["final_answer"].lower() not in [
+            "null", "none"]:
+            logger.info(f"💬 {parsed['final_answer']}")
+        return parsed, None
+
+    def _capture_step(self, parsed: dict, request: LLMRequest, state: "StepState"):
+        """Capture the reply of a step as a thinking action carrying the timing of the step"""
+        timing = state.timing
+        step_calls = [call for call in self.model_calls if call.purpose == ModelCallPurpose.REACT_STEP]
+        timing.prompt_tokens = step_calls[-1].usage.prompt_tokens if step_calls else 0
+        if not timing.prompt_tokens:
+            timing.prompt_tokens = estimate_tokens(request.messages)
+        self.capture_thinking(parsed.get("thought", ""), timing=timing)
+
+    def _resolve_reply(self, parsed: dict, state: "StepState"):
+        """
+        Decide how the step loop continues after a reply.
+
+        :param parsed: The parsed model reply
+        :param state: The state of the step loop
+        :return: An (outcome, tool_calls) tuple, outcome is one of STEP_FINAL, STEP_TOOLS, STEP_RETRY
+                 and STEP_STOP, tool_calls is only set for STEP_TOOLS
+        """
+        # Handle final answer
+        if "final_answer" in parsed and parsed["final_answer"] and parsed["final_answer"].lower() not in ["null",
+                                                                                                          "none"]:
+            state.final_answer = parsed["final_answer"]
+            if self.team_context.fold_handoff:
+                state.final_answer, self.handoff = self._split_handoff(state.final_answer)
+            self.final_answer = state.final_answer
+            self.capture_final_answer(state.final_answer)
+
+            # Store the final answer in team context
+            self.team_context.agent_outputs.append(
+                AgentOutput(agent_name=self.name, output=state.final_answer)
+            )
+            return STEP_FINAL, None
+
+        # Handle tool invocation, native replies may carry several tool calls
+        tool_calls = parsed.get("tool_calls")
+        if tool_calls is None and parsed.get("actions"):
+            tool_calls = [dict(tool_call, thought=parsed.get("thought", "")) for tool_call in parsed["actions"]]
+        if tool_calls is None and "action" in parsed and parsed["action"] \
+                and parsed["action"].lower() not in ["null", "none"]:
+            tool_calls = [parsed]
+        if tool_calls:
+            return STEP_TOOLS, tool_calls
+
+        if state.stop_sequences is REACT_STOP_SEQUENCES and "<action_input>" in state.raw_response:
+            # A null action was followed by action_input, so the stop sequence cut off the final answer.
+            # Ask again without stop sequences, this retry does not count as a step
+            logger.debug("Stop sequence truncated the final answer, retrying the step without it")
+            state.stop_sequences = None
+            self.team_context.current_steps -= 1
+            return STEP_RETRY, None
+
+        # No action, end loop
+        self.output("No action error, end step")
+        return STEP_STOP, None
+
+    def _record_step_turns(self, parsed: dict, tool_calls: list, state: "StepState", model: LLMModel):
+        """Append the reply and observations of a step to the conversation of the append history mode"""
+        if self.history_mode != "append":
+            return
+        # Only send ext_data again when a tool changed it
+        new_ext_data = self.ext_data if self.ext_data != state.sent_ext_data else ""
+        state.sent_ext_data = self.ext_data
+        step_turns = self._build_turns(parsed, tool_calls, state.raw_response, new_ext_data)
+        # A single observation may use at most half of the history budget
+        observation_budget = self.context_budget.section_budget(ContextBudget.ACTION_HISTORY, model) // 2
+        for turn in step_turns:
+            if turn["role"] != "assistant":
+                turn["content"] = self.context_budget.fit_text(
+                    ContextBudget.ACTION_HISTORY, turn["content"], model,
+                    self._record_budget_call, max_tokens=observation_budget)
+        state.turns.append(step_turns)
+
+    def _call_model_native(self, model: LLMModel, request: LLMRequest, state: "StepState"):
+        """
+        Query the model with native tool definitions and collect its structured tool calls.
+
+        :param model: The model to query
+        :param request: The request carrying the tool definitions
+        :param state: The state of the step loop, its step index is used for output and error results
+        :return: A (parsed, error_result) tuple. parsed holds a thought and tool_calls, or a final_answer,
+                 and is None when the provider rejected native tools
+        """
+        if request.stream:
+            print()
+            loading = LoadingIndicator(message="Thinking...", animation_type="spinner")
+            loading.start()
+            reader = NativeStreamReader(self, state.current_step, loading, timing=state.timing)
+            stream_response = model.call_stream(request)
+            for chunk in stream_response:
+                if not reader.feed(chunk):
+                    break
+            stream_response.close()
+            return self._finish_native_reply(model, request, state, *reader.result())
+        request_start = time.time()
+        response = model.call(request)
+        state.timing.model_latency = time.time() - request_start
+        return self._finish_native_reply(model, request, state, *self._native_response_result(response))
+
+    async def _acall_model_native(self, model: LLMModel, request: LLMRequest, state: "StepState"):
+        """Coroutine version of _call_model_native, without the loading animation thread"""
+        if request.stream:
+            print()
+            reader = NativeStreamReader(self, state.current_step, timing=state.timing)
+            stream_response = model.acall_stream(request)
+            try:
+                async for chunk in stream_response:
+                    if not reader.feed(chunk):
+                        break
+            finally:
+                await stream_response.aclose()
+            return self._finish_native_reply(model, request, state, *reader.result())
+        request_start = time.time()
+        response = await model.acall(request)
+        state.timing.model_latency = time.time() - request_start
+        return self._finish_native_reply(model, request, state, *self._native_response_result(response))
+
+    @staticmethod
+    def _native_response_result(response):
+        """Get the (message, usage, cached, error) of a non-streamed native reply"""
+        if response.is_error:
+            return None, None, False, (response.status_code, response.get_error_msg())
+        return response.data["choices"][0]["message"], response.usage, response.cached, None
+
+    def _finish_native_reply(self, model: LLMModel, request: LLMRequest, state: "StepState", message, usage,
+                             cached, error):
+        """Account and parse a native reply, switching to XML replies if the provider rejected the tools"""
+        if error is not None:
+            status_code, error_message = error
+            if status_code == 400 and NATIVE_TOOLS_UNSUPPORTED_PATTERN.search(error_message or ""):
+                # Other bad requests, e.g. a prompt longer than the context window, are errors of the step
+                logger.warning(f"{model.model} does not support native tool calling, falling back to XML replies: "
+                               f"{error_message}")
+                self.tool_call_mode = "xml"
+                return None, None
+            logger.error(f"Error: {error_message} (Status code: {status_code})")
+            return None, AgentResult.error(error_message, state.current_step)
+
+        self.record_model_call(ModelCallPurpose.REACT_STEP, usage, model=model.model, cached=cached)
+        hooks = self._get_hooks()
+        if hooks and not request.stream and message.get("content"):
+            hooks.on_token(self, message["content"])
+        parse_start = time.time()
+        parsed = self._parse_native_message(message)
+        state.timing.parse_time = time.time() - parse_start
+        if "thought" in parsed and parsed["thought"] and not request.stream:
+            logger.info(f"🧠 {parsed['thought']}")
+        for tool_call in parsed.get("tool_calls", []):
+            action_input_str = json.dumps(tool_call["action_input"], ensure_ascii=False)
+            self.output(f"\n🛠️ {tool_call['action']}: {action_input_str}")
+        if parsed.get("final_answer") and not request.stream:
+            logger.info(f"💬 {parsed['final_answer']}")
+        return parsed, None
+
+    @staticmethod
+    def _parse_native_message(message: dict) -> dict:
+        """Convert an OpenAI-shaped assistant message into the parsed step format"""
+        content = message.get("content") or ""
+        tool_calls = message.get("tool_calls") or []
+        if not tool_calls:
+            if "<action>" in content or "<final_answer>" in content:
+                # The model replied in the XML format anyway, parse it the way the XML mode does
+                parser = XmlResParser()
+                parser.process_chunk(content)
+                return parser.get_parsed_data()
+            return {"final_answer": content.strip()}
+
+        parsed_calls = []
+        for tool_call in tool_calls:
+            function = tool_call.get("function", {})
+            try:
+                action_input = json.loads(function.get("arguments") or "{}")
+            except json.JSONDecodeError:
+                action_input = function.get("arguments")
+            parsed_calls.append({
+                "thought": content.strip(),
+                "action": function.get("name", ""),
+                "action_input": action_input,
+                "tool_call_id": tool_call.get("id", "")
+            })
+        return {"thought": content.strip(), "tool_calls": parsed_calls}
+
+    @staticmethod
+    def _build_turns(parsed: dict, tool_calls: list, raw_response: str, ext_data: str = "") -> list:
+        """
+        Build the assistant and observation messages of one step for the append history mode.
 
-            # Handle tool invocation
-            if "action" in parsed and parsed["action"] and parsed["action"].lower() not in ["null", "none"]:
-                # Execute tool
-                tool: BaseTool = self._find_tool(parsed["action"])
-                observation = ""
-                if tool:
-                    tool_result = tool.execute_tool(parsed.get("action_input", {}))
-                    # Update conversation history
-                    parsed["Observation"] = {
-                        "status": tool_result.status,
-                        "result": tool_result.result
-                    }
-
-                    # Log tool execution errors
-                    if tool_result.status == "error":
-                        logger.error(f"Tool execution error: {tool_result.result}")
-
-                    if tool_result.ext_data:
-                        self.ext_data = tool_result.ext_data
-                self.action_history.append(parsed)
-                self.conversation_history.append({
-                    "role": "assistant",
-                    "content": f"Thought: {parsed.get('thought', '')}\n"
-                               f"Action: {parsed['action']}\n"
-                               f"Action Input: {json.dumps(parsed.get('action_input', {}))}"
+        :param parsed: The parsed model reply
+        :param tool_calls: The executed tool calls, carrying their observations
+        :param raw_response: The raw reply text in the XML mode
+        :param ext_data: Extra state reported by the tools in this step, if it changed
+        :return: The messages to append to the conversation
+        """
+        if parsed.get("tool_calls") is not None:
+            # Native tool calls are answered with one tool message per call
+            turns = [{
+                "role": "assistant",
+                "content": parsed.get("thought", ""),
+                "tool_calls": [{
+                    "id": tool_call["tool_call_id"],
+                    "type": "function",
+                    "function": {"name": tool_call["action"],
+                                 "arguments": json.dumps(tool_call.get("action_input", {}), ensure_ascii=False)}
+                } for tool_call in tool_calls]
+            }]
+            for tool_call in tool_calls:
+                turns.append({
+                    "role": "tool",
+                    "tool_call_id": tool_call["tool_call_id"],
+                    "content": json.dumps(tool_call.get("Observation", {}), ensure_ascii=False)
                 })
-                if observation:
-                    # print(f"\n📊 Observation: {observation}")
-                    self.conversation_history.append({
-                        "role": "user",
-                        "content": f"Observation: {observation}"
-                    })
+            if ext_data:
+                turns.append({"role": "user", "content": ext_data})
+            return turns
+
+        # The stop sequence is not part of the reply, restore it so the history shows the full format
+        if "<action_input>" in raw_response and "</action_input>" not in raw_response:
+            raw_response += "</action_input>"
+        if len(tool_calls) == 1:
+            observations = tool_calls[0].get("Observation", {})
+        else:
+            # Observations of parallel calls are returned together, in the order of the calls
+            observations = [{"action": tool_call["action"], "observation": tool_call.get("Observation", {})}
+                            for tool_call in tool_calls]
+        observation = f"Observation: {json.dumps(observations, ensure_ascii=False)}"
+        if ext_data:
+            # Tools such as the browser report their latest state through ext_data
+            observation += "\n\n" + ext_data
+        return [
+            {"role": "assistant", "content": raw_response.strip()},
+            {"role": "user", "content": observation}
+        ]
+
+    def _run_tool_calls(self, tool_calls: list):
+        """
+        Execute the tool calls of one step, concurrently if parallel tool calls are enabled.
+
+        :param tool_calls: The parsed tool calls, updated with their observations in the given order
+        """
+        if self.parallel_tool_calls and len(tool_calls) > 1:
+            # Per-tool limits are enforced by BaseTool.execute_tool, the pool bounds the whole step
+            with ThreadPoolExecutor(max_workers=min(self.max_tool_workers, len(tool_calls)),
+                                    thread_name_prefix="agent-tool") as executor:
+                # Each call runs in a copy of the current context, so its tool span is nested in the step
+                tool_results = list(executor.map(lambda call: call(),
+                                                 [bind_context(self._execute_tool_call, tool_call)
+                                                  for tool_call in tool_calls]))
+            for tool_call, (tool_result, execution_time) in zip(tool_calls, tool_results):
+                self._record_tool_call(tool_call, tool_result, execution_time)
+        else:
+            for tool_call in tool_calls:
+                self._record_tool_call(tool_call, *self._execute_tool_call(tool_call))
+
+    async def _arun_tool_calls(self, tool_calls: list):
+        """Coroutine version of _run_tool_calls, blocking tools run in the default executor"""
+        if self.parallel_tool_calls and len(tool_calls) > 1:
+            semaphore = asyncio.Semaphore(self.max_tool_workers)
+
+            async def execute(tool_call):
+                async with semaphore:
+                    return await self._aexecute_tool_call(tool_call)
+
+            tool_results = await asyncio.gather(*(execute(tool_call) for tool_call in tool_calls))
+            for tool_call, (tool_result, execution_time) in zip(tool_calls, tool_results):
+                self._record_tool_call(tool_call, tool_result, execution_time)
+        else:
+            for tool_call in tool_calls:
+                self._record_tool_call(tool_call, *await self._aexecute_tool_call(tool_call))
+
+    def _execute_tool_call(self, parsed: dict):
+        """
+        Execute one tool call, serving repeats of idempotent calls from the tool result cache.
+
+        :return: A (tool_result, execution_time) tuple, tool_result is None if the tool was not found
+        """
+        start_time = time.time()
+        tool, params, cache, cache_key, cached_result = self._prepare_tool_call(parsed)
+        if tool is None or cached_result is not None:
+            return cached_result, time.time() - start_time
+        tool_result = tool.execute_tool(params, self._get_cancel_token(), self._get_hooks())
+        self._cache_tool_result(tool, cache, cache_key, tool_result)
+        return tool_result, time.time() - start_time
+
+    async def _aexecute_tool_call(self, parsed: dict):
+        """Coroutine version of _execute_tool_call"""
+        start_time = time.time()
+        tool, params, cache, cache_key, cached_result = self._prepare_tool_call(parsed)
+        if tool is None or cached_result is not None:
+            return cached_result, time.time() - start_time
+        tool_result = await tool.aexecute_tool(params, self._get_cancel_token(), self._get_hooks())
+        self._cache_tool_result(tool, cache, cache_key, tool_result)
+        return tool_result, time.time() - start_time
+
+    def _prepare_tool_call(self, parsed: dict):
+        """
+        Find the tool of a call and look the call up in the tool result cache.
+
+        :param parsed: The parsed tool call with action and action_input
+        :return: A (tool, params, cache, cache_key, cached_result) tuple, tool is None if it cannot be called
+        """
+        tool: BaseTool = self._find_tool(parsed["action"])
+        params = parsed.get("action_input", {})
+        if tool is None:
+            return None, params, None, None, None
+        cache = getattr(self.team_context, "tool_cache", None)
+        cache_key = tool.get_cache_key(params) if cache is not None else None
+        if cache_key:
+            cached_result = cache.get(cache_key)
+            if cached_result is not None:
+                return tool, params, cache, cache_key, cached_result.as_cached()
+        return tool, params, cache, cache_key, None
+
+    @staticmethod
+    def _cache_tool_result(tool: BaseTool, cache, cache_key, tool_result):
+        """Store a cacheable result, or drop state-dependent entries after a call with possible side effects"""
+        if cache is not None:
+            if cache_key:
+                if tool_result.status == "success":
+                    cache.set(cache_key, tool_result, ttl=tool.get_cache_ttl(),
+                              state_dependent=tool.cache_depends_on_state)
             else:
-                # No action, end loop
-                self.output("No action error, end step")
-                break
+                # The call may have changed files or other state that cached results were read from
+                cache.invalidate_state_dependent()
+        return tool_result
 
-            current_step += 1
+    def _record_tool_call(self, parsed: dict, tool_result, execution_time: float = 0.0):
+        """
+        Record a tool call with its observation in the action history.
 
-        # Return a StepResult object
-        return AgentResult.success(
-            final_answer=self.final_answer,
-            step_count=current_step + 1  # +1 because we count steps starting from 1
-        )
+        :param parsed: The parsed tool call with action and action_input, updated with the observation
+        :param tool_result: The result of the tool, None if the tool was not found
+        :param execution_time: Seconds the call took, including the tool result cache lookup
+        """
+        if tool_result:
+            result, ext_data = tool_result.result, tool_result.ext_data
+            blob_store = self.team_context.blob_store if self.team_context else None
+            if blob_store is not None and self._spills_result(parsed.get("action")):
+                # Keep large results out of the prompt, the agent reads them with the read_blob tool
+                result, ext_data = blob_store.spill(result), blob_store.spill(ext_data)
+
+            # Update conversation history
+            parsed["Observation"] = {
+                "status": tool_result.status,
+                "result": result
+            }
+            if tool_result.cached:
+                # Tell the model the call was a repeat, it did not fetch fresh data
+                parsed["Observation"]["cached"] = True
+
+            # Log tool execution errors
+            if tool_result.status == "error":
+                logger.error(f"Tool execution error: {tool_result.result}")
+
+            if ext_data:
+                self.ext_data = ext_data
+            self.capture_tool_use(parsed["action"], parsed.get("action_input", {}), result, tool_result.status,
+                                  error_message=result if tool_result.status == "error" else None,
+                                  execution_time=execution_time)
+        else:
+            self.capture_tool_use(parsed["action"], parsed.get("action_input", {}), None, "error",
+                                  error_message=f"Tool {parsed['action']} not found", execution_time=execution_time)
+        self.action_history.append(parsed)
+        self.conversation_history.append({
+            "role": "assistant",
+            "content": f"Thought: {parsed.get('thought', '')}\n"
+                       f"Action: {parsed['action']}\n"
+                       f"Action Input: {json.dumps(parsed.get('action_input', {}))}"
+        })
+
+    def _spills_result(self, tool_name: str) -> bool:
+        """Whether large results of the tool may be moved to the blob store"""
+        for tool in self.tools:
+            if tool.name == tool_name:
+                return tool.spill_result
+        return True
 
     def _execute_post_process_tools(self):
         """Execute all post-process stage tools"""
@@ -327,15 +1009,24 @@ Team description: {self.team_context.description}
             tool.context = self
 
             # Execute tool (with empty parameters, tool will extract needed info from context)
-            result = tool.execute({})
+            result = tool.execute_tool({}, self._get_cancel_token(), self._get_hooks())
+            self._output_post_process_result(tool, result)
 
-            # Log result
-            if result.status == "success":
-                # Print tool execution result in the desired format
-                self.output(f"\n🛠️ {tool.name}: {json.dumps(result.result)}")
-            else:
-                # Print failure in print mode
-                self.output(f"\n🛠️ {tool.name}: {json.dumps({'status': 'error', 'message': str(result.result)})}")
+    async def _aexecute_post_process_tools(self):
+        """Coroutine version of _execute_post_process_tools"""
+        for tool in [tool for tool in self.tools if tool.stage == ToolStage.POST_PROCESS]:
+            tool.context = self
+            result = await tool.aexecute_tool({}, self._get_cancel_token(), self._get_hooks())
+            self._output_post_process_result(tool, result)
+
+    def _output_post_process_result(self, tool: BaseTool, result):
+        # Log result
+        if result.status == "success":
+            # Print tool execution result in the desired format
+            self.output(f"\n🛠️ {tool.name}: {json.dumps(result.result)}")
+        else:
+            # Print failure in print mode
+            self.output(f"\n🛠️ {tool.name}: {json.dumps({'status': 'error', 'message': str(result.result)})}")
 
     def should_invoke_next_agent(self) -> int:
         """
@@ -343,22 +1034,108 @@ Team description: {self.team_context.description}
 
         :return: The ID of the next agent to invoke, or -1 if no next agent should be invoked.
         """
-        # Get the model to use - use team's model
-        model_to_use = self.team_context.model
+        request = self._build_decision_request()
+        if request is None:
+            return -1
 
-        # Create a request to the model to determine if the next agent should be invoked
-        # Exclude the current agent from the list to prevent self-recursion
-        agents_str = ', '.join(
+        # Start loading animation
+        self.output()
+        loading = LoadingIndicator(message="Select agent in team...", animation_type="spinner")
+        loading.start()
+
+        response = self.team_context.model.call(request)
+
+        # Stop loading animation
+        loading.stop()
+        print()
+
+        return self._apply_decision(response)
+
+    async def ashould_invoke_next_agent(self) -> int:
+        """
+        Coroutine version of should_invoke_next_agent, without the loading animation thread.
+
+        :return: The ID of the next agent to invoke, or -1 if no next agent should be invoked.
+        """
+        # Fitting the outputs of other members may summarize them with the model, keep it off the event loop
+        request = await asyncio.get_running_loop().run_in_executor(None, bind_context(self._build_decision_request))
+        if request is None:
+            return -1
+        self.output()
+        return self._apply_decision(await self.team_context.model.acall(request))
+
+    def _build_members_str(self) -> str:
+        """List the other members of the team with their IDs, the current agent is excluded to prevent self-recursion"""
+        return ', '.join(
             f'{{"id": {i}, "name": "{agent.name}", "description": "{agent.description}", "system_prompt": "{agent.system_prompt}"}}'
             for i, agent in enumerate(self.team_context.agents)
             if agent.name != self.name  # Exclude current agent
         )
 
-        # If no other agents are available, return -1
-        if not agents_str:
+    def take_handoff(self) -> Optional[int]:
+        """
+        Accept the next member proposed in the final reply, setting its subtask. The proposal is used once.
+
+        :return: The ID of the next agent to invoke, -1 if the proposal ends the chain, or None if there is no
+                 valid proposal and should_invoke_next_agent has to decide
+        """
+        handoff, self.handoff = self.handoff, None
+        if handoff is None:
+            return None
+        try:
+            agent_id = int(handoff.get("id"))
+        except (TypeError, ValueError):
+            logger.warning(f"Invalid handoff of {self.name}: {handoff}")
+            return None
+        if agent_id < 0:
             return -1
+        subtask = handoff.get("subtask")
+        if agent_id >= len(self.team_context.agents) or self.team_context.agents[agent_id].name == self.name \
+                or not isinstance(subtask, str) or not subtask.strip():
+            logger.warning(f"Invalid handoff of {self.name}: {handoff}")
+            return None
+        self.team_context.agents[agent_id].subtask = subtask.strip()
+        return agent_id
+
+    @staticmethod
+    def _split_handoff(final_answer: str):
+        """
+        Separate the handoff proposal from a final answer.
 
-        agent_outputs_list = self._fetch_agents_outputs()
+        :return: A (final_answer, handoff) tuple, handoff is the proposal dict or None if there is none or it
+                 is not valid JSON
+        """
+        match = HANDOFF_PATTERN.search(final_answer)
+        if not match:
+            return final_answer, None
+        answer = (final_answer[:match.start()] + final_answer[match.end():]).strip()
+        try:
+            handoff = string_util.json_loads(match.group(1).strip())
+        except ValueError:
+            handoff = None
+        # A reply holding nothing but the proposal is still the answer of the agent
+        return answer or final_answer, handoff if isinstance(handoff, dict) else None
+
+    def _build_decision_request(self):
+        """Build the request deciding on the next member, None if there is no other member"""
+        # Get the model to use - use team's model
+        model_to_use = self.team_context.model
+
+        # Create a request to the model to determine if the next agent should be invoked
+        agents_str = self._build_members_str()
+
+        # If no other agents are available, there is nothing to decide
+        if not agents_str:
+            return None
+
+        # Summaries made here are accounted to the team, the agent's calls have already been collected
+        def record_team_call(response, model):
+            if not response.is_error:
+                self.team_context.model_calls.append(ModelCall(purpose=ModelCallPurpose.SUMMARY, model=model.model,
+                                                               usage=TokenUsage.from_dict(response.usage),
+                                                               source=self.name, cached=response.cached))
+
+        agent_outputs_list = self._fetch_agents_outputs(record_team_call, model_to_use)
 
         prompt = AGENT_DECISION_PROMPT.format(group_name=self.team_context.name,
                                               group_description=self.team_context.description,
@@ -368,23 +1145,18 @@ Team description: {self.team_context.description}
                                               agents_str=agents_str,
                                               user_task=self.team_context.user_task)
 
-        # Start loading animation
-        self.output()
-        loading = LoadingIndicator(message="Select agent in team...", animation_type="spinner")
-        loading.start()
-
         # Use team's model for agent selection decision
-        request = LLMRequest(
+        return LLMRequest(
             messages=[{"role": "user", "content": prompt}],
             temperature=0,
-            json_format=True
+            json_format=True,
+            max_tokens=DECISION_MAX_TOKENS,
+            cancel_token=self._get_cancel_token()
         )
 
-        response = model_to_use.call(request)
-
-        # Stop loading animation
-        loading.stop()
-        print()
+    def _apply_decision(self, response) -> int:
+        """Account the decision call and set the subtask of the selected member"""
+        model_to_use = self.team_context.model
 
         # Check if API call was successful
         if response.is_error:
@@ -392,6 +1164,15 @@ Team description: {self.team_context.description}
             logger.error(f"Error: {error_message}")
             return -1  # If error occurs, return -1 to indicate not to call the next agent
 
+        # Routing decisions are accounted to the team rather than to this agent
+        self.team_context.model_calls.append(ModelCall(
+            purpose=ModelCallPurpose.ROUTING,
+            model=model_to_use.model,
+            usage=TokenUsage.from_dict(response.usage),
+            source=self.name,
+            cached=response.cached
+        ))
+
         # Get content from successful response
         decision_text = response.data["choices"][0]["message"]["content"]
         try:
@@ -417,13 +1198,92 @@ Team description: {self.team_context.description}
             logger.error(f"Failed to determine next agent: {e}")
             return -1
 
-    def _fetch_agents_outputs(self) -> str:
+    def record_model_call(self, purpose, usage: dict, model: str = None, source: str = None, cached: bool = False):
+        """
+        Record the token usage of a model call made during the current step.
+
+        :param purpose: ModelCallPurpose (or its value) of the call
+        :param usage: Normalized usage dict, see LLMResponse.usage
+        :param model: Name of the model that served the call
+        :param source: Agent or tool that made the call, defaults to the agent name
+        :param cached: Whether the response came from the local LLM cache
+        """
+        call = ModelCall(
+            purpose=ModelCallPurpose(purpose),
+            model=model or (self.model.model if self.model else ""),
+            usage=TokenUsage.from_dict(usage),
+            source=source or self.name,
+            cached=cached
+        )
+        self.model_calls.append(call)
+        return call
+
+    def _fetch_agents_outputs(self, on_model_call=None, model: LLMModel = None) -> str:
         agent_outputs_list = []
         for agent_output in self.team_context.agent_outputs:
             agent_outputs_list.append(
                 f"member name: {agent_output.agent_name}\noutput content: {agent_output.output}\n\n")
+        # Outputs of earlier members are windowed, truncated or summarized to fit the context budget
+        agent_outputs_list = self.context_budget.fit_items(ContextBudget.AGENT_OUTPUTS, agent_outputs_list,
+                                                           model or self._get_model(), on_model_call)
         return "\n".join(agent_outputs_list)
 
+    def _get_model(self) -> LLMModel:
+        """Get the model to use - use agent's model if set, otherwise use team's model"""
+        return self.model if self.model else self.team_context.model
+
+    def _record_budget_call(self, response, model: LLMModel):
+        """Account a summary made by the context budget to the current step"""
+        if not response.is_error:
+            self.record_model_call(ModelCallPurpose.SUMMARY, response.usage, model=model.model,
+                                   cached=response.cached)
+
+    def _format_action_history(self) -> str:
+        """Format the recent steps for the snapshot history mode within the context budget"""
+        entries = [self._format_action(entry) for entry in self.action_history[-10:]]
+        entries = self.context_budget.fit_items(ContextBudget.ACTION_HISTORY, entries, self._get_model(),
+                                                self._record_budget_call)
+        return "[\n" + ",\n".join(entries) + "\n]"
+
+    def _format_action(self, entry: dict) -> str:
+        """Format one action history entry, entries do not change once recorded so the text is reused"""
+        cached = self._formatted_actions.get(id(entry))
+        if cached is None or cached[0] is not entry:
+            cached = (entry, json.dumps(entry, ensure_ascii=False, indent=4))
+            if len(self._formatted_actions) >= 50:
+                # Drop the texts of entries that left the recent history
+                recent = {id(e) for e in self.action_history[-10:]}
+                self._formatted_actions = {k: v for k, v in self._formatted_actions.items() if k in recent}
+            self._formatted_actions[id(entry)] = cached
+        return cached[1]
+
+    def _window_turns(self, turns: list) -> list:
+        """
+        Keep the newest steps of the append history mode that fit the context budget.
+
+        :param turns: The message groups of each step, oldest first
+        :return: The flattened messages to send
+        """
+        model = self._get_model()
+        model_name = model.model if model else None
+        budget = self.context_budget.section_budget(ContextBudget.ACTION_HISTORY, model)
+        kept = []
+        used = 0
+        for step_turns in reversed(turns):
+            tokens = count_message_tokens(step_turns, model_name)
+            if kept and used + tokens > budget:
+                break
+            kept.append(step_turns)
+            used += tokens
+        kept.reverse()
+        messages = []
+        if len(kept) < len(turns):
+            messages.append({"role": "user", "content": f"[{len(turns) - len(kept)} earlier steps omitted to fit "
+                                                        f"the context budget]"})
+        for step_turns in kept:
+            messages.extend(step_turns)
+        return messages
+
     def capture_tool_use(self, tool_name, input_params, output, status, error_message=None, execution_time=0.0):
         """
         Capture a tool use action.
@@ -458,17 +1318,19 @@ Team description: {self.team_context.description}
 
         return action
 
-    def capture_thinking(self, thought_content):
+    def capture_thinking(self, thought_content, timing: StepTiming = None):
         """
         Capture a thinking action.
         
         :param thought_content: Content of the thought
+        :param timing: Latency breakdown of the step the thought opens
         """
         action = AgentAction(
             agent_id=self.id if hasattr(self, 'id') else str(id(self)),
             agent_name=self.name,
             action_type=AgentActionType.THINKING,
-            content=thought_content
+            content=thought_content,
+            timing=timing
         )
 
         if not hasattr(self, 'captured_actions'):
@@ -499,6 +1361,356 @@ Team description: {self.team_context.description}
         return action
 
 
+class StepState:
+    """Mutable state of one Agent.step run, shared by the sync and async step loops"""
+
+    def __init__(self, stop_sequences=None, ext_data: str = ""):
+        self.final_answer = None
+        self.current_step = 0
+        self.stop_sequences = stop_sequences
+        self.raw_response = ""  # Raw text of the latest XML reply
+        # In append mode the task prefix is built once and the turns of this subtask are appended to it
+        self.task_prefix = None
+        self.turns = []
+        self.sent_ext_data = ext_data
+        # Lengths of the action history, conversation, model calls and turns already checkpointed
+        self.checkpoint_marks = (0, 0, 0, 0, 0)
+        self.timing = None  # StepTiming of the latest step
+        self.span = None  # Tracing span of the running ReAct step
+        self.drain = None  # StreamDrain reading the rest of the latest reply, see XmlStreamReader.release
+
+
+class ReplyStreamReader:
+    """Base of the readers that collect a streamed reply chunk by chunk, for sync and async streams"""
+
+    def __init__(self, agent: Agent, current_step: int, loading: LoadingIndicator = None,
+                 timing: StepTiming = None):
+        self.agent = agent
+        self.current_step = current_step
+        self.loading = loading
+        self.timing = timing
+        self.hooks = agent._get_hooks()
+        self.usage = None
+        self.cached = False
+        self.first_token = True
+        self.request_start = time.time()
+        self.first_token_time = None
+
+    def _stop_loading(self):
+        if self.loading:
+            self.loading.stop()
+            self.loading = None
+
+    def _on_chunk(self, chunk: dict):
+        if self.first_token:
+            self.first_token = False
+            self.first_token_time = time.time()
+            self._stop_loading()
+            print(f"Step {self.current_step + 1}:")
+        # Usage arrives with the last chunk of the stream
+        if chunk.get("usage"):
+            self.usage = chunk["usage"]
+        self.cached = self.cached or chunk.get("cached", False)
+
+    def _record_stream_timing(self):
+        """Set the model latency, time to first token and stream duration once the stream is done or closed"""
+        if self.timing is None:
+            return
+        end_time = time.time()
+        self.timing.model_latency = end_time - self.request_start
+        if self.first_token_time is not None:
+            self.timing.time_to_first_token = self.first_token_time - self.request_start
+            self.timing.stream_duration = end_time - self.first_token_time
+
+
+class XmlStreamReader(ReplyStreamReader):
+    """Collects a streamed XML reply and detects when its tool calls are complete"""
+
+    def __init__(self, agent: Agent, current_step: int, loading: LoadingIndicator = None,
+                 timing: StepTiming = None):
+        super().__init__(agent, current_step, loading, timing)
+        self.parser = XmlResParser(parallel_tool_calls=agent.parallel_tool_calls)
+        self.parse_time = 0.0  # The reply is parsed chunk by chunk while it streams
+        self.raw_response = ""
+        self.error_result = None
+        self.dispatch_time = None  # When the tool calls were complete and the stream stopped being consumed
+        self.call = None  # The ModelCall recorded by finish
+
+    def feed(self, chunk) -> bool:
+        """
+        Process one chunk of the stream.
+
+        :param chunk: An OpenAI-shaped chunk, an error chunk or a text chunk
+        :return: False when the rest of the stream is not needed
+        """
+        # Check if this is an error chunk
+        if isinstance(chunk, dict) and chunk.get("error", False):
+            self._stop_loading()
+            error_message = chunk.get("message", "Unknown error")
+            status_code = chunk.get("status_code", 0)
+            # Use logger to record errors, no need to duplicate printing
+            logger.error(f"Error: {error_message} (Status code: {status_code})")
+            self.error_result = AgentResult.error(error_message, self.current_step)
+            return False
+
+        # Ensure chunk is in the correct format
+        if isinstance(chunk, dict):
+            self._on_chunk(chunk)
+            if "choices" in chunk and len(chunk["choices"]) > 0:
+                delta = chunk["choices"][0].get("delta", {})
+                if "content" in delta:
+                    content = delta["content"]
+                    if self.hooks is not None:
+                        self.hooks.on_token(self.agent, content)
+                    self.raw_response += content
+                    # Use parser to process each streaming content chunk
+                    self._parse_chunk(content)
+        else:
+            # If chunk is a string, process it directly
+            self._on_chunk({})
+            if self.hooks is not None:
+                self.hooks.on_token(self.agent, chunk)
+            self.raw_response += chunk
+            self._parse_chunk(chunk)
+
+        # Dispatch the tools as soon as the tool calls are complete instead of waiting for the stream
+        if self.parser.is_tool_batch_complete() if self.agent.parallel_tool_calls \
+                else self.parser.is_tool_call_complete():
+            self.dispatch_time = time.time()
+            return False
+        return True
+
+    def _parse_chunk(self, content: str):
+        parse_start = time.time()
+        self.parser.process_chunk(content)
+        self.parse_time += time.time() - parse_start
+
+    def finish(self, model: LLMModel, request: LLMRequest):
+        """
+        Account the model call and parse the reply once the stream is done or closed.
+
+        :return: A (parsed, error_result) tuple
+        """
+        self._record_stream_timing()
+        self._stop_loading()
+        if self.error_result:
+            return None, self.error_result
+
+        usage = self.usage
+        usage_estimated = usage is None and self.dispatch_time is not None
+        if usage_estimated:
+            # The final usage chunk was not received yet, count what was sent and streamed
+            usage = {"prompt_tokens": count_message_tokens(request.messages, model.model),
+                     "completion_tokens": count_tokens(self.raw_response, model.model)}
+        call = self.agent.record_model_call(ModelCallPurpose.REACT_STEP, parse_usage(usage),
+                                            model=model.model, cached=self.cached)
+        call.usage_estimated = usage_estimated
+        if self.dispatch_time is not None:
+            call.early_dispatch_ms = (self.dispatch_time - self.request_start) * 1000
+        self.call = call
+
+        # Get parsing results
+        if self.agent.parallel_tool_calls:
+            # The parser prints the last of several tool calls like a single one, the calls before it go first
+            for tool_call in self.parser.get_tool_calls()[:-1]:
+                action_input = tool_call["action_input"]
+                action_input_str = json.dumps(action_input, ensure_ascii=False) \
+                    if isinstance(action_input, dict) else action_input
+                self.agent.output(f"\n🛠️ {tool_call['action']}: {action_input_str}")
+        parse_start = time.time()
+        parsed = self.parser.get_parsed_data()
+        if self.timing is not None:
+            self.timing.parse_time = self.parse_time + time.time() - parse_start
+        return parsed, None
+
+
+    def _drain(self, request: LLMRequest) -> Optional["StreamDrain"]:
+        """A drain for the rest of the stream, None if the stream is to be closed"""
+        # Without the stop sequence the model may go on writing, closing the stream saves those tokens
+        if self.dispatch_time is None or self.call is None or request.stop != REACT_STOP_SEQUENCES:
+            return None
+        return StreamDrain(self.call, self.dispatch_time, self.raw_response)
+
+    def release(self, stream, request: LLMRequest) -> Optional["StreamDrain"]:
+        """
+        Stop consuming the stream once the reply is parsed. A stream whose tool call was dispatched before the stop
+        sequence ended it is read to its end in the background while the tool runs, every other stream is closed,
+        which closes the HTTP stream so the provider stops generating.
+
+        :return: The StreamDrain reading the rest of the stream, or None if the stream was closed
+        """
+        drain = self._drain(request)
+        if drain is None:
+            stream.close()
+        else:
+            drain.start(stream)
+        return drain
+
+    async def arelease(self, stream, request: LLMRequest) -> Optional["StreamDrain"]:
+        """Coroutine version of release"""
+        drain = self._drain(request)
+        if drain is None:
+            await stream.aclose()
+        else:
+            drain.astart(stream)
+        return drain
+
+
+class StreamDrain:
+    """
+    Reads the rest of a streamed reply after its tool call was dispatched, while the tool runs. The stop sequence
+    ends the reply right after the tool call, so reading the rest costs no extra tokens. It yields the real usage
+    of the call and how much of the reply the tool did not wait for.
+    """
+
+    def __init__(self, call: ModelCall, dispatch_time: float, streamed_text: str):
+        """
+        Initialize the StreamDrain.
+
+        :param call: The ModelCall of the reply, updated when the stream ends.
+        :param dispatch_time: When the tool call was dispatched.
+        :param streamed_text: The reply text received up to the dispatch.
+        """
+        self.call = call
+        self.dispatch_time = dispatch_time
+        self.streamed_tokens = count_tokens(streamed_text, call.model)
+        self.usage = None
+        self.closed_early = False
+        self._thread = None
+        self._task = None
+
+    def start(self, stream):
+        """Read the rest of a stream in a background thread"""
+        self._thread = threading.Thread(target=bind_context(self._drain, stream), daemon=True,
+                                        name="stream-drain")
+        self._thread.start()
+
+    def astart(self, stream):
+        """Read the rest of an async stream in a task of the running event loop"""
+        self._task = asyncio.ensure_future(self._adrain(stream))
+
+    def _drain(self, stream):
+        try:
+            for chunk in stream:
+                if not self._on_chunk(chunk):
+                    break
+        finally:
+            stream.close()
+            self._settle()
+
+    async def _adrain(self, stream):
+        try:
+            async for chunk in stream:
+                if not self._on_chunk(chunk):
+                    break
+        finally:
+            await stream.aclose()
+            self._settle()
+
+    def _on_chunk(self, chunk) -> bool:
+        """Take the usage of a chunk, returning False if the stream has to be closed"""
+        if not isinstance(chunk, dict) or chunk.get("error", False):
+            return True
+        if chunk.get("usage"):
+            self.usage = chunk["usage"]
+        choices = chunk.get("choices") or [{}]
+        if (choices[0].get("delta", {}).get("content") or "").strip():
+            # The provider ignored the stop sequence and the model writes on, stop paying for it
+            self.closed_early = True
+            return False
+        return True
+
+    def _settle(self):
+        """Set the saved time, and the real usage if the provider reported it"""
+        if self.closed_early:
+            # The stream was cut off, its end and usage are unknown
+            return
+        self.call.saved_ms = (time.time() - self.dispatch_time) * 1000
+        if self.usage:
+            self.call.usage = TokenUsage.from_dict(parse_usage(self.usage))
+            self.call.usage_estimated = False
+            self.call.saved_tokens = max(self.call.usage.completion_tokens - self.streamed_tokens, 0)
+
+    def join(self):
+        """Wait until the stream was read to its end"""
+        if self._thread is not None:
+            self._thread.join()
+
+    async def ajoin(self):
+        """Coroutine version of join"""
+        if self._task is not None:
+            await self._task
+
+
+class NativeStreamReader(ReplyStreamReader):
+    """Collects a streamed reply with native tool calls"""
+
+    def __init__(self, agent: Agent, current_step: int, loading: LoadingIndicator = None,
+                 timing: StepTiming = None):
+        super().__init__(agent, current_step, loading, timing)
+        self.content = ""
+        self.tool_calls = {}
+        self.error_chunk = None
+
+    def feed(self, chunk) -> bool:
+        """
+        Process one chunk of the stream.
+
+        :param chunk: An OpenAI-shaped chunk or an error chunk
+        :return: False when the stream failed
+        """
+        if isinstance(chunk, dict) and chunk.get("error", False):
+            self.error_chunk = chunk
+            return False
+        self._on_chunk(chunk)
+        if chunk.get("choices"):
+            delta = chunk["choices"][0].get("delta", {})
+            if delta.get("content"):
+                if self.hooks is not None:
+                    self.hooks.on_token(self.agent, delta["content"])
+                self.content += delta["content"]
+                print(delta["content"], end="", flush=True)
+            merge_tool_call_deltas(self.tool_calls, delta.get("tool_calls"))
+        return True
+
+    def result(self):
+        """Get the (message, usage, cached, error) of the streamed reply"""
+        self._record_stream_timing()
+        self._stop_loading()
+        if self.error_chunk is not None:
+            return None, None, False, (self.error_chunk.get("status_code", 0),
+                                       self.error_chunk.get("message", "Unknown error"))
+        message = {"content": self.content, "tool_calls": [self.tool_calls[i] for i in sorted(self.tool_calls)]}
+        return message, parse_usage(self.usage), self.cached, None
+
+# Supported ways for the model to call tools
+TOOL_CALL_MODES = ("xml", "native")
+
+# Error messages of providers rejecting the tools of a request, e.g. "'tools' is not supported with this model",
+# "model does not support tools" or "deepseek-reasoner does not support Function Calling"
+NATIVE_TOOLS_UNSUPPORTED_PATTERN = re.compile(
+    r"\b(tools?|functions?|function[ _]calling|tool[ _]choice)\b['\"`]?\s+(is |are )?(not supported|unsupported|"
+    r"not enabled|not available)|(not|n't) support\w*\s+(native\s+)?(tools?|functions?|function[ _]calling)\b|"
+    r"enable-auto-tool-choice", re.IGNORECASE)
+
+# Supported ways to send the step history to the model
+HISTORY_MODES = ("snapshot", "append")
+
+# How the step loop continues after a reply
+STEP_FINAL = "final"  # The final answer was given
+STEP_TOOLS = "tools"  # Tools were called, their observations are sent in the next step
+STEP_RETRY = "retry"  # The step is repeated, e.g. without stop sequences
+STEP_STOP = "stop"  # Neither an answer nor a tool call was given
+
+# The ReAct reply ends after the tool parameters, everything generated after them would be discarded
+REACT_STOP_SEQUENCES = ["</action_input>"]
+
+# With parallel tool calls the reply may hold several actions, it ends where the model imagines an observation
+PARALLEL_REACT_STOP_SEQUENCES = ["Observation:"]
+
+# Output budget of routing decisions, a small JSON object with the next member and its subtask
+DECISION_MAX_TOKENS = 128
+
 AGENT_REPLY_PROMPT = """You are part of the team, you only need to reply the part of user question related to your responsibilities
 
 ## Team
@@ -516,6 +1728,21 @@ User Original Task:
 Your Subtask:
 {subtask}"""
 
+HANDOFF_PROMPT = """
+## Handoff
+At the end of your final answer, propose the member who continues the user task, so the team does not have to ask
+for it. Other members of the team:
+{agents_str}
+
+Team rules: {group_rules}
+
+Write the proposal as the last line of the final answer: <handoff>{{"id": <member_id>, "subtask": ""}}</handoff>
+If your answer completes the user task and no other member is needed, write <handoff>{{"id": -1}}</handoff>
+"""
+
+# The handoff proposal at the end of a final answer
+HANDOFF_PATTERN = re.compile(r"<handoff>(.*?)</handoff>", re.DOTALL)
+
 AGENT_DECISION_PROMPT = """## Role
 You are a team decision expert, please decide whether the next member in the team is needed to complete the user task. If necessary, select the most suitable member and give the subtask that needs to be answered by this member. If not, return {{"id": -1}} directly.
 
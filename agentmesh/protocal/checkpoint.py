@@ -0,0 +1,441 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+from agentmesh.common import config
+from agentmesh.common.utils.log import logger
+from agentmesh.protocal.context import AgentOutput
+from agentmesh.protocal.result import AgentExecutionResult, AgentAction, ModelCall
+from agentmesh.protocal.task import Task, TaskType
+
+# Supported checkpoint store backends
+CHECKPOINT_BACKENDS = ("file", "sqlite")
+
+# Kinds of checkpoint records, in the order a run writes them
+RECORD_RUN_START = "run_start"  # The task of the run
+RECORD_ROUTE = "route"  # The coordinator selected the first agent
+RECORD_STEP = "step"  # An agent finished a ReAct step, its tool calls have their observations
+RECORD_AGENT_END = "agent_end"  # An agent finished its subtask
+RECORD_DECISION = "decision"  # The next agent was selected, or the chain ended
+RECORD_RESUME = "resume"  # The run was resumed from its checkpoint
+RECORD_RUN_END = "run_end"  # The run finished with a status
+
+# Where a run continues when it is resumed
+PHASE_ROUTE = "route"  # Select the first agent
+PHASE_AGENT = "agent"  # Run the next agent, continuing its subtask if it had finished steps
+PHASE_DECIDE = "decide"  # Let the last agent select the next one
+PHASE_FINISH = "finish"  # The chain ended, only the result remains to be completed
+
+
+class CheckpointStore:
+    """
+    Append-only log of the checkpoint records of team runs, keyed by task id. A record is only appended,
+    never updated, so a run interrupted at any point can be restored from the records written so far.
+    """
+
+    def append(self, task_id: str, record: dict):
+        """
+        Append a record to the log of a task.
+
+        :param task_id: The id of the task the run processes.
+        :param record: JSON serializable record.
+        """
+        raise NotImplementedError
+
+    def load(self, task_id: str) -> List[dict]:
+        """
+        Load the records of a task in the order they were written.
+
+        :param task_id: The id of the task the run processes.
+        :return: The records, empty if the task has no checkpoint.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    @classmethod
+    def from_config(cls, checkpoint_config: Optional[dict]) -> Optional["CheckpointStore"]:
+        """
+        Create a store from the `checkpoint` config section.
+
+        :param checkpoint_config: Dictionary with enabled, backend and path.
+        :return: A CheckpointStore instance, or None if checkpointing is disabled.
+        """
+        checkpoint_config = checkpoint_config or {}
+        if not checkpoint_config.get("enabled", False):
+            return None
+        backend = checkpoint_config.get("backend", "file")
+        if backend not in CHECKPOINT_BACKENDS:
+            raise ValueError(f"Invalid checkpoint backend '{backend}', must be one of {CHECKPOINT_BACKENDS}")
+        if backend == "sqlite":
+            return SQLiteCheckpointStore(checkpoint_config.get("path", ".checkpoints/checkpoints.db"))
+        return FileCheckpointStore(checkpoint_config.get("path", ".checkpoints"))
+
+
+class FileCheckpointStore(CheckpointStore):
+    """Stores the records of each task as one JSON line each in `<directory>/<task_id>.jsonl`"""
+
+    def __init__(self, directory: str):
+        """
+        Initialize the FileCheckpointStore.
+
+        :param directory: Directory of the checkpoint files, created if missing.
+        """
+        self.directory = directory
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, task_id: str) -> str:
+        return os.path.join(self.directory, f"{task_id}.jsonl")
+
+    def append(self, task_id: str, record: dict):
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            with open(self._path(task_id), "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+                f.flush()
+                # The record must survive the process dying right after this step
+                os.fsync(f.fileno())
+
+    def load(self, task_id: str) -> List[dict]:
+        path = self._path(task_id)
+        if not os.path.exists(path):
+            return []
+        records = []
+        with self._lock:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        # The last line may have been cut off when the process died while writing it
+                        logger.warning(f"Skipping incomplete checkpoint record of task {task_id}")
+                        break
+        return records
+
+
+class SQLiteCheckpointStore(CheckpointStore):
+    """Stores the records of all tasks in one SQLite table"""
+
+    def __init__(self, db_path: str):
+        """
+        Initialize the SQLiteCheckpointStore.
+
+        :param db_path: Path of the SQLite file, its directory is created if missing.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS checkpoints ("
+            "task_id TEXT NOT NULL, seq INTEGER NOT NULL, kind TEXT NOT NULL, record TEXT NOT NULL, "
+            "created_at REAL NOT NULL, PRIMARY KEY (task_id, seq))"
+        )
+        self._db.commit()
+
+    def append(self, task_id: str, record: dict):
+        value = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            row = self._db.execute("SELECT MAX(seq) FROM checkpoints WHERE task_id = ?", (task_id,)).fetchone()
+            seq = 0 if row[0] is None else row[0] + 1
+            self._db.execute("INSERT INTO checkpoints (task_id, seq, kind, record, created_at) VALUES (?, ?, ?, ?, ?)",
+                             (task_id, seq, record.get("kind", ""), value, time.time()))
+            self._db.commit()
+
+    def load(self, task_id: str) -> List[dict]:
+        with self._lock:
+            rows = self._db.execute("SELECT record FROM checkpoints WHERE task_id = ? ORDER BY seq",
+                                    (task_id,)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def get_checkpoint_store() -> Optional[CheckpointStore]:
+    """Create the store configured in the `checkpoint` config section, None if checkpointing is disabled"""
+    return CheckpointStore.from_config(config().get("checkpoint"))
+
+
+class RunCheckpoint:
+    """
+    Writes the checkpoint records of one team run. Each record only holds what changed since the
+    previous one, e.g. the tool calls of the latest step.
+    """
+
+    def __init__(self, store: CheckpointStore, task_id: str):
+        """
+        Initialize the RunCheckpoint.
+
+        :param store: The store the records are appended to.
+        :param task_id: The id of the task the run processes.
+        """
+        self.store = store
+        self.task_id = task_id
+        # Number of team model calls and agent outputs already written
+        self._team_calls_mark = 0
+        self._outputs_mark = 0
+
+    def record(self, kind: str, **data):
+        """Append a record of the given kind"""
+        self.store.append(self.task_id, dict(kind=kind, time=time.time(), **data))
+
+    def start(self, task: Task, team_name: str):
+        self.record(RECORD_RUN_START, team=team_name, task={
+            "id": task.id,
+            "content": task.content,
+            "type": task.type.value,
+            "created_at": task.created_at,
+            "metadata": task.metadata,
+            "images": task.images,
+            "videos": task.videos,
+            "audios": task.audios,
+            "files": task.files
+        })
+
+    def resumed(self, snapshot: "RunSnapshot"):
+        """Continue writing after the records of a restored run"""
+        self._team_calls_mark = len(snapshot.model_calls)
+        self._outputs_mark = len(snapshot.agent_outputs)
+        self.record(RECORD_RESUME, phase=snapshot.phase)
+
+    def route(self, agent_id: int, subtask: str, task_short_name: str, team_context):
+        self.record(RECORD_ROUTE, agent=agent_id, subtask=subtask, task_short_name=task_short_name,
+                    model_calls=self._new_team_calls(team_context))
+
+    def step(self, agent_id: int, agent, state):
+        """
+        Write the latest ReAct step of an agent, after the observations of its tool calls were recorded.
+
+        :param agent_id: Index of the agent in the team.
+        :param agent: The agent.
+        :param state: The StepState of the agent's step loop.
+        """
+        actions_mark, conversation_mark, calls_mark, turns_mark, captured_mark = state.checkpoint_marks
+        self.record(RECORD_STEP, agent=agent_id, step=state.current_step,
+                    actions=agent.action_history[actions_mark:],
+                    conversation=agent.conversation_history[conversation_mark:],
+                    turns=state.turns[turns_mark:],
+                    model_calls=[call.to_dict() for call in agent.model_calls[calls_mark:]],
+                    captured_actions=[action.to_dict() for action in agent.captured_actions[captured_mark:]],
+                    ext_data=agent.ext_data,
+                    sent_ext_data=state.sent_ext_data,
+                    tool_call_mode=agent.tool_call_mode,
+                    task_start_time=agent.task_start_time,
+                    team_steps=agent.team_context.current_steps)
+        state.checkpoint_marks = (len(agent.action_history), len(agent.conversation_history),
+                                  len(agent.model_calls), len(state.turns), len(agent.captured_actions))
+
+    def agent_end(self, agent_id: int, agent, agent_result: AgentExecutionResult, total_steps_used: int):
+        """Write the result of an agent that finished its subtask"""
+        outputs = agent.team_context.agent_outputs
+        self.record(RECORD_AGENT_END, agent=agent_id, final_answer=getattr(agent, "final_answer", ""),
+                    result=_agent_result_to_dict(agent_result),
+                    outputs=[{"agent_name": output.agent_name, "output": output.output}
+                             for output in outputs[self._outputs_mark:]],
+                    ext_data=agent.ext_data,
+                    team_steps=agent.team_context.current_steps,
+                    total_steps=total_steps_used)
+        self._outputs_mark = len(outputs)
+
+    def decision(self, agent_id: int, subtask: Optional[str], team_context):
+        """Write the selection of the next agent, agent_id -1 ends the chain"""
+        self.record(RECORD_DECISION, agent=agent_id, subtask=subtask,
+                    model_calls=self._new_team_calls(team_context))
+
+    def end(self, status: str, final_output: str, team_context):
+        self.record(RECORD_RUN_END, status=status, final_output=final_output,
+                    model_calls=self._new_team_calls(team_context))
+
+    def _new_team_calls(self, team_context) -> List[dict]:
+        calls = team_context.model_calls[self._team_calls_mark:]
+        self._team_calls_mark = len(team_context.model_calls)
+        return [call.to_dict() for call in calls]
+
+
+class StepCheckpoint:
+    """The finished steps of an agent's interrupted subtask, continued by Agent.step"""
+
+    def __init__(self, agent_id: int):
+        self.agent_id = agent_id
+        self.current_step = 0
+        self.turns = []
+        self.model_calls = []
+        self.captured_actions = []
+        self.sent_ext_data = ""
+        self.task_start_time = None
+
+
+class AgentSnapshot:
+    """The state of one agent restored from the checkpoint records"""
+
+    def __init__(self):
+        self.action_history = []
+        self.conversation_history = []
+        self.ext_data = ""
+        self.subtask = None
+        self.final_answer = None
+        self.tool_call_mode = None
+
+
+class RunSnapshot:
+    """
+    The state of a team run restored from its checkpoint records, and the point where it continues.
+    """
+
+    def __init__(self, task: Task, team_name: str = ""):
+        self.task = task
+        self.team_name = team_name
+        self.start_time = None
+        self.phase = PHASE_ROUTE
+        self.next_agent = None  # Agent that runs next in PHASE_AGENT, that decides next in PHASE_DECIDE
+        self.task_short_name = None
+        self.agents: Dict[int, AgentSnapshot] = {}
+        self.agent_results: List[AgentExecutionResult] = []
+        self.agent_outputs: List[AgentOutput] = []
+        self.model_calls: List[ModelCall] = []
+        self.current_steps = 0
+        self.total_steps_used = 0
+        self.pending_step: Optional[StepCheckpoint] = None
+        self.status = None  # Status of the latest run_end record
+        self.final_output = ""
+
+    def agent(self, agent_id: int) -> AgentSnapshot:
+        return self.agents.setdefault(agent_id, AgentSnapshot())
+
+    @classmethod
+    def from_records(cls, records: List[dict]) -> "RunSnapshot":
+        """
+        Replay the checkpoint records of a run.
+
+        :param records: The records in the order they were written, starting with run_start.
+        :return: The restored RunSnapshot.
+        """
+        if not records or records[0].get("kind") != RECORD_RUN_START:
+            raise ValueError("Checkpoint does not start with a run_start record")
+        start = records[0]
+        task_data = start["task"]
+        task = Task(content=task_data.get("content", ""), id=task_data["id"],
+                    type=TaskType(task_data.get("type", TaskType.TEXT.value)),
+                    created_at=task_data.get("created_at", start["time"]),
+                    metadata=task_data.get("metadata") or {}, images=task_data.get("images") or [],
+                    videos=task_data.get("videos") or [], audios=task_data.get("audios") or [],
+                    files=task_data.get("files") or [])
+        snapshot = cls(task, start.get("team", ""))
+        snapshot.start_time = start["time"]
+        for record in records[1:]:
+            snapshot._apply(record)
+        return snapshot
+
+    def _apply(self, record: dict):
+        kind = record.get("kind")
+        if kind != RECORD_STEP:
+            # Team level calls, the calls of agents are restored with their steps and results
+            self.model_calls.extend(ModelCall.from_dict(call) for call in record.get("model_calls") or [])
+        if kind == RECORD_ROUTE:
+            self.task_short_name = record.get("task_short_name")
+            self._select(record["agent"], record.get("subtask"))
+        elif kind == RECORD_STEP:
+            agent_id = record["agent"]
+            agent = self.agent(agent_id)
+            agent.action_history.extend(record.get("actions") or [])
+            agent.conversation_history.extend(record.get("conversation") or [])
+            agent.ext_data = record.get("ext_data", "")
+            agent.tool_call_mode = record.get("tool_call_mode")
+            if self.pending_step is None or self.pending_step.agent_id != agent_id:
+                self.pending_step = StepCheckpoint(agent_id)
+                self.pending_step.task_start_time = record.get("task_start_time")
+            self.pending_step.current_step = record["step"]
+            self.pending_step.turns.extend(record.get("turns") or [])
+            self.pending_step.model_calls.extend(ModelCall.from_dict(call) for call in record.get("model_calls") or [])
+            self.pending_step.captured_actions.extend(AgentAction.from_dict(action)
+                                                      for action in record.get("captured_actions") or [])
+            self.pending_step.sent_ext_data = record.get("sent_ext_data", "")
+            self.current_steps = record.get("team_steps", self.current_steps)
+        elif kind == RECORD_AGENT_END:
+            agent_id = record["agent"]
+            agent = self.agent(agent_id)
+            agent.final_answer = record.get("final_answer")
+            agent.ext_data = record.get("ext_data", agent.ext_data)
+            self.agent_results.append(_agent_result_from_dict(record["result"]))
+            self.agent_outputs.extend(AgentOutput(agent_name=output["agent_name"], output=output["output"])
+                                      for output in record.get("outputs") or [])
+            self.current_steps = record.get("team_steps", self.current_steps)
+            self.total_steps_used = record.get("total_steps", self.total_steps_used)
+            self.pending_step = None
+            self.phase = PHASE_DECIDE
+            self.next_agent = agent_id
+        elif kind == RECORD_DECISION:
+            if record["agent"] < 0:
+                self.phase = PHASE_FINISH
+                self.next_agent = None
+            else:
+                self._select(record["agent"], record.get("subtask"))
+        elif kind == RECORD_RUN_END:
+            self.status = record.get("status")
+            self.final_output = record.get("final_output", "")
+
+    def _select(self, agent_id: int, subtask: Optional[str]):
+        self.agent(agent_id).subtask = subtask
+        self.phase = PHASE_AGENT
+        self.next_agent = agent_id
+
+    def restore(self, team, result):
+        """
+        Restore the team context, the agents and the team result from the snapshot.
+
+        :param team: The AgentTeam the run belongs to, with the same agents as the checkpointed run.
+        :param result: The TeamResult of the resumed run.
+        """
+        context = team.context
+        context.task_short_name = self.task_short_name
+        context.agent_outputs = list(self.agent_outputs)
+        context.current_steps = self.current_steps
+        context.model_calls = list(self.model_calls)
+        for agent_id, snapshot in self.agents.items():
+            if agent_id >= len(team.agents):
+                raise ValueError(f"Checkpoint refers to agent {agent_id}, the team has {len(team.agents)} agents")
+            agent = team.agents[agent_id]
+            agent.action_history = list(snapshot.action_history)
+            agent.conversation_history = list(snapshot.conversation_history)
+            agent.ext_data = snapshot.ext_data
+            if snapshot.subtask is not None:
+                agent.subtask = snapshot.subtask
+            if snapshot.final_answer is not None:
+                agent.final_answer = snapshot.final_answer
+            if snapshot.tool_call_mode:
+                agent.tool_call_mode = snapshot.tool_call_mode
+        if self.pending_step is not None and self.phase == PHASE_AGENT \
+                and self.pending_step.agent_id == self.next_agent:
+            # The agent continues its subtask after the last finished step
+            team.agents[self.next_agent].resume_step = self.pending_step
+        result.start_time = self.start_time
+        for agent_result in self.agent_results:
+            result.add_agent_result(agent_result)
+
+
+def _agent_result_to_dict(agent_result: AgentExecutionResult) -> dict:
+    return {
+        "agent_id": agent_result.agent_id,
+        "agent_name": agent_result.agent_name,
+        "subtask": agent_result.subtask,
+        "final_answer": agent_result.final_answer,
+        "start_time": agent_result.start_time,
+        "end_time": agent_result.end_time,
+        "model_calls": [call.to_dict() for call in agent_result.model_calls],
+        "actions": [action.to_dict() for action in agent_result.actions]
+    }
+
+
+def _agent_result_from_dict(data: dict) -> AgentExecutionResult:
+    agent_result = AgentExecutionResult(agent_id=data["agent_id"], agent_name=data["agent_name"],
+                                        subtask=data.get("subtask") or "", final_answer=data.get("final_answer", ""),
+                                        start_time=data.get("start_time", 0.0), end_time=data.get("end_time", 0.0),
+                                        model_calls=[ModelCall.from_dict(call) for call in data.get("model_calls", [])])
+    agent_result.actions.extend(AgentAction.from_dict(action) for action in data.get("actions", []))
+    return agent_result
@@ -1,3 +1,7 @@
+from agentmesh.common.utils.hooks import HookDispatcher
+from agentmesh.tools.tool_cache import create_task_tool_cache
+
+
 class TeamContext:
     def __init__(self, name: str, description: str, rule: str, agents: list, max_steps: int = 20):
         """
@@ -19,6 +23,20 @@ class TeamContext:
         self.agent_outputs: list = []
         self.current_steps = 0
         self.max_steps = max_steps
+        # Team level model calls of the current run, e.g. routing decisions
+        self.model_calls: list = []
+        # Results of idempotent tool calls of the current task, None if tool caching is turned off
+        self.tool_cache = create_task_tool_cache()
+        # Cancellation token of the current run, checked by agents, model calls and tools
+        self.cancel_token = None
+        # Checkpoint writer of the current run, None if the team does not checkpoint its runs
+        self.checkpoint = None
+        # Store of large tool observations of the current task, None if the blob store is not enabled
+        self.blob_store = None
+        # Lifecycle hooks registered with the team, see RunHooks
+        self.hooks = HookDispatcher()
+        # Whether agents propose the next member in their final reply, see AgentTeam(fold_handoff=True)
+        self.fold_handoff = False
 
 
 class AgentOutput:
@@ -0,0 +1,241 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+from agentmesh.common.utils.log import logger
+from agentmesh.models.llm.base_model import LLMModel, LLMRequest
+from agentmesh.models.llm.tokenizer import count_tokens, get_context_window
+
+
+class SectionPolicy:
+    """
+    How one variable-size section of an agent prompt is kept within its share of the budget.
+    """
+    TRUNCATE = "truncate"  # Keep the head and tail of the text
+    WINDOW = "window"  # Keep the most recent items that fit
+    SUMMARIZE = "summarize"  # Ask the model to summarize what does not fit
+    STRATEGIES = (TRUNCATE, WINDOW, SUMMARIZE)
+
+    def __init__(self, share: float, strategy: str = TRUNCATE, max_tokens: Optional[int] = None):
+        """
+        Initialize the SectionPolicy.
+
+        :param share: Fraction of the prompt budget the section may use.
+        :param strategy: One of truncate, window or summarize.
+        :param max_tokens: Optional absolute cap on top of the share.
+        """
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"Invalid context budget strategy '{strategy}', must be one of {self.STRATEGIES}")
+        self.share = share
+        self.strategy = strategy
+        self.max_tokens = max_tokens
+
+
+class ContextBudget:
+    """
+    Keeps agent prompts within a token budget derived from the model's context window. The variable
+    sections of the prompt (outputs of other agents, tool ext_data and the action history) each get a
+    share of the budget and are truncated, windowed or summarized when they grow beyond it.
+    """
+    AGENT_OUTPUTS = "agent_outputs"
+    EXT_DATA = "ext_data"
+    ACTION_HISTORY = "action_history"
+
+    DEFAULT_SECTIONS = {
+        AGENT_OUTPUTS: SectionPolicy(0.3, SectionPolicy.WINDOW),
+        EXT_DATA: SectionPolicy(0.15, SectionPolicy.TRUNCATE),
+        ACTION_HISTORY: SectionPolicy(0.35, SectionPolicy.WINDOW),
+    }
+
+    def __init__(self, max_prompt_tokens: Optional[int] = None, reserve_output_tokens: int = 4096,
+                 sections: Optional[Dict[str, SectionPolicy]] = None, max_summaries: int = 128):
+        """
+        Initialize the ContextBudget.
+
+        :param max_prompt_tokens: Upper bound for prompt tokens, None to only use the model's context window.
+        :param reserve_output_tokens: Tokens of the context window kept free for the model's reply.
+        :param sections: Policies by section name, missing sections use DEFAULT_SECTIONS.
+        :param max_summaries: Number of summaries kept so unchanged text is not summarized again.
+        """
+        self.max_prompt_tokens = max_prompt_tokens
+        self.reserve_output_tokens = reserve_output_tokens
+        self.sections = dict(self.DEFAULT_SECTIONS)
+        self.sections.update(sections or {})
+        self.max_summaries = max_summaries
+        self._summaries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, budget_config: Optional[dict]) -> "ContextBudget":
+        """
+        Create a ContextBudget from the `context_budget` config section.
+
+        :param budget_config: Dictionary with max_prompt_tokens, reserve_output_tokens and sections.
+        :return: A ContextBudget instance, using defaults for missing keys.
+        """
+        budget_config = budget_config or {}
+        sections = {}
+        for name, section in (budget_config.get("sections") or {}).items():
+            default = cls.DEFAULT_SECTIONS.get(name, SectionPolicy(0.2))
+            sections[name] = SectionPolicy(share=section.get("share", default.share),
+                                           strategy=section.get("strategy", default.strategy),
+                                           max_tokens=section.get("max_tokens", default.max_tokens))
+        return cls(max_prompt_tokens=budget_config.get("max_prompt_tokens"),
+                   reserve_output_tokens=budget_config.get("reserve_output_tokens", 4096),
+                   sections=sections)
+
+    def prompt_budget(self, model: Optional[LLMModel]) -> int:
+        """
+        Get the number of prompt tokens available for a model.
+
+        :param model: The model the prompt is sent to.
+        :return: Prompt token budget.
+        """
+        model_name = model.model if model else None
+        context_window = getattr(model, "context_window", None) or get_context_window(model_name)
+        budget = max(context_window - self.reserve_output_tokens, context_window // 2)
+        if self.max_prompt_tokens:
+            budget = min(budget, self.max_prompt_tokens)
+        return budget
+
+    def section_budget(self, section: str, model: Optional[LLMModel]) -> int:
+        """
+        Get the token budget of one prompt section.
+
+        :param section: The section name.
+        :param model: The model the prompt is sent to.
+        :return: Token budget of the section.
+        """
+        policy = self.sections[section]
+        budget = int(self.prompt_budget(model) * policy.share)
+        if policy.max_tokens:
+            budget = min(budget, policy.max_tokens)
+        return budget
+
+    def fit_text(self, section: str, text: str, model: Optional[LLMModel],
+                 on_model_call: Optional[Callable] = None, max_tokens: Optional[int] = None) -> str:
+        """
+        Fit a text section into its budget.
+
+        :param section: The section name, selects the budget and strategy.
+        :param text: The text to fit.
+        :param model: The model the prompt is sent to, also used for summaries.
+        :param on_model_call: Optional callback(response, model) to account summary calls.
+        :param max_tokens: Optional budget overriding the section budget.
+        :return: The text, shortened if it does not fit.
+        """
+        if not text:
+            return text
+        model_name = model.model if model else None
+        budget = max_tokens or self.section_budget(section, model)
+        tokens = count_tokens(text, model_name)
+        if tokens <= budget:
+            return text
+        if self.sections[section].strategy == SectionPolicy.SUMMARIZE and model:
+            summary = self._summarize(text, budget, model, on_model_call)
+            if summary:
+                return summary
+        return self.truncate(text, budget, model_name, tokens)
+
+    def fit_items(self, section: str, items: List[str], model: Optional[LLMModel],
+                  on_model_call: Optional[Callable] = None) -> List[str]:
+        """
+        Fit a list of items, oldest first, into the budget of a section.
+
+        :param section: The section name, selects the budget and strategy.
+        :param items: The items to fit, oldest first.
+        :param model: The model the prompt is sent to, also used for summaries.
+        :param on_model_call: Optional callback(response, model) to account summary calls.
+        :return: The items that fit, with omitted or summarized items replaced by a note.
+        """
+        model_name = model.model if model else None
+        budget = self.section_budget(section, model)
+        counts = [count_tokens(item, model_name) for item in items]
+        if sum(counts) <= budget:
+            return items
+
+        strategy = self.sections[section].strategy
+        if strategy == SectionPolicy.TRUNCATE:
+            # Give every item the same share of the budget
+            per_item = max(budget // max(len(items), 1), 1)
+            return [self.truncate(item, per_item, model_name, count) if count > per_item else item
+                    for item, count in zip(items, counts)]
+
+        # Keep the newest items that fit, the latest one is always kept even if it must be truncated
+        kept = []
+        used = 0
+        for item, count in zip(reversed(items), reversed(counts)):
+            if used + count > budget:
+                if not kept:
+                    kept.append(self.truncate(item, budget, model_name, count))
+                break
+            kept.append(item)
+            used += count
+        kept.reverse()
+        omitted = items[:len(items) - len(kept)]
+        if not omitted:
+            return kept
+        if strategy == SectionPolicy.SUMMARIZE and model:
+            summary_budget = max(budget - used, budget // 4)
+            summary = self._summarize("\n\n".join(omitted), summary_budget, model, on_model_call)
+            if summary:
+                return [f"[Summary of {len(omitted)} earlier items]\n{summary}"] + kept
+        return [f"[{len(omitted)} earlier items omitted to fit the context budget]"] + kept
+
+    @staticmethod
+    def truncate(text: str, max_tokens: int, model_name: Optional[str] = None, tokens: Optional[int] = None) -> str:
+        """
+        Shorten a text to about max_tokens, keeping its head and tail.
+
+        :param text: The text to shorten.
+        :param max_tokens: Token budget of the result.
+        :param model_name: Name of the model whose tokenizer is used.
+        :param tokens: Token count of the text, if already known.
+        :return: The shortened text with a marker where content was removed.
+        """
+        tokens = tokens if tokens is not None else count_tokens(text, model_name)
+        if tokens <= max_tokens:
+            return text
+        # Cut by characters in proportion to the token ratio, keeping two thirds from the head
+        keep_chars = int(len(text) * max_tokens / tokens)
+        head = keep_chars * 2 // 3
+        tail = keep_chars - head
+        return f"{text[:head]}\n...[{tokens - max_tokens} tokens truncated]...\n{text[len(text) - tail:] if tail else ''}"
+
+    def _summarize(self, text: str, max_tokens: int, model: LLMModel,
+                   on_model_call: Optional[Callable] = None) -> Optional[str]:
+        key = hashlib.sha256(f"{model.model}:{max_tokens}:{text}".encode("utf-8")).hexdigest()
+        with self._lock:
+            summary = self._summaries.get(key)
+            if summary is not None:
+                self._summaries.move_to_end(key)
+                return summary
+
+        # Summarize a bounded slice, the text may itself be larger than the context window
+        source = self.truncate(text, self.prompt_budget(model) // 2, model.model)
+        request = LLMRequest(
+            messages=[{"role": "user", "content": SUMMARY_PROMPT.format(max_words=max(int(max_tokens * 0.7), 20),
+                                                                        content=source)}],
+            temperature=0,
+            max_tokens=max_tokens
+        )
+        response = model.call(request)
+        if on_model_call:
+            on_model_call(response, model)
+        if response.is_error:
+            logger.warning(f"Failed to summarize prompt section, falling back to truncation: "
+                           f"{response.get_error_msg()}")
+            return None
+        summary = response.data["choices"][0]["message"]["content"]
+        with self._lock:
+            self._summaries[key] = summary
+            while len(self._summaries) > self.max_summaries:
+                self._summaries.popitem(last=False)
+        return summary
+
+
+SUMMARY_PROMPT = """Summarize the following content in at most {max_words} words. Keep every fact, number, name, file path, URL and decision that may be needed to continue the task, drop everything else.
+
+## Content
+{content}"""
@@ -1,3 +1,4 @@
+import math
 import time
 import uuid
 from dataclasses import dataclass, field
@@ -14,6 +15,134 @@ class AgentActionType(Enum):
     FINAL_ANSWER = "final_answer"
 
 
+class ModelCallPurpose(Enum):
+    """Enum representing why a model call was made."""
+    ROUTING = "routing"  # Coordinator decisions on which agent runs next
+    REACT_STEP = "react_step"  # One ReAct step of an agent
+    TOOL = "tool"  # Calls made inside a tool
+    SUMMARY = "summary"  # Summaries made to keep prompts within the context budget
+
+
+@dataclass
+class TokenUsage:
+    """
+    Represents the token usage of one or more model calls.
+
+    Attributes:
+        prompt_tokens: Tokens in the prompt, including cached ones
+        completion_tokens: Tokens generated by the model
+        total_tokens: Sum of prompt and completion tokens
+        cached_prompt_tokens: Prompt tokens served from the provider's prompt cache
+        cache_creation_tokens: Prompt tokens written to the provider's prompt cache
+    """
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    total_tokens: int = 0
+    cached_prompt_tokens: int = 0
+    cache_creation_tokens: int = 0
+
+    @classmethod
+    def from_dict(cls, usage: Optional[Dict[str, int]]) -> "TokenUsage":
+        """Create a TokenUsage from the normalized usage dict of an LLMResponse."""
+        usage = usage or {}
+        return cls(
+            prompt_tokens=usage.get("prompt_tokens", 0),
+            completion_tokens=usage.get("completion_tokens", 0),
+            total_tokens=usage.get("total_tokens", 0),
+            cached_prompt_tokens=usage.get("cached_prompt_tokens", 0),
+            cache_creation_tokens=usage.get("cache_creation_tokens", 0)
+        )
+
+    def add(self, other: "TokenUsage") -> "TokenUsage":
+        """Add the usage of another call to this one."""
+        self.prompt_tokens += other.prompt_tokens
+        self.completion_tokens += other.completion_tokens
+        self.total_tokens += other.total_tokens
+        self.cached_prompt_tokens += other.cached_prompt_tokens
+        self.cache_creation_tokens += other.cache_creation_tokens
+        return self
+
+    @classmethod
+    def total(cls, usages) -> "TokenUsage":
+        """Sum a list of usages."""
+        result = cls()
+        for usage in usages:
+            result.add(usage)
+        return result
+
+    def to_dict(self) -> Dict[str, int]:
+        """Convert the usage to a dictionary for serialization."""
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.total_tokens,
+            "cached_prompt_tokens": self.cached_prompt_tokens,
+            "cache_creation_tokens": self.cache_creation_tokens
+        }
+
+
+@dataclass
+class ModelCall:
+    """
+    Represents a single model call made during a team run.
+
+    Attributes:
+        purpose: Why the call was made (routing, ReAct step, tool-internal)
+        model: Name of the model that served the call
+        usage: Token usage of the call
+        source: Agent or tool that made the call
+        cached: Whether the response was served from the local LLM cache
+        usage_estimated: Whether the usage was estimated locally because the provider never reported it
+        early_dispatch_ms: For streams whose tool call was dispatched as soon as it was complete, milliseconds
+                           from sending the request to dispatching the tool, None otherwise
+        saved_ms: Milliseconds from dispatching the tool to the end of the stream, the time the tool did not
+                  wait for. None if the stream was closed, as its end is unknown
+        saved_tokens: Output tokens generated after the tool was dispatched, which the tool did not wait for
+        timestamp: When the call finished
+    """
+    purpose: ModelCallPurpose
+    model: str
+    usage: TokenUsage = field(default_factory=TokenUsage)
+    source: str = ""
+    cached: bool = False
+    usage_estimated: bool = False
+    early_dispatch_ms: Optional[float] = None
+    saved_ms: Optional[float] = None
+    saved_tokens: int = 0
+    timestamp: float = field(default_factory=time.time)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert the call to a dictionary for serialization."""
+        return {
+            "purpose": self.purpose.value,
+            "model": self.model,
+            "source": self.source,
+            "cached": self.cached,
+            "usage": self.usage.to_dict(),
+            "usage_estimated": self.usage_estimated,
+            "early_dispatch_ms": self.early_dispatch_ms,
+            "saved_ms": self.saved_ms,
+            "saved_tokens": self.saved_tokens,
+            "timestamp": self.timestamp
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ModelCall":
+        """Create a ModelCall from the dictionary returned by to_dict."""
+        return cls(
+            purpose=ModelCallPurpose(data["purpose"]),
+            model=data.get("model", ""),
+            usage=TokenUsage.from_dict(data.get("usage")),
+            source=data.get("source", ""),
+            cached=data.get("cached", False),
+            usage_estimated=data.get("usage_estimated", False),
+            early_dispatch_ms=data.get("early_dispatch_ms"),
+            saved_ms=data.get("saved_ms"),
+            saved_tokens=data.get("saved_tokens", 0),
+            timestamp=data.get("timestamp", 0.0)
+        )
+
+
 @dataclass
 class ToolResult:
     """
@@ -35,6 +164,68 @@ class ToolResult:
     execution_time: float = 0.0
 
 
+@dataclass
+class StepTiming:
+    """
+    Latency breakdown of one ReAct step of an agent, all times in seconds.
+
+    Attributes:
+        step: Number of the step within the agent's subtask, starting from 1
+        prompt_chars: Characters of the messages sent to the model
+        prompt_tokens: Prompt tokens reported by the provider, estimated if it reported none
+        prompt_build_time: Time to build the prompt, including summaries that keep it within the context budget
+        model_latency: Time from sending the request to the end of the reply
+        time_to_first_token: Time from sending the request to the first streamed chunk, None if not streamed
+        stream_duration: Time from the first streamed chunk to the end of the reply, None if not streamed
+        parse_time: Time to parse the reply into a thought, tool calls or a final answer
+        tool_time: Wall time of the tool calls of the step, concurrent calls overlap
+    """
+    step: int
+    prompt_chars: int = 0
+    prompt_tokens: int = 0
+    prompt_build_time: float = 0.0
+    model_latency: float = 0.0
+    time_to_first_token: Optional[float] = None
+    stream_duration: Optional[float] = None
+    parse_time: float = 0.0
+    tool_time: float = 0.0
+
+    @property
+    def total_time(self) -> float:
+        """Time of the whole step."""
+        return self.prompt_build_time + self.model_latency + self.parse_time + self.tool_time
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert the timing to a dictionary for serialization."""
+        return {
+            "step": self.step,
+            "prompt_chars": self.prompt_chars,
+            "prompt_tokens": self.prompt_tokens,
+            "prompt_build_time": self.prompt_build_time,
+            "model_latency": self.model_latency,
+            "time_to_first_token": self.time_to_first_token,
+            "stream_duration": self.stream_duration,
+            "parse_time": self.parse_time,
+            "tool_time": self.tool_time,
+            "total_time": self.total_time
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "StepTiming":
+        """Create a StepTiming from the dictionary returned by to_dict."""
+        return cls(
+            step=data.get("step", 0),
+            prompt_chars=data.get("prompt_chars", 0),
+            prompt_tokens=data.get("prompt_tokens", 0),
+            prompt_build_time=data.get("prompt_build_time", 0.0),
+            model_latency=data.get("model_latency", 0.0),
+            time_to_first_token=data.get("time_to_first_token"),
+            stream_duration=data.get("stream_duration"),
+            parse_time=data.get("parse_time", 0.0),
+            tool_time=data.get("tool_time", 0.0)
+        )
+
+
 @dataclass
 class AgentAction:
     """
@@ -47,6 +238,7 @@ class AgentAction:
         action_type: Type of action (tool use, thinking, final answer)
         content: Content of the action (thought content, final answer content)
         tool_result: Tool use details if action_type is TOOL_USE
+        timing: Latency breakdown of the step, set on the thinking action that opens every step
         timestamp: When the action was performed
     """
     agent_id: str
@@ -55,8 +247,45 @@ class AgentAction:
     id: str = field(default_factory=lambda: str(uuid.uuid4()))
     content: str = ""
     tool_result: Optional[ToolResult] = None
+    timing: Optional[StepTiming] = None
     timestamp: float = field(default_factory=time.time)
 
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert the action to a dictionary for serialization."""
+        return {
+            "id": self.id,
+            "agent_id": self.agent_id,
+            "agent_name": self.agent_name,
+            "action_type": self.action_type.value,
+            "content": self.content,
+            "tool_result": {
+                "tool_name": self.tool_result.tool_name,
+                "input_params": self.tool_result.input_params,
+                "output": self.tool_result.output,
+                "status": self.tool_result.status,
+                "error_message": self.tool_result.error_message,
+                "execution_time": self.tool_result.execution_time
+            } if self.tool_result else None,
+            "timing": self.timing.to_dict() if self.timing else None,
+            "timestamp": self.timestamp
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "AgentAction":
+        """Create an AgentAction from the dictionary returned by to_dict."""
+        tool_result = data.get("tool_result")
+        timing = data.get("timing")
+        return cls(
+            id=data["id"],
+            agent_id=data["agent_id"],
+            agent_name=data["agent_name"],
+            action_type=AgentActionType(data["action_type"]),
+            content=data.get("content", ""),
+            tool_result=ToolResult(**tool_result) if tool_result else None,
+            timing=StepTiming.from_dict(timing) if timing else None,
+            timestamp=data.get("timestamp", 0.0)
+        )
+
 
 @dataclass
 class AgentExecutionResult:
@@ -72,6 +301,8 @@ class AgentExecutionResult:
         start_time: When the agent started execution
         end_time: When the agent finished execution
         execution_time: Total time taken by the agent
+        model_calls: Model calls made by the agent and its tools
+        usage: Total token usage of the agent
     """
     agent_id: str
     agent_name: str
@@ -80,6 +311,12 @@ class AgentExecutionResult:
     final_answer: str = ""
     start_time: float = field(default_factory=time.time)
     end_time: float = 0.0
+    model_calls: List[ModelCall] = field(default_factory=list)
+
+    @property
+    def usage(self) -> TokenUsage:
+        """Calculate the total token usage."""
+        return TokenUsage.total(call.usage for call in self.model_calls)
 
     @property
     def execution_time(self) -> float:
@@ -114,7 +351,10 @@ class TeamResult:
         final_output: The final output of the team run
         start_time: When the team run started
         end_time: When the team run finished
-        status: Status of the team run
+        status: Status of the team run (running/completed/failed, or timeout/cancelled for a partial result)
+        model_calls: Model calls made by the team itself, e.g. coordinator routing decisions
+        handoffs_folded: Next-agent selections taken from the agents' final replies, each one a routing
+                         model call saved, see AgentTeam(fold_handoff=True)
     """
     team_name: str
     task: Task
@@ -124,6 +364,8 @@ class TeamResult:
     start_time: float = field(default_factory=time.time)
     end_time: float = 0.0
     status: str = "running"
+    model_calls: List[ModelCall] = field(default_factory=list)
+    handoffs_folded: int = 0
 
     def __post_init__(self):
         """Initialize id with task id if not provided"""
@@ -137,6 +379,26 @@ class TeamResult:
             return self.end_time - self.start_time
         return 0.0
 
+    @property
+    def all_model_calls(self) -> List[ModelCall]:
+        """All model calls of the run, team level and per agent."""
+        calls = list(self.model_calls)
+        for agent_result in self.agent_results:
+            calls.extend(agent_result.model_calls)
+        return calls
+
+    @property
+    def usage(self) -> TokenUsage:
+        """Calculate the total token usage of the run."""
+        return TokenUsage.total(call.usage for call in self.all_model_calls)
+
+    def usage_by_purpose(self) -> Dict[str, Dict[str, int]]:
+        """Break the token usage down by the purpose of the calls."""
+        breakdown = {}
+        for call in self.all_model_calls:
+            breakdown.setdefault(call.purpose.value, TokenUsage()).add(call.usage)
+        return {purpose: usage.to_dict() for purpose, usage in breakdown.items()}
+
     def add_agent_result(self, agent_result: AgentExecutionResult) -> None:
         """Add an agent result to the team run."""
         self.agent_results.append(agent_result)
@@ -156,6 +418,8 @@ class TeamResult:
                 self.task.update_status(TaskStatus.COMPLETED)
             elif status == "failed":
                 self.task.update_status(TaskStatus.FAILED)
+            elif status in ("timeout", "cancelled"):
+                self.task.update_status(TaskStatus.CANCELLED)
 
     def to_dict(self) -> Dict[str, Any]:
         """Convert the result to a dictionary for serialization."""
@@ -175,23 +439,9 @@ class TeamResult:
                     "subtask": ar.subtask,
                     "final_answer": ar.final_answer,
                     "execution_time": ar.execution_time,
-                    "actions": [
-                        {
-                            "id": action.id,
-                            "agent_name": action.agent_name,
-                            "action_type": action.action_type.value,
-                            "content": action.content,
-                            "tool_result": {
-                                "tool_name": action.tool_result.tool_name,
-                                "input_params": action.tool_result.input_params,
-                                "output": action.tool_result.output,
-                                "status": action.tool_result.status,
-                                "execution_time": action.tool_result.execution_time
-                            } if action.tool_result else None,
-                            "timestamp": action.timestamp
-                        }
-                        for action in ar.actions
-                    ]
+                    "usage": ar.usage.to_dict(),
+                    "model_calls": [call.to_dict() for call in ar.model_calls],
+                    "actions": [action.to_dict() for action in ar.actions]
                 }
                 for ar in self.agent_results
             ],
@@ -199,7 +449,90 @@ class TeamResult:
             "execution_time": self.execution_time,
             "start_time": self.start_time,
             "end_time": self.end_time,
-            "status": self.status
+            "status": self.status,
+            "usage": self.usage.to_dict(),
+            "usage_by_purpose": self.usage_by_purpose(),
+            "early_dispatches": sum(1 for call in self.all_model_calls if call.early_dispatch_ms is not None),
+            "early_dispatch_saved_ms": sum(call.saved_ms or 0 for call in self.all_model_calls),
+            "handoffs_folded": self.handoffs_folded,
+            "model_calls": [call.to_dict() for call in self.model_calls]
+        }
+
+
+@dataclass
+class BatchStats:
+    """
+    Aggregate throughput of the runs of AgentTeam.run_many, updated as each result comes in.
+
+    Attributes:
+        tasks: Number of finished runs
+        statuses: Number of runs per status, e.g. {"completed": 98, "timeout": 2}
+        latencies: Execution time of each run in seconds, in the order the runs finished
+        total_tokens: Tokens used by all runs
+        start_time: When the first run was scheduled
+        end_time: When the last run finished, 0 while runs are pending
+    """
+    tasks: int = 0
+    statuses: Dict[str, int] = field(default_factory=dict)
+    latencies: List[float] = field(default_factory=list)
+    total_tokens: int = 0
+    start_time: float = 0.0
+    end_time: float = 0.0
+
+    def add(self, result: TeamResult) -> None:
+        """Count a finished run."""
+        self.tasks += 1
+        self.statuses[result.status] = self.statuses.get(result.status, 0) + 1
+        self.latencies.append(result.execution_time)
+        self.total_tokens += result.usage.total_tokens
+
+    @property
+    def elapsed(self) -> float:
+        """Wall-clock seconds since the first run was scheduled, up to the end of the last run."""
+        if not self.start_time:
+            return 0.0
+        return (self.end_time or time.time()) - self.start_time
+
+    @property
+    def tasks_per_second(self) -> float:
+        return self.tasks / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def tokens_per_second(self) -> float:
+        return self.total_tokens / self.elapsed if self.elapsed > 0 else 0.0
+
+    def latency_percentile(self, percentile: float) -> float:
+        """
+        Get a percentile of the run latencies, by the nearest-rank method.
+
+        :param percentile: The percentile, between 0 and 100.
+        :return: Latency in seconds, 0 if no run finished yet.
+        """
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        rank = max(math.ceil(percentile * len(ordered) / 100), 1)
+        return ordered[min(rank, len(ordered)) - 1]
+
+    @property
+    def p50_latency(self) -> float:
+        return self.latency_percentile(50)
+
+    @property
+    def p95_latency(self) -> float:
+        return self.latency_percentile(95)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert the statistics to a dictionary for serialization."""
+        return {
+            "tasks": self.tasks,
+            "statuses": dict(self.statuses),
+            "elapsed": self.elapsed,
+            "tasks_per_second": self.tasks_per_second,
+            "p50_latency": self.p50_latency,
+            "p95_latency": self.p95_latency,
+            "total_tokens": self.total_tokens,
+            "tokens_per_second": self.tokens_per_second
         }
 
 
@@ -211,7 +544,7 @@ class AgentResult:
     Attributes:
         final_answer: The final answer provided by the agent
         step_count: Number of steps taken by the agent
-        status: Status of the execution (success/error)
+        status: Status of the execution (success/error, or timeout/cancelled if the step was stopped)
         error_message: Error message if execution failed
     """
     final_answer: str
@@ -234,7 +567,17 @@ class AgentResult:
             error_message=error_message
         )
 
+    @classmethod
+    def cancelled(cls, reason: str, step_count: int = 0) -> "AgentResult":
+        """Create the result of a step stopped by a cancellation token, reason is timeout or cancelled"""
+        return cls(final_answer="", step_count=step_count, status=reason)
+
     @property
     def is_error(self) -> bool:
         """Check if the result represents an error"""
         return self.status == "error"
+
+    @property
+    def is_cancelled(self) -> bool:
+        """Check if the step was stopped by a cancellation token"""
+        return self.status in ("timeout", "cancelled")
@@ -21,6 +21,7 @@ class TaskStatus(Enum):
     PROCESSING = "processing"  # In progress
     COMPLETED = "completed"  # Completed
     FAILED = "failed"  # Failed
+    CANCELLED = "cancelled"  # Cancelled or stopped at its deadline
 
 
 @dataclass
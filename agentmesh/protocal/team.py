@@ -1,19 +1,40 @@
-from typing import Union, Literal
+import asyncio
+import copy
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Union, Literal, Optional, Iterable, Iterator
 import json
 import re
 
 from agentmesh.common import LoadingIndicator
 from agentmesh.common.utils import string_util
+from agentmesh.common.utils.cancellation import CancellationToken, TaskCancelledError
+from agentmesh.common.utils.hooks import RunHooks
 from agentmesh.common.utils.log import logger
+from agentmesh.common.utils.tracing import trace_span, bind_context, SPAN_TEAM_RUN, SPAN_TEAM_ROUTE, SPAN_AGENT_DECIDE, STATUS_OK, \
+    STATUS_ERROR
 from agentmesh.models import LLMRequest, LLMModel
-from agentmesh.protocal.agent import Agent
+from agentmesh.protocal.agent import Agent, DECISION_MAX_TOKENS
+from agentmesh.protocal.checkpoint import CheckpointStore, RunCheckpoint, RunSnapshot, get_checkpoint_store, \
+    PHASE_ROUTE, PHASE_DECIDE, PHASE_FINISH
 from agentmesh.protocal.context import TeamContext
-from agentmesh.protocal.result import TeamResult, AgentExecutionResult
+from agentmesh.protocal.result import TeamResult, AgentExecutionResult, AgentResult, ModelCall, ModelCallPurpose, \
+    TokenUsage, BatchStats
 from agentmesh.protocal.task import Task, TaskStatus
+from agentmesh.tools.blob_store import create_task_blob_store, get_blob_store_config
+from agentmesh.tools.read_blob import ReadBlob
+from agentmesh.tools.tool_cache import create_task_tool_cache
 
 
 class AgentTeam:
-    def __init__(self, name: str, description: str, rule: str = "", model: LLMModel = None, max_steps: int = 20):
+    """
+    A team of agents. The team and its agents only define how tasks are run: every run works on its own
+    copy of them, so one team can run many tasks one after another or at the same time.
+    """
+
+    def __init__(self, name: str, description: str, rule: str = "", model: LLMModel = None, max_steps: int = 20,
+                 checkpoint_store: CheckpointStore = None, hooks: list = None, plan_mode: str = "chain",
+                 fold_handoff: bool = False):
         """
         Initialize the AgentTeam with a name, description, rules, and a list of agents.
 
@@ -22,7 +43,21 @@ class AgentTeam:
         :param rule: The rules governing the agent group.
         :param model: An instance of LLMModel to be used by the team.
         :param max_steps: Maximum number of total steps across all agents (default: 20)
+        :param checkpoint_store: Optional store the runs are checkpointed to so they can be resumed,
+                                 defaults to the `checkpoint` config section
+        :param hooks: Optional list of RunHooks notified of the lifecycle events of every run
+        :param plan_mode: How the work is split between the agents: "chain" lets the coordinator select the first
+                          agent and every agent select the next one, "parallel" lets the coordinator plan all
+                          subtasks with their dependencies up front and runs independent subtasks at the same time.
+                          Runs in parallel mode are only checkpointed at their start and end, a resumed run plans
+                          again
+        :param fold_handoff: Whether agents propose the next member and its subtask in their final reply. A valid
+                             proposal is accepted without asking the team model, which saves one model call per
+                             hop. Missing or invalid proposals fall back to the decision call. Only used in
+                             "chain" mode
         """
+        if plan_mode not in PLAN_MODES:
+            raise ValueError(f"Invalid plan_mode '{plan_mode}', must be one of {PLAN_MODES}")
         self.name = name
         self.description = description
         self.rule = rule
@@ -31,6 +66,11 @@ class AgentTeam:
         self.model: LLMModel = model  # Instance of LLMModel
         self.max_steps = max_steps  # Maximum total steps across all agents
         self.task_short_name = ""
+        self.checkpoint_store = checkpoint_store if checkpoint_store is not None else get_checkpoint_store()
+        self.plan_mode = plan_mode
+        self.fold_handoff = fold_handoff
+        for hook in hooks or []:
+            self.add_hook(hook)
 
     def add(self, agent: Agent):
         """
@@ -44,233 +84,874 @@ class AgentTeam:
         if not agent.model and self.model:
             agent.model = self.model
 
+        # Large observations are replaced by a handle, the agent needs the tool that reads them
+        if get_blob_store_config().get("enabled", False) and \
+                not any(tool.name == ReadBlob.name for tool in agent.tools):
+            agent.add_tool(ReadBlob())
+
         self.agents.append(agent)
 
-    def run(self, task: Union[str, Task], output_mode: Literal["print", "logger"] = "logger") -> TeamResult:
+    def add_hook(self, hook: RunHooks):
+        """
+        Register lifecycle hooks, see RunHooks for the events.
+
+        :param hook: The hooks to register.
+        """
+        self.context.hooks.add(hook)
+
+    def _new_run(self) -> "AgentTeam":
+        """
+        Create the team that runs one task: a copy with its own context and copies of the agents and their tools,
+        sharing the models, the checkpoint store and the hooks with this team.
+        """
+        team_run = copy.copy(self)
+        team_run.agents = []
+        team_run.context = TeamContext(self.name, self.description, self.rule, agents=team_run.agents,
+                                       max_steps=self.max_steps)
+        team_run.context.hooks = self.context.hooks
+        team_run.context.fold_handoff = self.fold_handoff and self.plan_mode == "chain"
+        for agent in self.agents:
+            team_run.agents.append(agent.copy(team_run.context))
+        return team_run
+
+    def run(self, task: Union[str, Task], output_mode: Literal["print", "logger"] = "logger",
+            deadline: float = None, timeout: float = None, cancel_token: CancellationToken = None) -> TeamResult:
         """
         Decide which agent will handle the task and execute its step method.
         
         :param task: The task to be processed, can be a string or Task object
         :param output_mode: Control how execution progress is displayed: 
                            "print" for console output or "logger" for using logger
-        :return: A TeamResult object containing the execution results
+        :param deadline: Optional wall-clock deadline of the run as a time.time() timestamp
+        :param timeout: Optional number of seconds the run may take, the earlier of deadline and timeout applies
+        :param cancel_token: Optional CancellationToken to cancel the run from another thread
+        :return: A TeamResult object containing the execution results. A run stopped by its deadline or token
+                 holds the answers given so far, with status "timeout" or "cancelled"
         """
-        # Set output mode in context for agents to use
-        self.context.output_mode = output_mode
+        with trace_span(SPAN_TEAM_RUN, {"agentmesh.team.name": self.name}) as span:
+            team_run = self._new_run()
+            task, result, output = team_run._begin_run(task, output_mode,
+                                                       self._create_cancel_token(deadline, timeout, cancel_token))
+            result = team_run._execute_run(task, result, output, output_mode)
+            self._trace_run_result(span, result)
+            return result
 
-        # Create a function for output based on the mode
-        def output(message, end="\n"):
-            if output_mode == "print":
-                print(message, end=end)
-            elif message:
-                logger.info(message.strip())
+    def resume(self, task_id: str, output_mode: Literal["print", "logger"] = "logger",
+               deadline: float = None, timeout: float = None, cancel_token: CancellationToken = None) -> TeamResult:
+        """
+        Continue a checkpointed run, e.g. after the process running it died or the run timed out. Finished
+        steps, tool calls and agents are restored from the checkpoint instead of being repeated.
+        The team must have the same agents, in the same order, as the team that started the run.
 
-        # Convert string task to Task object if needed
-        if isinstance(task, str):
-            task = Task(content=task)
+        :param task_id: The id of the task of the run
+        :param output_mode: Control how execution progress is displayed:
+                           "print" for console output or "logger" for using logger
+        :param deadline: Optional wall-clock deadline of the resumed run as a time.time() timestamp
+        :param timeout: Optional number of seconds the resumed run may take
+        :param cancel_token: Optional CancellationToken to cancel the resumed run from another thread
+        :return: A TeamResult object with the restored and the new execution results
+        """
+        with trace_span(SPAN_TEAM_RUN, {"agentmesh.team.name": self.name, "agentmesh.resumed": True}) as span:
+            snapshot = self._load_snapshot(task_id)
+            team_run = self._new_run()
+            task, result, output = team_run._begin_run(snapshot.task, output_mode,
+                                                       self._create_cancel_token(deadline, timeout, cancel_token),
+                                                       snapshot)
+            result = team_run._execute_run(task, result, output, output_mode, snapshot)
+            self._trace_run_result(span, result)
+            return result
 
-        # Update task status
-        task.update_status(TaskStatus.PROCESSING)
+    def _execute_run(self, task: Task, result: TeamResult, output, output_mode: str,
+                     snapshot: RunSnapshot = None) -> TeamResult:
+        try:
+            if self.plan_mode == "parallel" and (snapshot is None or snapshot.phase == PHASE_ROUTE):
+                if not self._run_plan(task, result, output_mode, output):
+                    return result
+            elif snapshot is None or snapshot.phase == PHASE_ROUTE:
+                request = self._build_coordinator_request(task)
+
+                with trace_span(SPAN_TEAM_ROUTE, {"agentmesh.team.name": self.name}) as span:
+                    # Start loading animation (only in print mode)
+                    loading = None
+                    if output_mode == "print":
+                        loading = LoadingIndicator(message="Select an agent in the team...", animation_type="spinner")
+                        loading.start()
+
+                    # Directly call the model instance
+                    response = self.model.call(request)
+
+                    # Stop loading animation if in print mode
+                    if loading:
+                        loading.stop()
+
+                    selection = self._apply_coordinator_response(response, result)
+                    self._trace_selection(span, selection[0] if selection else -1)
+                if selection is None:
+                    return result
+                self._run_chain(result, output_mode, output, selection[0])
+            elif snapshot.phase != PHASE_FINISH:
+                self._run_chain(result, output_mode, output, snapshot.next_agent, snapshot.total_steps_used,
+                                decide_first=snapshot.phase == PHASE_DECIDE)
+
+            self._finish_run(result, task, output)
+
+            # Clean up resources before returning
+            self.cleanup()
 
-        # Create a TeamResult to track the execution
-        result = TeamResult(team_name=self.name, task=task)
+            return result
 
-        # Store task in context
-        self.context.user_task = task.get_text()
-        self.context.task = task
-        self.context.model = self.model  # Set the model in the context
+        except Exception as e:
+            self._fail_run(result, e)
 
-        # Print user task and team information
-        output("")
-        output(f"Team {self.name} received the task and started processing")
-        output("")
+            # Clean up resources even when exception occurs
+            self.cleanup()
+
+            return result
+
+    def _run_chain(self, result: TeamResult, output_mode: str, output, agent_id: int, total_steps_used: int = 0,
+                   decide_first: bool = False):
+        """
+        Run the agents one after another, each selecting the next one, until the chain ends.
 
+        :param agent_id: The agent that runs first, or that selects the next agent if decide_first is set
+        :param total_steps_used: Steps already used by the agents of the run
+        :param decide_first: Whether the first agent already finished its subtask, e.g. in a resumed run
+        """
+        agent = self.agents[agent_id]
+        while True:
+            if not decide_first:
+                # Pass output mode to agent
+                agent.output_mode = output_mode
+
+                # Create an AgentExecutionResult to track this agent's execution
+                agent_result = AgentExecutionResult(agent_id=str(agent_id), agent_name=agent.name,
+                                                    subtask=agent.subtask)
+
+                # Execute the agent's step method
+                step_result = agent.step()
+                total_steps_used += self._add_agent_result(result, agent_result, agent, step_result)
+
+                # Stop at the deadline or when the run was cancelled, keeping the answers so far
+                if step_result.is_cancelled or self._is_cancelled():
+                    return
+                if self.context.checkpoint:
+                    self.context.checkpoint.agent_end(agent_id, agent, agent_result, total_steps_used)
+            decide_first = False
+
+            # Check if we've exceeded the maximum total steps
+            if total_steps_used >= self.max_steps:
+                output(f"\nReached maximum total steps ({self.max_steps}). Stopping execution.")
+                return
+
+            # Get the next agent ID, if no next agent or invalid ID, break the loop
+            with trace_span(SPAN_AGENT_DECIDE, {"agentmesh.agent.name": agent.name}) as span:
+                agent_id = self._take_handoff(agent, result, span)
+                if agent_id is None:
+                    agent_id = agent.should_invoke_next_agent()
+                self._trace_selection(span, agent_id)
+            if not self._apply_next_agent(agent_id):
+                return
+            agent = self.agents[agent_id]
+
+    def run_many(self, tasks: Iterable[Union[str, Task]], concurrency: int = 4, timeout: float = None,
+                 output_mode: Literal["print", "logger"] = "logger", cancel_token: CancellationToken = None,
+                 stats: BatchStats = None) -> Iterator[TeamResult]:
+        """
+        Run many tasks on a pool of worker threads, yielding each result as soon as its run is complete.
+        Tasks are taken from the iterable only when a worker is free, so it can be a long or endless queue.
+        Model calls of all runs share the per-account limits of the models, see `max_concurrency` in the
+        model config. Stopping the iteration cancels the runs that are still going.
+
+        :param tasks: The tasks to run, strings or Task objects
+        :param concurrency: Max number of runs at the same time
+        :param timeout: Optional number of seconds each run may take, counted from its start
+        :param output_mode: Control how execution progress is displayed, "logger" is recommended as the output
+                            of concurrent runs is interleaved
+        :param cancel_token: Optional CancellationToken to cancel all runs and stop taking tasks
+        :param stats: Optional BatchStats updated with every result, for tasks/s, latency percentiles and tokens/s
+        :return: An iterator of TeamResult objects, in the order the runs complete
+        """
+        batch_token = cancel_token.child() if cancel_token is not None else CancellationToken()
+        stats = stats if stats is not None else BatchStats()
+        stats.start_time = time.time()
+        tasks = iter(tasks)
+        pending = set()
+        executor = ThreadPoolExecutor(max_workers=max(concurrency, 1), thread_name_prefix=f"{self.name}-run")
         try:
-            # Generate agents_str from the list of agents
-            agents_str = ', '.join(
-                f'{{"id": {i}, "name": "{agent.name}", "description": "{agent.description}", "system_prompt": "{agent.system_prompt}"}}'
-                for i, agent in enumerate(self.agents)
-            )
+            while True:
+                while len(pending) < max(concurrency, 1) and not batch_token.is_cancelled:
+                    task = next(tasks, None)
+                    if task is None:
+                        break
+                    pending.add(executor.submit(self.run, task, output_mode, timeout=timeout,
+                                                cancel_token=batch_token))
+                if not pending:
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = future.result()
+                    stats.add(result)
+                    yield result
+        finally:
+            if pending:
+                # The caller stopped iterating, or a run raised: stop the other runs
+                batch_token.cancel()
+                for future in pending:
+                    future.cancel()
+            executor.shutdown(wait=True)
+            batch_token.close()
+            stats.end_time = time.time()
+
+    async def arun(self, task: Union[str, Task], output_mode: Literal["print", "logger"] = "logger",
+                   deadline: float = None, timeout: float = None,
+                   cancel_token: CancellationToken = None) -> TeamResult:
+        """
+        Coroutine version of run. Model calls are awaited and blocking tools run in an executor, so many
+        runs can share one event loop. No loading animation threads are started. When the run is cancelled
+        the awaited model call or agent step is cancelled right away.
 
-            prompt = GROUP_DECISION_PROMPT.format(group_name=self.name, group_description=self.description,
-                                                  group_rules=self.rule, agents_str=agents_str,
-                                                  user_task=task.get_text())
+        :param task: The task to be processed, can be a string or Task object
+        :param output_mode: Control how execution progress is displayed:
+                           "print" for console output or "logger" for using logger
+        :param deadline: Optional wall-clock deadline of the run as a time.time() timestamp
+        :param timeout: Optional number of seconds the run may take, the earlier of deadline and timeout applies
+        :param cancel_token: Optional CancellationToken to cancel the run from another thread
+        :return: A TeamResult object containing the execution results, partial if the run was stopped
+        """
+        with trace_span(SPAN_TEAM_RUN, {"agentmesh.team.name": self.name}) as span:
+            team_run = self._new_run()
+            task, result, output = team_run._begin_run(task, output_mode,
+                                                       self._create_cancel_token(deadline, timeout, cancel_token))
+            result = await team_run._aexecute_run(task, result, output, output_mode)
+            self._trace_run_result(span, result)
+            return result
 
-            # Start loading animation (only in print mode)
-            loading = None
-            if output_mode == "print":
-                loading = LoadingIndicator(message="Select an agent in the team...", animation_type="spinner")
-                loading.start()
+    async def aresume(self, task_id: str, output_mode: Literal["print", "logger"] = "logger",
+                      deadline: float = None, timeout: float = None,
+                      cancel_token: CancellationToken = None) -> TeamResult:
+        """Coroutine version of resume"""
+        with trace_span(SPAN_TEAM_RUN, {"agentmesh.team.name": self.name, "agentmesh.resumed": True}) as span:
+            snapshot = await asyncio.get_running_loop().run_in_executor(None, self._load_snapshot, task_id)
+            team_run = self._new_run()
+            task, result, output = team_run._begin_run(snapshot.task, output_mode,
+                                                       self._create_cancel_token(deadline, timeout, cancel_token),
+                                                       snapshot)
+            result = await team_run._aexecute_run(task, result, output, output_mode, snapshot)
+            self._trace_run_result(span, result)
+            return result
 
-            request = LLMRequest(
-                messages=[{
-                    "role": "user",
-                    "content": prompt
-                }],
-                temperature=0,
-                json_format=True
-            )
+    async def _aexecute_run(self, task: Task, result: TeamResult, output, output_mode: str,
+                            snapshot: RunSnapshot = None) -> TeamResult:
+        loop = asyncio.get_running_loop()
+        try:
+            if self.plan_mode == "parallel" and (snapshot is None or snapshot.phase == PHASE_ROUTE):
+                if not await self._arun_plan(task, result, output_mode, output):
+                    return result
+            elif snapshot is None or snapshot.phase == PHASE_ROUTE:
+                with trace_span(SPAN_TEAM_ROUTE, {"agentmesh.team.name": self.name}) as span:
+                    response = await self._until_cancelled(self.model.acall(self._build_coordinator_request(task)))
+                    selection = self._apply_coordinator_response(response, result)
+                    self._trace_selection(span, selection[0] if selection else -1)
+                if selection is None:
+                    return result
+                await self._arun_chain(result, output_mode, output, selection[0])
+            elif snapshot.phase != PHASE_FINISH:
+                await self._arun_chain(result, output_mode, output, snapshot.next_agent, snapshot.total_steps_used,
+                                       decide_first=snapshot.phase == PHASE_DECIDE)
+
+            self._finish_run(result, task, output)
+            await loop.run_in_executor(None, self.cleanup)
+            return result
+
+        except TaskCancelledError:
+            self._finish_run(result, task, output)
+            await loop.run_in_executor(None, self.cleanup)
+            return result
+
+        except Exception as e:
+            self._fail_run(result, e)
+            await loop.run_in_executor(None, self.cleanup)
+            return result
 
-            # Directly call the model instance
-            response = self.model.call(request)
+    async def _arun_chain(self, result: TeamResult, output_mode: str, output, agent_id: int,
+                          total_steps_used: int = 0, decide_first: bool = False):
+        """Coroutine version of _run_chain"""
+        loop = asyncio.get_running_loop()
+        agent = self.agents[agent_id]
+        while True:
+            if not decide_first:
+                agent.output_mode = output_mode
+                agent_result = AgentExecutionResult(agent_id=str(agent_id), agent_name=agent.name,
+                                                    subtask=agent.subtask)
+                try:
+                    step_result = await self._until_cancelled(agent.astep())
+                except TaskCancelledError as e:
+                    # The step was interrupted, keep the actions and model calls the agent recorded so far
+                    step_result = AgentResult.cancelled(e.reason)
+                total_steps_used += self._add_agent_result(result, agent_result, agent, step_result)
+
+                if step_result.is_cancelled or self._is_cancelled():
+                    return
+                if self.context.checkpoint:
+                    await loop.run_in_executor(None, self.context.checkpoint.agent_end, agent_id, agent,
+                                               agent_result, total_steps_used)
+            decide_first = False
+
+            if total_steps_used >= self.max_steps:
+                output(f"\nReached maximum total steps ({self.max_steps}). Stopping execution.")
+                return
+
+            with trace_span(SPAN_AGENT_DECIDE, {"agentmesh.agent.name": agent.name}) as span:
+                agent_id = self._take_handoff(agent, result, span)
+                if agent_id is None:
+                    agent_id = await self._until_cancelled(agent.ashould_invoke_next_agent())
+                self._trace_selection(span, agent_id)
+            if not self._apply_next_agent(agent_id):
+                return
+            agent = self.agents[agent_id]
+
+    def _run_plan(self, task: Task, result: TeamResult, output_mode: str, output) -> bool:
+        """
+        Let the coordinator plan the subtasks, then run them wave by wave. The subtasks of a wave do not depend
+        on each other and run at the same time, their outputs are joined before the next wave starts.
 
-            # Stop loading animation if in print mode
+        :return: False if planning failed and the result is already complete
+        """
+        with trace_span(SPAN_TEAM_ROUTE, {"agentmesh.team.name": self.name, "agentmesh.plan_mode": "parallel"}) as span:
+            loading = None
+            if output_mode == "print":
+                loading = LoadingIndicator(message="Plan the subtasks of the team...", animation_type="spinner")
+                loading.start()
+            response = self.model.call(self._build_plan_request(task))
             if loading:
                 loading.stop()
+            waves = self._apply_plan_response(response, result)
+            self._trace_plan(span, waves)
+        if waves is None:
+            return False
+
+        total_steps_used = 0
+        skipped = set()
+        for wave in waves:
+            runnable = self._wave_branches(wave, skipped, output)
+            if not runnable:
+                continue
+            if len(runnable) == 1:
+                branches = [self._run_branch(runnable[0][0], output_mode, runnable[0][1])]
+            else:
+                # Every branch runs in a copy of the current context, so its spans are nested in the run
+                with ThreadPoolExecutor(max_workers=len(runnable),
+                                        thread_name_prefix=f"{self.name}-agent") as executor:
+                    branches = list(executor.map(lambda branch: branch(),
+                                                 [bind_context(self._run_branch, planned, output_mode, max_steps)
+                                                  for planned, max_steps in runnable]))
+            total_steps_used += self._join_branches(result, branches)
+            self._skip_failed_branches(runnable, branches, skipped)
+            if not self._continue_plan(branches, total_steps_used, output):
+                break
+        return True
+
+    async def _arun_plan(self, task: Task, result: TeamResult, output_mode: str, output) -> bool:
+        """Coroutine version of _run_plan"""
+        with trace_span(SPAN_TEAM_ROUTE, {"agentmesh.team.name": self.name, "agentmesh.plan_mode": "parallel"}) as span:
+            response = await self._until_cancelled(self.model.acall(self._build_plan_request(task)))
+            waves = self._apply_plan_response(response, result)
+            self._trace_plan(span, waves)
+        if waves is None:
+            return False
+
+        total_steps_used = 0
+        skipped = set()
+        for wave in waves:
+            runnable = self._wave_branches(wave, skipped, output)
+            if not runnable:
+                continue
+            branches = await asyncio.gather(*[self._arun_branch(planned, output_mode, max_steps)
+                                              for planned, max_steps in runnable])
+            total_steps_used += self._join_branches(result, branches)
+            self._skip_failed_branches(runnable, branches, skipped)
+            if not self._continue_plan(branches, total_steps_used, output):
+                break
+        return True
+
+    def _wave_branches(self, wave: list, skipped: set, output) -> list:
+        """
+        Select the subtasks of a wave that run and their step budgets. A subtask is skipped if a subtask it depends
+        on failed or was skipped, or if no step of the run is left for it.
 
-            # Check if the API call was successful
-            if response.is_error:
-                error_message = response.get_error_msg()
-                # Use logger to record errors regardless of output mode
-                logger.error(f"Error: {error_message}")
-                # No need to duplicate error messages in console, as logger already handles it
-                result.complete("failed")
-                return result
-
-            reply_text = response.data["choices"][0]["message"]["content"]
-
-            # Parse the response to get the selected agent's id
-            try:
-                decision_res = string_util.json_loads(reply_text)
-                selected_agent_id = decision_res.get("id")  # Extract the id from the response
-                subtask = decision_res.get("subtask")
-                task_short_name = decision_res.get("task_short_name")
-                self.context.task_short_name = task_short_name
-
-                # Find the selected agent based on the id
-                selected_agent: Agent = self.agents[selected_agent_id]
-                selected_agent.subtask = subtask
-            except (json.JSONDecodeError, IndexError, KeyError, ValueError) as e:
-                error_message = f"Failed to parse model response: {str(e)}\nResponse: {reply_text[:100]}..."
-                logger.error(f"Error: {error_message}")
-                result.complete("failed")
-                return result
-
-            # Pass output mode to agent
-            selected_agent.output_mode = output_mode
-
-            # Track total steps used across all agents
-            total_steps_used = 0
-
-            if selected_agent:
-                # Create an AgentExecutionResult to track this agent's execution
-                agent_result = AgentExecutionResult(
-                    agent_id=str(selected_agent_id),
-                    agent_name=selected_agent.name,
-                    subtask=subtask
-                )
-
-                # Execute the selected agent's step method
-                step_result = selected_agent.step()
-                final_answer = step_result.final_answer
-                step_count = step_result.step_count
-
-                # Update total steps used
-                total_steps_used += step_count
-
-                # Collect the execution results of the selected agent
-                agent_result.final_answer = final_answer if final_answer else ""
-
-                # Collect the execution history of the selected agent
-                if hasattr(selected_agent, 'captured_actions') and selected_agent.captured_actions:
-                    for action in selected_agent.captured_actions:
-                        agent_result.add_action(action)
-
-                # Mark the selected agent execution as complete
-                agent_result.complete()
-
-                # Add the selected agent result to the team result
-                result.add_agent_result(agent_result)
-
-                # Process the agent chain
-                current_agent = selected_agent
-                while True:
-                    # Check if we've exceeded the maximum total steps
-                    if total_steps_used >= self.max_steps:
-                        output(f"\nReached maximum total steps ({self.max_steps}). Stopping execution.")
-                        break
-
-                    # Get the next agent ID
-                    next_agent_id = current_agent.should_invoke_next_agent()
+        :param skipped: Ids of the failed and skipped subtasks, the subtasks skipped now are added
+        :return: The (planned, max_steps) pairs of the branches to run, in the order of the wave
+        """
+        runnable = []
+        for planned in wave:
+            failed = [dependency for dependency in planned.depends_on if dependency in skipped]
+            if failed:
+                output(f"\nSkipping subtask {planned.subtask_id}: the subtasks it depends on failed "
+                       f"({', '.join(failed)})")
+                skipped.add(planned.subtask_id)
+            else:
+                runnable.append(planned)
+        if not runnable:
+            return []
+        branches = []
+        for planned, max_steps in zip(runnable, self._branch_budgets(len(runnable))):
+            if max_steps > 0:
+                branches.append((planned, max_steps))
+            else:
+                output(f"\nSkipping subtask {planned.subtask_id}: no steps of the run are left for it")
+                skipped.add(planned.subtask_id)
+        return branches
+
+    @staticmethod
+    def _skip_failed_branches(runnable: list, branches: list, skipped: set):
+        """Add the subtasks of a wave that failed or gave no answer to skipped, see _wave_branches"""
+        for (planned, _), (_, _, step_result) in zip(runnable, branches):
+            if step_result.is_error or not step_result.final_answer:
+                skipped.add(planned.subtask_id)
+
+    def _branch_budgets(self, branch_count: int) -> list:
+        """
+        Split the steps left to the run between the branches of a wave, so a wave cannot use more than max_steps.
+        With fewer steps left than branches, the last branches get 0 steps and are skipped by _wave_branches.
 
-                    # If no next agent or invalid ID, break the loop
-                    if next_agent_id == -1 or next_agent_id >= len(self.agents):
-                        break
+        :return: The max_steps of every branch, in the order of the wave
+        """
+        remaining = max(self.max_steps - self.context.current_steps, 0)
+        share, extra = divmod(remaining, branch_count)
+        return [share + 1 if index < extra else share for index in range(branch_count)]
 
-                    # Get the next agent
-                    next_agent = self.agents[next_agent_id]
+    def _new_branch(self, planned: "PlannedSubtask", output_mode: str, max_steps: int):
+        """
+        Create the agent running a planned subtask: a copy of the agent on a copy of the team context, whose
+        agent outputs are those joined before the wave started.
 
-                    # Pass output mode to next agent
-                    next_agent.output_mode = output_mode
+        The branch counts its steps, outputs and team level model calls on its own, _join_branches adds them to the
+        run. The tool cache, the blob store, the cancellation token and the hooks are shared with the other branches,
+        they are safe to use from several threads.
 
-                    # Create the execution result for the next agent
-                    next_agent_result = AgentExecutionResult(
-                        agent_id=str(next_agent_id),
-                        agent_name=next_agent.name,
-                        subtask=next_agent.subtask
-                    )
+        :param max_steps: The steps the branch may use, see _branch_budgets
+        :return: An (agent, agent_result) tuple
+        """
+        context = copy.copy(self.context)
+        context.agent_outputs = list(self.context.agent_outputs)
+        context.model_calls = []
+        context.current_steps = 0
+        context.max_steps = max_steps
+        context.checkpoint = None  # Runs in parallel mode are only checkpointed at their start and end
+        agent = self.agents[planned.agent_id].copy(context)
+        agent.subtask = planned.subtask
+        agent.output_mode = output_mode
+        agent_result = AgentExecutionResult(agent_id=str(planned.agent_id), agent_name=agent.name,
+                                            subtask=planned.subtask)
+        return agent, agent_result
+
+    def _run_branch(self, planned: "PlannedSubtask", output_mode: str, max_steps: int):
+        """Run a planned subtask, returning an (agent, agent_result, step_result) tuple"""
+        agent, agent_result = self._new_branch(planned, output_mode, max_steps)
+        step_result = agent.step()
+        agent_result.complete()
+        return agent, agent_result, step_result
+
+    async def _arun_branch(self, planned: "PlannedSubtask", output_mode: str, max_steps: int):
+        """Coroutine version of _run_branch"""
+        agent, agent_result = self._new_branch(planned, output_mode, max_steps)
+        try:
+            step_result = await self._until_cancelled(agent.astep())
+        except TaskCancelledError as e:
+            step_result = AgentResult.cancelled(e.reason)
+        agent_result.complete()
+        return agent, agent_result, step_result
 
-                    # Execute the next agent
-                    step_result = next_agent.step()
-                    next_final_answer = step_result.final_answer
-                    step_count = step_result.step_count
+    def _join_branches(self, result: TeamResult, branches: list) -> int:
+        """
+        Add the results of a wave to the team result and its outputs to the team context, in the order of the plan.
 
-                    # Update total steps used
-                    total_steps_used += step_count
+        :return: The number of steps the agents of the wave used
+        """
+        outputs_mark = len(self.context.agent_outputs)
+        steps_used = 0
+        for agent, agent_result, step_result in branches:
+            steps_used += self._add_agent_result(result, agent_result, agent, step_result)
+            self.context.agent_outputs.extend(agent.team_context.agent_outputs[outputs_mark:])
+            self.context.model_calls.extend(agent.team_context.model_calls)
+            self.context.current_steps += agent.team_context.current_steps
+        return steps_used
+
+    def _continue_plan(self, branches: list, total_steps_used: int, output) -> bool:
+        """Whether the next wave of the plan runs"""
+        if self._is_cancelled() or any(step_result.is_cancelled for _, _, step_result in branches):
+            return False
+        if total_steps_used >= self.max_steps:
+            output(f"\nReached maximum total steps ({self.max_steps}). Stopping execution.")
+            return False
+        return True
+
+    @staticmethod
+    def _trace_plan(span, waves: Optional[list]):
+        if span is None or waves is None:
+            return
+        span.set_attributes({"agentmesh.plan.subtasks": sum(len(wave) for wave in waves),
+                             "agentmesh.plan.waves": len(waves)})
+
+    def _apply_next_agent(self, agent_id: int) -> bool:
+        """Checkpoint the selection of the next agent, returning whether the chain goes on"""
+        if self._is_cancelled():
+            # The selection was not made, a resumed run makes it again
+            return False
+        has_next = agent_id != -1 and agent_id < len(self.agents)
+        if self.context.checkpoint:
+            self.context.checkpoint.decision(agent_id if has_next else -1,
+                                             self.agents[agent_id].subtask if has_next else None, self.context)
+        if self.context.hooks:
+            self.context.hooks.on_route_decision(self, self.agents[agent_id] if has_next else None,
+                                                 self.agents[agent_id].subtask if has_next else None)
+        return has_next
+
+    def _take_handoff(self, agent: Agent, result: TeamResult, span) -> Optional[int]:
+        """
+        Take the next agent from the handoff proposal of the agent's final reply, counting the saved decision call.
 
-                    # Collect the execution results of the next agent
-                    next_agent_result.final_answer = next_final_answer if next_final_answer else ""
+        :return: The ID of the next agent, -1 to end the chain, or None if the decision call is needed
+        """
+        if not self.context.fold_handoff:
+            return None
+        agent_id = agent.take_handoff()
+        if agent_id is not None:
+            result.handoffs_folded += 1
+        if span is not None:
+            span.set_attribute("agentmesh.handoff.folded", agent_id is not None)
+        return agent_id
+
+    def _trace_selection(self, span, agent_id: int):
+        """Set the agent selected by the coordinator or the last agent on the routing span"""
+        if span is None:
+            return
+        has_next = agent_id is not None and 0 <= agent_id < len(self.agents)
+        span.set_attribute("agentmesh.next_agent", self.agents[agent_id].name if has_next else None)
+        span.set_attribute("agentmesh.chain_end", not has_next)
+
+    @staticmethod
+    def _trace_run_result(span, result: TeamResult):
+        """Set the outcome and token usage of the run on its team.run span"""
+        if span is None:
+            return
+        usage = result.usage
+        span.set_attributes({
+            "agentmesh.task.id": result.id,
+            "agentmesh.team.status": result.status,
+            "agentmesh.team.agents": len(result.agent_results),
+            "agentmesh.team.handoffs_folded": result.handoffs_folded,
+            "gen_ai.usage.input_tokens": usage.prompt_tokens,
+            "gen_ai.usage.output_tokens": usage.completion_tokens
+        })
+        if result.status == "failed":
+            span.set_status(STATUS_ERROR, result.status)
+        else:
+            span.set_status(STATUS_OK)
+
+    def _load_snapshot(self, task_id: str) -> RunSnapshot:
+        """Restore a run from the checkpoint store"""
+        if self.checkpoint_store is None:
+            raise ValueError(f"Team {self.name} has no checkpoint store, enable `checkpoint` in the config")
+        records = self.checkpoint_store.load(task_id)
+        if not records:
+            raise ValueError(f"No checkpoint found for task {task_id}")
+        snapshot = RunSnapshot.from_records(records)
+        if snapshot.status == "completed":
+            # Nothing is left to run, the restored result is returned
+            snapshot.phase = PHASE_FINISH
+        return snapshot
+
+    @staticmethod
+    def _create_cancel_token(deadline: Optional[float], timeout: Optional[float],
+                             cancel_token: Optional[CancellationToken]) -> Optional[CancellationToken]:
+        """
+        Create the token of a run, cancelled at its deadline or together with the caller's token.
 
-                    # Collect the execution history of the next agent
-                    if hasattr(next_agent, 'captured_actions') and next_agent.captured_actions:
-                        for action in next_agent.captured_actions:
-                            next_agent_result.add_action(action)
+        :return: A CancellationToken owned by the run, or None if the run cannot be cancelled
+        """
+        if timeout is not None:
+            timeout_deadline = time.time() + timeout
+            deadline = timeout_deadline if deadline is None else min(deadline, timeout_deadline)
+        if cancel_token is not None:
+            # A child token, so closing it at the end of the run leaves the caller's token untouched
+            return cancel_token.child(deadline)
+        return CancellationToken(deadline=deadline) if deadline is not None else None
+
+    def _is_cancelled(self) -> bool:
+        return self.context.cancel_token is not None and self.context.cancel_token.is_cancelled
+
+    async def _until_cancelled(self, coro):
+        """Await a coroutine of the run, cancelling it as soon as the run is cancelled"""
+        cancel_token = self.context.cancel_token
+        if cancel_token is None:
+            return await coro
+        loop = asyncio.get_running_loop()
+        future = asyncio.ensure_future(coro)
+        unregister = cancel_token.on_cancel(lambda: loop.call_soon_threadsafe(future.cancel))
+        try:
+            return await future
+        except asyncio.CancelledError:
+            # Only the cancellation of the run is turned into an error, cancelling the caller propagates
+            if cancel_token.is_cancelled:
+                raise TaskCancelledError(cancel_token.reason)
+            raise
+        finally:
+            unregister()
+
+    def _begin_run(self, task: Union[str, Task], output_mode: str, cancel_token: CancellationToken = None,
+                   snapshot: RunSnapshot = None):
+        """
+        Prepare the context for a new run.
 
-                    # Mark the next agent execution as complete
-                    next_agent_result.complete()
+        :param cancel_token: The token of the run, None if the run cannot be cancelled
+        :param snapshot: The checkpointed state of a resumed run
+        :return: A (task, result, output) tuple, output prints or logs according to the output mode
+        """
+        # Set output mode in context for agents to use
+        self.context.output_mode = output_mode
 
-                    # Add the next agent result to the team result
-                    result.add_agent_result(next_agent_result)
+        # Create a function for output based on the mode
+        def output(message, end="\n"):
+            if output_mode == "print":
+                print(message, end=end)
+            elif message:
+                logger.info(message.strip())
 
-                    # Update current agent for the next iteration
-                    current_agent = next_agent
+        # Convert string task to Task object if needed
+        if isinstance(task, str):
+            task = Task(content=task)
 
-                # Update task status and complete the result
-                task.update_status(TaskStatus.COMPLETED)
+        # Update task status
+        task.update_status(TaskStatus.PROCESSING)
 
-                # Set the final output to the last agent's final answer
-                if result.agent_results and result.agent_results[-1].final_answer:
-                    result.final_output = result.agent_results[-1].final_answer
+        # Create a TeamResult to track the execution
+        result = TeamResult(team_name=self.name, task=task)
 
-                result.complete("completed")
+        # Store task in context
+        self.context.user_task = task.get_text()
+        self.context.task = task
+        self.context.model = self.model  # Set the model in the context
+        self.context.model_calls = []
+        self.context.tool_cache = create_task_tool_cache()
+        self.context.cancel_token = cancel_token
+        self.context.blob_store = create_task_blob_store(self.name, task.id)
+        self.context.checkpoint = RunCheckpoint(self.checkpoint_store, task.id) if self.checkpoint_store else None
+        if snapshot is not None:
+            snapshot.restore(self, result)
+            if self.context.checkpoint:
+                self.context.checkpoint.resumed(snapshot)
+        elif self.context.checkpoint:
+            self.context.checkpoint.start(task, self.name)
+        if self.context.hooks:
+            self.context.hooks.on_team_start(self, task)
 
-                # Print task completion information
-                output(f"\nTeam {self.name} completed the task")
+        # Print user task and team information
+        output("")
+        if snapshot is not None:
+            output(f"Team {self.name} resumed the task from its checkpoint")
+        else:
+            output(f"Team {self.name} received the task and started processing")
+        output("")
+        return task, result, output
+
+    def _build_agents_str(self) -> str:
+        """Generate agents_str from the list of agents"""
+        return ', '.join(
+            f'{{"id": {i}, "name": "{agent.name}", "description": "{agent.description}", "system_prompt": "{agent.system_prompt}"}}'
+            for i, agent in enumerate(self.agents)
+        )
+
+    def _build_coordinator_request(self, task: Task) -> LLMRequest:
+        """Build the request selecting the first agent and its subtask"""
+        prompt = GROUP_DECISION_PROMPT.format(group_name=self.name, group_description=self.description,
+                                              group_rules=self.rule, agents_str=self._build_agents_str(),
+                                              user_task=task.get_text())
+
+        return LLMRequest(
+            messages=[{
+                "role": "user",
+                "content": prompt
+            }],
+            temperature=0,
+            json_format=True,
+            max_tokens=DECISION_MAX_TOKENS,
+            cancel_token=self.context.cancel_token
+        )
+
+    def _apply_coordinator_response(self, response, result: TeamResult):
+        """
+        Parse the coordinator's decision.
 
-                # Clean up resources before returning
-                self.cleanup()
+        :return: A (agent_id, agent, subtask) tuple, or None if the run failed
+        """
+        reply_text = self._read_coordinator_reply(response, result)
+        if reply_text is None:
+            return None
 
-                return result
-            else:
-                output("No agent found with the selected id.")
-                self.cleanup()
-                result.complete("failed")
-                return result
+        # Parse the response to get the selected agent's id
+        try:
+            decision_res = string_util.json_loads(reply_text)
+            selected_agent_id = decision_res.get("id")  # Extract the id from the response
+            subtask = decision_res.get("subtask")
+            task_short_name = decision_res.get("task_short_name")
+            self.context.task_short_name = task_short_name
+
+            # Find the selected agent based on the id
+            selected_agent: Agent = self.agents[selected_agent_id]
+            selected_agent.subtask = subtask
+        except (json.JSONDecodeError, IndexError, KeyError, ValueError) as e:
+            error_message = f"Failed to parse model response: {str(e)}\nResponse: {reply_text[:100]}..."
+            logger.error(f"Error: {error_message}")
+            self._complete_result(result, "failed")
+            return None
+        if self.context.checkpoint:
+            self.context.checkpoint.route(selected_agent_id, subtask, task_short_name, self.context)
+        if self.context.hooks:
+            self.context.hooks.on_route_decision(self, selected_agent, subtask)
+        return selected_agent_id, selected_agent, subtask
+
+    def _read_coordinator_reply(self, response, result: TeamResult) -> Optional[str]:
+        """
+        Record a coordinator call and get its reply.
 
-        except Exception as e:
-            # Handle any exceptions
-            import traceback
-            error_msg = f"Error during team execution: {str(e)}"
-            detail_msg = traceback.format_exc()
+        :return: The reply text, or None if the call failed and the result is complete
+        """
+        # Check if the API call was successful
+        if response.is_error:
+            error_message = response.get_error_msg()
+            # Use logger to record errors regardless of output mode
+            logger.error(f"Error: {error_message}")
+            # No need to duplicate error messages in console, as logger already handles it
+            self._complete_result(result, "failed")
+            return None
+
+        self.context.model_calls.append(ModelCall(
+            purpose=ModelCallPurpose.ROUTING,
+            model=self.model.model,
+            usage=TokenUsage.from_dict(response.usage),
+            source=self.name,
+            cached=response.cached
+        ))
+
+        return response.data["choices"][0]["message"]["content"]
+
+    def _build_plan_request(self, task: Task) -> LLMRequest:
+        """Build the request planning the subtasks of the parallel plan mode"""
+        prompt = GROUP_PLAN_PROMPT.format(group_name=self.name, group_description=self.description,
+                                          group_rules=self.rule, agents_str=self._build_agents_str(),
+                                          user_task=task.get_text())
+        return LLMRequest(
+            messages=[{
+                "role": "user",
+                "content": prompt
+            }],
+            temperature=0,
+            json_format=True,
+            max_tokens=PLAN_MAX_TOKENS,
+            cancel_token=self.context.cancel_token
+        )
+
+    def _apply_plan_response(self, response, result: TeamResult) -> Optional[list]:
+        """
+        Parse the coordinator's plan.
 
-            logger.error(error_msg)
-            logger.debug(f"Error details: {detail_msg}")
+        :return: The planned subtasks grouped into waves, or None if the run failed
+        """
+        reply_text = self._read_coordinator_reply(response, result)
+        if reply_text is None:
+            return None
 
-            # Clean up resources even when exception occurs
-            self.cleanup()
+        try:
+            plan_res = string_util.json_loads(reply_text)
+            self.context.task_short_name = plan_res.get("task_short_name")
+            plan = []
+            for item in plan_res["subtasks"]:
+                agent_id = int(item["agent_id"])
+                if not 0 <= agent_id < len(self.agents):
+                    raise IndexError(f"no agent with id {agent_id}")
+                plan.append(PlannedSubtask(str(item.get("id", len(plan))), agent_id, item.get("subtask", ""),
+                                           [str(dependency) for dependency in item.get("depends_on") or []]))
+            if not plan:
+                raise ValueError("the plan has no subtasks")
+            waves = PlannedSubtask.group_waves(plan)
+        except (json.JSONDecodeError, IndexError, KeyError, ValueError, TypeError) as e:
+            error_message = f"Failed to parse model response: {str(e)}\nResponse: {reply_text[:100]}..."
+            logger.error(f"Error: {error_message}")
+            self._complete_result(result, "failed")
+            return None
+        if self.context.hooks:
+            for planned in plan:
+                self.context.hooks.on_route_decision(self, self.agents[planned.agent_id], planned.subtask)
+        return waves
+
+    def _add_agent_result(self, result: TeamResult, agent_result: AgentExecutionResult, agent: Agent,
+                          step_result) -> int:
+        """
+        Collect the execution of an agent into the team result.
 
-            result.complete("failed")
-            return result
+        :return: The number of steps the agent used
+        """
+        # Collect the execution results of the agent
+        agent_result.final_answer = step_result.final_answer if step_result.final_answer else ""
+
+        # Collect the execution history of the agent
+        if hasattr(agent, 'captured_actions') and agent.captured_actions:
+            for action in agent.captured_actions:
+                agent_result.add_action(action)
+        agent_result.model_calls.extend(agent.model_calls)
+
+        # Mark the agent execution as complete, agents of a parallel wave are marked when they finish
+        if not agent_result.end_time:
+            agent_result.complete()
+
+        # Add the agent result to the team result
+        result.add_agent_result(agent_result)
+        if self.context.hooks:
+            self.context.hooks.on_agent_end(agent, agent_result)
+        return step_result.step_count
+
+    def _finish_run(self, result: TeamResult, task: Task, output):
+        # Update task status and complete the result
+        task.update_status(TaskStatus.COMPLETED)
+
+        # Set the final output to the last agent's final answer
+        if result.agent_results and result.agent_results[-1].final_answer:
+            result.final_output = result.agent_results[-1].final_answer
+
+        self._complete_result(result, "completed")
+
+        # Print task completion information
+        if result.status == "completed":
+            output(f"\nTeam {self.name} completed the task")
+        else:
+            output(f"\nTeam {self.name} stopped the task: {result.status}")
+
+    def _fail_run(self, result: TeamResult, e: Exception):
+        # Handle any exceptions
+        import traceback
+        error_msg = f"Error during team execution: {str(e)}"
+        detail_msg = traceback.format_exc()
+
+        logger.error(error_msg)
+        logger.debug(f"Error details: {detail_msg}")
+
+        self._complete_result(result, "failed")
+
+    def _complete_result(self, result: TeamResult, status: str):
+        """Attach the team level model calls of the run and mark the result as complete"""
+        cancel_token = self.context.cancel_token
+        if cancel_token is not None:
+            if cancel_token.is_cancelled:
+                # The run was stopped, by its deadline or by the caller, the result holds the answers so far
+                status = cancel_token.reason
+            cancel_token.close()
+        result.model_calls = list(self.context.model_calls)
+        result.complete(status)
+        if self.context.checkpoint:
+            self.context.checkpoint.end(status, result.final_output, self.context)
+        if self.context.hooks:
+            self.context.hooks.on_team_end(self, result)
 
     def cleanup(self):
         """
@@ -288,6 +969,54 @@ class AgentTeam:
                         logger.warning(f"Error closing tool {tool.name}: {str(e)}")
 
 
+class PlannedSubtask:
+    """A subtask of the coordinator's plan in the parallel plan mode"""
+
+    def __init__(self, subtask_id: str, agent_id: int, subtask: str, depends_on: list = None):
+        """
+        Initialize the PlannedSubtask.
+
+        :param subtask_id: Id of the subtask within the plan.
+        :param agent_id: Index of the agent handling the subtask.
+        :param subtask: The subtask given to the agent.
+        :param depends_on: Ids of the subtasks whose outputs the subtask needs.
+        """
+        self.subtask_id = subtask_id
+        self.agent_id = agent_id
+        self.subtask = subtask
+        self.depends_on = depends_on or []
+
+    @staticmethod
+    def group_waves(plan: list) -> list:
+        """
+        Group a plan into waves, the subtasks of a wave only depend on subtasks of earlier waves.
+        Dependencies on ids that are not in the plan are ignored.
+
+        :param plan: The PlannedSubtasks in the order of the plan.
+        :return: A list of waves, each a list of PlannedSubtasks in the order of the plan.
+        :raises ValueError: If the dependencies form a cycle.
+        """
+        planned_ids = {planned.subtask_id for planned in plan}
+        done = set()
+        remaining = list(plan)
+        waves = []
+        while remaining:
+            wave = [planned for planned in remaining
+                    if all(dependency in done or dependency not in planned_ids for dependency in planned.depends_on)]
+            if not wave:
+                raise ValueError("the dependencies of the plan form a cycle")
+            waves.append(wave)
+            done.update(planned.subtask_id for planned in wave)
+            remaining = [planned for planned in remaining if planned not in wave]
+        return waves
+
+
+# How the work of a run is split between the agents, see AgentTeam
+PLAN_MODES = ("chain", "parallel")
+
+# Max reply tokens of the coordinator's plan, which lists every subtask
+PLAN_MAX_TOKENS = 4096
+
 GROUP_DECISION_PROMPT = """## Role
 You are the coordinator for a team of AI agents. Your job is to analyze the user's task and decide which agent in the team should handle it first, and give the subtask that need to be answered by this member.
 
@@ -310,3 +1039,31 @@ Return your response in JSON format with the following fields:
 
 Please return the result in the following JSON structure which can be parsed directly by json.loads(), no extra content:
 {{"id": <member_id>, "subtask": "", "task_short_name": ""}}"""
+
+GROUP_PLAN_PROMPT = """## Role
+You are the coordinator for a team of AI agents. Your job is to analyze the user's task and split it into subtasks for the members of the team. Subtasks that do not depend on each other are handled at the same time, a subtask that needs the results of other subtasks lists them in depends_on and starts once they are finished.
+
+## Team Information
+Team name: {group_name}
+Team description: {group_description}
+Team rules: {group_rules}
+
+## Available Agents
+{agents_str}
+
+## User Task
+{user_task}
+
+## Output Format
+Return your response in JSON format with the following fields:
+- subtasks: the list of subtasks, each with the fields:
+  - id: a short unique id of the subtask, e.g. "s1"
+  - agent_id: the ID of the member handling the subtask
+  - subtask: the subtask that need to be answered by this member (use the same language as the user's task and preserve all key information from the original task)
+  - depends_on: the ids of the subtasks whose results this subtask needs, [] if it can start right away
+- task_short_name: A descriptive name for the user's original task (lowercase with underscores, max 5 English words)
+
+Only add dependencies that are really needed, so independent work runs at the same time. If the results of several subtasks must be combined, end the plan with a subtask that depends on all of them, its answer is the final answer of the team.
+
+Please return the result in the following JSON structure which can be parsed directly by json.loads(), no extra content:
+{{"subtasks": [{{"id": "s1", "agent_id": <member_id>, "subtask": "", "depends_on": []}}], "task_short_name": ""}}"""
@@ -8,6 +8,7 @@ from agentmesh.tools.calculator.calculator import Calculator
 from agentmesh.tools.current_time.current_time import CurrentTime
 from agentmesh.tools.file_save.file_save import FileSave
 from agentmesh.tools.terminal.terminal import Terminal
+from agentmesh.tools.read_blob.read_blob import ReadBlob
 
 
 # Delayed import for BrowserTool
@@ -40,7 +41,8 @@ __all__ = [
     'CurrentTime',
     'FileSave',
     'BrowserTool',
-    'Terminal'
+    'Terminal',
+    'ReadBlob'
 ]
 
 """
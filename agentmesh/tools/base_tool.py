@@ -1,9 +1,22 @@
+import asyncio
+import hashlib
+import json
 from enum import Enum
-from typing import Any
+from typing import Any, Optional
 from pydantic import BaseModel, Field
 from agentmesh.models.llm.base_model import LLMModel
 from agentmesh.common import logger
+from agentmesh.common.utils.tracing import trace_span, bind_context, SPAN_TOOL_EXECUTE, STATUS_OK, STATUS_ERROR
+import contextvars
 import copy
+import threading
+
+# Semaphores enforcing the max_concurrency of each tool, shared by all instances in the process
+_concurrency_semaphores = {}
+_concurrency_lock = threading.Lock()
+
+# Cancellation token of the run the current tool call belongs to, see BaseTool.get_cancel_token
+_current_cancel_token = contextvars.ContextVar("cancel_token", default=None)
 
 
 class ToolStage(Enum):
@@ -16,6 +29,7 @@ class ToolResult(BaseModel):
     status: str = Field(default=None)
     result: Any = Field(default=None)
     ext_data: Any = Field(default=None)
+    cached: bool = Field(default=False)  # Whether the result was served from the tool result cache
 
     @staticmethod
     def success(result, ext_data: Any = None):
@@ -25,6 +39,10 @@ class ToolResult(BaseModel):
     def fail(result, ext_data: Any = None):
         return ToolResult(status="error", result=result, ext_data=ext_data)
 
+    def as_cached(self):
+        """Copy of the result marked as served from the tool result cache"""
+        return ToolResult(status=self.status, result=self.result, ext_data=self.ext_data, cached=True)
+
 
 class BaseTool:
     """Base class for all tools."""
@@ -37,6 +55,29 @@ class BaseTool:
     description: str = "Base tool"
     params: dict = {}  # Store JSON Schema
     model: LLMModel = None
+    # Max number of concurrent executions of this tool in the process, None means no limit.
+    # Can be overridden with `max_concurrency` in the tool config
+    max_concurrency: int = None
+    # Cacheability declaration. Results of idempotent tools are served from the tool result cache when the
+    # same call is repeated, for at most cache_ttl seconds (None means for the whole cache scope)
+    idempotent: bool = False
+    cache_ttl: float = None
+    cache_key_fields: list = None  # Params that identify a call, None means all params
+    # Whether cached results read state that other tools may change, e.g. files read by a command
+    cache_depends_on_state: bool = False
+    # Whether large results are moved to the blob store of the task, leaving a preview and a handle in the prompt
+    spill_result: bool = True
+
+    def copy(self):
+        """
+        Copy of the tool for one run of a team, see Agent.copy. Attributes are shared with the original,
+        tools that keep per-run state in mutable attributes must override this method.
+
+        :return: A new instance of the tool, not bound to any agent.
+        """
+        new_tool = copy.copy(self)
+        new_tool.context = None
+        return new_tool
 
     @classmethod
     def get_json_schema(cls) -> dict:
@@ -47,11 +88,171 @@ class BaseTool:
             "parameters": cls.params
         }
 
-    def execute_tool(self, params: dict) -> ToolResult:
+    def execute_tool(self, params: dict, cancel_token=None, hooks=None) -> ToolResult:
+        """
+        Entry point of the tool, enforcing its max_concurrency.
+
+        :param params: The call params
+        :param cancel_token: Optional CancellationToken of the run, the call is skipped once it is cancelled
+                             and execute can check it with get_cancel_token
+        :param hooks: Optional HookDispatcher of the run, notified before and after the call
+        :return: The result of the tool
+        """
+        if hooks:
+            hooks.on_tool_start(self, params)
+        with trace_span(SPAN_TOOL_EXECUTE, {"gen_ai.tool.name": self.name}) as span:
+            result = self._execute_tool(params, cancel_token)
+            if span is not None:
+                self._trace_result(span, result)
+        if hooks:
+            hooks.on_tool_end(self, params, result)
+        return result
+
+    def _execute_tool(self, params: dict, cancel_token=None) -> ToolResult:
+        semaphore = self._get_concurrency_semaphore()
+        token_reset = _current_cancel_token.set(cancel_token)
+        try:
+            if semaphore is None:
+                return self._cancelled_result(cancel_token) or self.execute(params)
+            with semaphore:
+                return self._cancelled_result(cancel_token) or self.execute(params)
+        except Exception as e:
+            logger.error(e)
+            return ToolResult.fail(f"Error executing tool {self.name}: {e}")
+        finally:
+            _current_cancel_token.reset(token_reset)
+
+    async def aexecute_tool(self, params: dict, cancel_token=None, hooks=None) -> ToolResult:
+        """
+        Awaitable entry point of the tool. Tools with a native async implementation override aexecute,
+        the blocking execute of all other tools runs in the default executor.
+
+        :param params: The call params
+        :param cancel_token: Optional CancellationToken of the run, see execute_tool
+        :param hooks: Optional HookDispatcher of the run, see execute_tool
+        :return: The result of the tool
+        """
+        if hooks:
+            hooks.on_tool_start(self, params)
+        with trace_span(SPAN_TOOL_EXECUTE, {"gen_ai.tool.name": self.name}) as span:
+            result = await self._aexecute_tool(params, cancel_token)
+            if span is not None:
+                self._trace_result(span, result)
+        if hooks:
+            hooks.on_tool_end(self, params, result)
+        return result
+
+    @staticmethod
+    def _trace_result(span, result: ToolResult):
+        span.set_attribute("agentmesh.tool.status", result.status)
+        if result.status == "error":
+            span.set_status(STATUS_ERROR, str(result.result))
+        else:
+            span.set_status(STATUS_OK)
+
+    async def _aexecute_tool(self, params: dict, cancel_token=None) -> ToolResult:
+        loop = asyncio.get_running_loop()
+        if type(self).aexecute is BaseTool.aexecute:
+            # Bound to the current context, so model calls made by the tool are nested in its span
+            return await loop.run_in_executor(None, bind_context(self._execute_tool, params, cancel_token))
+
+        semaphore = self._get_concurrency_semaphore()
+        token_reset = _current_cancel_token.set(cancel_token)
         try:
-            return self.execute(params)
+            if semaphore is None:
+                return self._cancelled_result(cancel_token) or await self.aexecute(params)
+            # The semaphore is shared with threads, wait for it without blocking the event loop
+            await loop.run_in_executor(None, semaphore.acquire)
+            try:
+                return self._cancelled_result(cancel_token) or await self.aexecute(params)
+            finally:
+                semaphore.release()
         except Exception as e:
             logger.error(e)
+            return ToolResult.fail(f"Error executing tool {self.name}: {e}")
+        finally:
+            _current_cancel_token.reset(token_reset)
+
+    async def aexecute(self, params: dict) -> ToolResult:
+        """Native async logic, only implemented by tools that do not block"""
+        raise NotImplementedError
+
+    @staticmethod
+    def get_cancel_token():
+        """
+        Get the cancellation token of the running call, None if the call cannot be cancelled. Long running
+        tools check it or bound their waits with its remaining time.
+        """
+        return _current_cancel_token.get()
+
+    def _cancelled_result(self, cancel_token) -> Optional[ToolResult]:
+        """The result of a call skipped because the run was cancelled, None if the call may run"""
+        if cancel_token is not None and cancel_token.is_cancelled:
+            return ToolResult.fail(f"Tool {self.name} was not executed: task {cancel_token.reason}")
+        return None
+
+    def _get_concurrency_semaphore(self):
+        """Get the semaphore limiting concurrent executions of this tool, None if unlimited"""
+        tool_config = getattr(self, "config", None) or {}
+        limit = tool_config.get("max_concurrency", self.max_concurrency) if isinstance(tool_config, dict) \
+            else self.max_concurrency
+        if not limit:
+            return None
+        key = (self.name, limit)
+        with _concurrency_lock:
+            semaphore = _concurrency_semaphores.get(key)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(limit)
+                _concurrency_semaphores[key] = semaphore
+        return semaphore
+
+    def is_cacheable(self, params: dict) -> bool:
+        """
+        Check whether the result of a call can be cached. Tools that are only idempotent for some
+        params (e.g. read-only commands) override this method.
+
+        :param params: The call params
+        :return: True if repeating the call with the same params returns the same result
+        """
+        tool_config = getattr(self, "config", None)
+        if isinstance(tool_config, dict) and "idempotent" in tool_config:
+            return bool(tool_config["idempotent"])
+        return self.idempotent
+
+    def get_cache_ttl(self) -> Optional[float]:
+        """Get the seconds a cached result stays valid, can be overridden with `cache_ttl` in the tool config"""
+        tool_config = getattr(self, "config", None)
+        if isinstance(tool_config, dict) and "cache_ttl" in tool_config:
+            return tool_config["cache_ttl"]
+        return self.cache_ttl
+
+    def get_cache_key(self, params: dict) -> Optional[str]:
+        """
+        Get the key of a call in the tool result cache.
+
+        :param params: The call params
+        :return: The cache key, or None if the call must not be cached
+        """
+        if not isinstance(params, dict) or not self.is_cacheable(params):
+            return None
+        key_params = params if self.cache_key_fields is None else \
+            {field: params.get(field) for field in self.cache_key_fields}
+        key_data = json.dumps(key_params, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(f"{self.name}:{key_data}".encode("utf-8")).hexdigest()
+
+    def record_model_usage(self, response, model: LLMModel = None):
+        """
+        Report the token usage of a model call made inside the tool to the calling agent.
+
+        :param response: The LLMResponse returned by the model
+        :param model: The model that served the call, defaults to the tool's model
+        """
+        context = getattr(self, "context", None)
+        if response.is_error or not hasattr(context, "record_model_call"):
+            return
+        model = model or self.model
+        context.record_model_call("tool", response.usage, model=model.model if model else None,
+                                  source=self.name, cached=response.cached)
 
     def execute(self, params: dict) -> ToolResult:
         """Specific logic to be implemented by subclasses"""
@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Optional
+
+from agentmesh.common import config
+
+
+class BlobStore:
+    """
+    Content-addressed store of large tool observations, kept as files in the workspace of a task.
+    Observations above the inline limit are replaced by a short preview and a handle in the prompt,
+    the agent reads the rest in slices with the read_blob tool.
+    """
+    HANDLE_PREFIX = "blob:"
+
+    def __init__(self, directory: str, max_inline_chars: int = 4000, preview_chars: int = 600):
+        """
+        Initialize the BlobStore.
+
+        :param directory: Directory of the blob files, created when the first blob is stored.
+        :param max_inline_chars: Observations longer than this are stored as blobs.
+        :param preview_chars: Characters of a stored observation kept in the prompt.
+        """
+        self.directory = Path(directory)
+        self.max_inline_chars = max_inline_chars
+        self.preview_chars = min(preview_chars, max_inline_chars)
+        self._lock = threading.Lock()
+
+    def _path(self, handle: str) -> Path:
+        digest = handle[len(self.HANDLE_PREFIX):] if handle.startswith(self.HANDLE_PREFIX) else handle
+        if not digest or not all(c in "0123456789abcdef" for c in digest):
+            raise KeyError(handle)
+        return self.directory / f"{digest}.txt"
+
+    def put(self, content: str) -> str:
+        """
+        Store a text, identical texts are stored once.
+
+        :param content: The text to store.
+        :return: The handle of the blob.
+        """
+        handle = self.HANDLE_PREFIX + hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]
+        path = self._path(handle)
+        with self._lock:
+            if not path.exists():
+                self.directory.mkdir(parents=True, exist_ok=True)
+                # Write to a temporary file first, so a blob is never read half written
+                tmp_path = path.with_suffix(".tmp")
+                tmp_path.write_text(content, encoding="utf-8")
+                os.replace(tmp_path, path)
+        return handle
+
+    def read(self, handle: str, offset: int = 0, length: Optional[int] = None) -> str:
+        """
+        Read a slice of a blob.
+
+        :param handle: The handle returned by put.
+        :param offset: Character offset of the slice.
+        :param length: Number of characters, None to read to the end.
+        :return: The text of the slice.
+        :raises KeyError: If there is no blob with the handle.
+        """
+        text = self._read_all(handle)
+        offset = max(offset, 0)
+        return text[offset:] if length is None else text[offset:offset + max(length, 0)]
+
+    def size(self, handle: str) -> int:
+        """Number of characters of a blob"""
+        return len(self._read_all(handle))
+
+    def _read_all(self, handle: str) -> str:
+        path = self._path(handle)
+        if not path.exists():
+            raise KeyError(handle)
+        return path.read_text(encoding="utf-8")
+
+    def spill(self, value: Any) -> Any:
+        """
+        Replace a large observation by a preview and the handle of a blob holding all of it.
+
+        :param value: A tool result or ext_data, strings are stored as is and other values as JSON.
+        :return: The value itself if it is small enough, otherwise the preview text.
+        """
+        if value is None:
+            return value
+        text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+        if len(text) <= self.max_inline_chars:
+            return value
+        handle = self.put(text)
+        return f"{text[:self.preview_chars]}\n... [{len(text)} characters in total, stored as {handle}. " \
+               f"Call read_blob with this handle and an offset to read more]"
+
+
+def get_blob_store_config() -> dict:
+    """Get the `blob_store` config section, large observations are kept inline unless it is enabled"""
+    return config().get("blob_store") or {}
+
+
+def create_task_blob_store(team_name: str, task_id: str) -> Optional[BlobStore]:
+    """
+    Create the blob store of a task, under `<workspace>/<team_name>/<task_id>/.blobs`.
+
+    :return: A BlobStore, or None if the blob store is not enabled.
+    """
+    blob_config = get_blob_store_config()
+    if not blob_config.get("enabled", False):
+        return None
+    directory = Path(blob_config.get("workspace", "workspace")) / team_name / task_id / ".blobs"
+    return BlobStore(str(directory), max_inline_chars=blob_config.get("max_inline_chars", 4000),
+                     preview_chars=blob_config.get("preview_chars", 600))
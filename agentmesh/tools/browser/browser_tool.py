@@ -1,8 +1,11 @@
 import asyncio
+import atexit
+import concurrent.futures
 from typing import Any, Dict
 import json
 import re
 import os
+import threading
 import platform
 from browser_use import Browser
 from browser_use import BrowserConfig
@@ -86,36 +89,49 @@ class BrowserTool(BaseTool):
         "required": ["operation"]
     }
 
-    # Class variable to ensure only one browser instance is created
+    # All instances share one browser process, and the operations of a run share its pages,
+    # so operations must not run concurrently
+    max_concurrency = 1
+
+    # Class variable to ensure only one browser process is created, it is closed by shutdown
     browser = None
-    browser_context: BrowserContext = None
-    dom_service: DomService = None
-    _initialized = False
 
-    # Adding an event loop variable
+    # All browser operations run on one event loop in a dedicated thread, so the tool can be used both from
+    # blocking code and from coroutines running on another event loop
     _event_loop = None
+    _loop_thread = None
+    _loop_lock = threading.Lock()
 
     def __init__(self):
         # Only import during initialization, not at module level
         self.browser_use = _import_browser_use()
-        # Do not initialize the browser in the constructor, but initialize it on the first execution
-        pass
+        # Every run has its own browser context with its own tabs and cookies, created on its first operation
+        self.browser_context: BrowserContext = None
+        self.dom_service: DomService = None
+
+    def copy(self):
+        """Copy of the tool for one run of a team, it opens its own browser context in the shared browser"""
+        new_tool = super().copy()
+        new_tool.browser_context = None
+        new_tool.dom_service = None
+        return new_tool
 
     async def _init_browser(self) -> BrowserContext:
-        """Ensure the browser is initialized"""
-        if not BrowserTool._initialized:
+        """Ensure the shared browser is started and this tool has its own context in it"""
+        if BrowserTool.browser is None:
             os.environ['BROWSER_USE_LOGGING_LEVEL'] = 'error'
             print("Initializing browser...")
             # Initialize the browser synchronously
             BrowserTool.browser = Browser(BrowserConfig(headless=_header_less(),
                                                         disable_security=True))
+            atexit.register(BrowserTool.shutdown)
+            print("Browser initialized successfully")
+        if self.browser_context is None:
             context_config = BrowserContextConfig()
             context_config.highlight_elements = True
-            BrowserTool.browser_context = await BrowserTool.browser.new_context(context_config)
-            BrowserTool._initialized = True
-            print("Browser initialized successfully")
-            BrowserTool.dom_service = DomService(await BrowserTool.browser_context.get_current_page())
-        return BrowserTool.browser_context
+            self.browser_context = await BrowserTool.browser.new_context(context_config)
+            self.dom_service = DomService(await self.browser_context.get_current_page())
+        return self.browser_context
 
     def execute(self, params: Dict[str, Any]) -> ToolResult:
         """
@@ -130,16 +146,60 @@ class BrowserTool(BaseTool):
         action = params.get("operation", "").lower()
 
         try:
-            # Use a single event loop
-            if BrowserTool._event_loop is None:
-                BrowserTool._event_loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(BrowserTool._event_loop)
-            # Run tasks in the existing event loop
-            return BrowserTool._event_loop.run_until_complete(self._execute_async(action, params))
+            # Run the operation on the browser loop and wait for it
+            return self._schedule(action, params).result()
+        except concurrent.futures.CancelledError:
+            return self._stopped_result()
         except Exception as e:
             print(f"Error executing browser action: {e}")
             return ToolResult.fail(result=f"Error executing browser action: {str(e)}")
 
+    async def aexecute(self, params: Dict[str, Any]) -> ToolResult:
+        """
+        Execute browser operations from a coroutine without blocking the caller's event loop.
+
+        :param params: Dictionary containing the action and related parameters
+        :return: Result of the browser operation
+        """
+        action = params.get("operation", "").lower()
+        future = None
+        try:
+            future = self._schedule(action, params)
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # Only a cancelled run is turned into a result, cancelling the caller's task propagates
+            if future is None or not future.cancelled() or not self.get_cancel_token():
+                raise
+            return self._stopped_result()
+        except Exception as e:
+            print(f"Error executing browser action: {e}")
+            return ToolResult.fail(result=f"Error executing browser action: {str(e)}")
+
+    def _schedule(self, action: str, params: Dict[str, Any]) -> concurrent.futures.Future:
+        """Run the operation on the browser loop, it is cancelled as soon as the run is cancelled"""
+        future = asyncio.run_coroutine_threadsafe(self._execute_async(action, params), self._get_event_loop())
+        cancel_token = self.get_cancel_token()
+        if cancel_token is not None:
+            unregister = cancel_token.on_cancel(future.cancel)
+            future.add_done_callback(lambda _: unregister())
+        return future
+
+    def _stopped_result(self) -> ToolResult:
+        cancel_token = self.get_cancel_token()
+        reason = cancel_token.reason if cancel_token else "cancelled"
+        return ToolResult.fail(result=f"Browser action was stopped: task {reason}")
+
+    @classmethod
+    def _get_event_loop(cls) -> asyncio.AbstractEventLoop:
+        """Get the browser event loop, starting its thread on first use"""
+        with cls._loop_lock:
+            if cls._event_loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="browser-tool-loop", daemon=True)
+                thread.start()
+                cls._event_loop, cls._loop_thread = loop, thread
+            return cls._event_loop
+
     async def _get_page_state(self, context: BrowserContext):
         state = await self._get_state(context)
         include_attributes = ["img", "div", "button", "input"]
@@ -173,7 +233,7 @@ The following is the information of the current browser page. Each serial number
 
     async def _execute_async(self, action: str, params: Dict[str, Any]) -> ToolResult:
         """Asynchronously execute browser operations"""
-        # Use the browser context from the class variable
+        # Use the browser context of this run
         context = await self._init_browser()
 
         if action == Navigate.code:
@@ -218,6 +278,7 @@ The following is the information of the current browser page. Each serial number
                 )
                 model = self.model or ModelFactory().get_model(model_name="gpt-4o")
                 response = model.call(request)
+                self.record_model_usage(response, model)
                 if response.success:
                     extract_content = response.data["choices"][0]["message"]["content"]
                     print(f"Extract from page: {extract_content}")
@@ -278,40 +339,55 @@ The following is the information of the current browser page. Each serial number
 
     def close(self):
         """
-        Close browser resources.
-        This method handles the asynchronous closing of browser and browser context.
+        Close the browser context of this tool, called when its run is complete.
+        The shared browser keeps running for the other runs, see shutdown.
+        """
+        context = self.browser_context
+        loop = BrowserTool._event_loop
+        self.browser_context = None
+        self.dom_service = None
+        if context is None or loop is None:
+            return
+
+        async def close_context_async():
+            try:
+                await context.close()
+            except Exception as e:
+                logger.error(f"Error closing browser context: {e}")
+
+        try:
+            asyncio.run_coroutine_threadsafe(close_context_async(), loop).result()
+        except Exception as e:
+            print(f"Error during browser cleanup: {e}")
+
+    @classmethod
+    def shutdown(cls):
+        """
+        Close the shared browser and stop its event loop. Registered to run at exit, call it earlier
+        to release the browser once no run uses it anymore.
         """
-        if not BrowserTool._initialized:
+        if cls._event_loop is None:
             return
 
         try:
-            # Use the existing event loop to close browser resources
-            if BrowserTool._event_loop is not None:
-                # Define the async close function
-                async def close_browser_async():
-                    if BrowserTool.browser_context is not None:
-                        try:
-                            await BrowserTool.browser_context.close()
-                        except Exception as e:
-                            logger.error(f"Error closing browser context: {e}")
-
-                    if BrowserTool.browser is not None:
-                        try:
-                            await BrowserTool.browser.close()
-                        except Exception as e:
-                            logger.error(f"Error closing browser: {e}")
-
-                    # Reset the initialized flag
-                    BrowserTool._initialized = False
-                    BrowserTool.browser = None
-                    BrowserTool.browser_context = None
-                    BrowserTool.dom_service = None
-
-                # Run the async close function in the existing event loop
-                BrowserTool._event_loop.run_until_complete(close_browser_async())
-
-                # Close the event loop
-                BrowserTool._event_loop.close()
-                BrowserTool._event_loop = None
+            async def close_browser_async():
+                if cls.browser is not None:
+                    try:
+                        await cls.browser.close()
+                    except Exception as e:
+                        logger.error(f"Error closing browser: {e}")
+                cls.browser = None
+
+            # Run the async close function on the browser loop
+            loop = cls._event_loop
+            asyncio.run_coroutine_threadsafe(close_browser_async(), loop).result()
+
+            # Stop the loop thread and close the event loop
+            with cls._loop_lock:
+                loop.call_soon_threadsafe(loop.stop)
+                cls._loop_thread.join(timeout=5)
+                loop.close()
+                cls._event_loop = None
+                cls._loop_thread = None
         except Exception as e:
             print(f"Error during browser cleanup: {e}")
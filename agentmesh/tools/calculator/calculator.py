@@ -17,6 +17,8 @@ class Calculator(BaseTool):
         },
         "required": ["expression"]
     }
+    idempotent = True
+    cache_key_fields = ["expression"]
     config: dict = {}
 
     def execute(self, args: dict) -> ToolResult:
@@ -382,11 +382,13 @@ JSON response:"""
             request = LLMRequest(
                 messages=[{"role": "user", "content": prompt}],
                 temperature=0,
-                json_format=True
+                json_format=True,
+                max_tokens=200  # A short JSON object with the file name and type
             )
 
             try:
                 response = model_to_use.call(request)
+                self.record_model_usage(response, model_to_use)
 
                 if not response.is_error:
                     # Clean the JSON response
@@ -509,11 +511,13 @@ JSON response:"""
             request = LLMRequest(
                 messages=[{"role": "user", "content": prompt}],
                 temperature=0.1,
-                json_format=True
+                json_format=True,
+                max_tokens=200  # A short JSON object with the file name and type
             )
 
             # Call the model using the standard interface
             response = model.call(request)
+            self.record_model_usage(response, model)
 
             if response.is_error:
                 logger.warning(f"Error from model: {response.error_message}")
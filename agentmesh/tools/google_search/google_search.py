@@ -16,6 +16,10 @@ class GoogleSearch(BaseTool):
         },
         "required": ["query"]
     }
+    # Repeated queries within an hour return the same results
+    idempotent = True
+    cache_ttl = 3600
+    cache_key_fields = ["query"]
     config: dict = {}
 
     def __init__(self, config=None):
@@ -33,7 +37,10 @@ class GoogleSearch(BaseTool):
             "k": 10
         }
 
-        response = requests.post(url, headers=headers, json=data)
+        # Do not wait past the deadline of the run
+        cancel_token = self.get_cancel_token()
+        response = requests.post(url, headers=headers, json=data,
+                                 timeout=cancel_token.remaining() if cancel_token else None)
         result = response.json()
 
         if result.get("statusCode") and result.get("statusCode") == 503:
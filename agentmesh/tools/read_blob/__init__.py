@@ -0,0 +1,3 @@
+from .read_blob import ReadBlob
+
+__all__ = ['ReadBlob']
@@ -0,0 +1,66 @@
+from agentmesh.tools.base_tool import BaseTool, ToolResult
+
+
+class ReadBlob(BaseTool):
+    """Tool for reading large tool results that were moved to the blob store of the task."""
+
+    name: str = "read_blob"
+    description: str = "Read a slice of a large tool result that was stored as a blob. Use the handle " \
+                       "(e.g. 'blob:1a2b3c4d5e6f7a8b') shown in the observation, and an offset to continue reading."
+    params: dict = {
+        "type": "object",
+        "properties": {
+            "handle": {
+                "type": "string",
+                "description": "The handle of the blob, as shown in the observation."
+            },
+            "offset": {
+                "type": "integer",
+                "description": "Optional. The character offset to start reading from. Default is 0."
+            },
+            "length": {
+                "type": "integer",
+                "description": "Optional. The number of characters to read. Default is 2000."
+            }
+        },
+        "required": ["handle"]
+    }
+    # Blobs never change once stored
+    idempotent = True
+    # The slices are read on purpose, they must not be moved to the blob store again
+    spill_result = False
+    config: dict = {}
+
+    DEFAULT_LENGTH = 2000
+
+    def __init__(self):
+        self.context = None
+
+    def execute(self, params: dict) -> ToolResult:
+        team_context = getattr(self.context, "team_context", None)
+        blob_store = getattr(team_context, "blob_store", None)
+        if blob_store is None:
+            return ToolResult.fail("Error: The blob store is not enabled for this task.")
+
+        handle = str(params.get("handle", "")).strip()
+        try:
+            offset = max(int(params.get("offset") or 0), 0)
+            length = int(params.get("length") or self.DEFAULT_LENGTH)
+        except (TypeError, ValueError):
+            return ToolResult.fail("Error: offset and length must be integers.")
+        # Keep a slice small enough to stay inline in the prompt
+        length = min(max(length, 1), blob_store.max_inline_chars)
+
+        try:
+            total_chars = blob_store.size(handle)
+            content = blob_store.read(handle, offset, length)
+        except KeyError:
+            return ToolResult.fail(f"Error: No blob found for handle '{handle}'.")
+
+        return ToolResult.success({
+            "handle": handle,
+            "offset": offset,
+            "total_chars": total_chars,
+            "next_offset": offset + len(content) if offset + len(content) < total_chars else None,
+            "content": content
+        })
@@ -1,9 +1,16 @@
+import os
 import platform
+import signal
 import subprocess
+import time
 from typing import Dict, Any
 
+from agentmesh.common.utils.cancellation import TaskCancelledError
 from agentmesh.tools.base_tool import BaseTool, ToolResult
 
+# Seconds between checks of the cancellation token while a command runs
+CANCEL_POLL_INTERVAL = 0.2
+
 
 class Terminal(BaseTool):
     name: str = "terminal"
@@ -18,6 +25,10 @@ class Terminal(BaseTool):
         },
         "required": ["command"]
     }
+    # Only read-only commands are cached, their results are dropped when another tool may change the files
+    cache_ttl = 60
+    cache_key_fields = ["command"]
+    cache_depends_on_state = True
     config: dict = {}
 
     def __init__(self, config=None):
@@ -25,6 +36,16 @@ class Terminal(BaseTool):
         # Set of dangerous commands that should be blocked
         self.command_ban_set = {"halt", "poweroff", "shutdown", "reboot", "rm", "kill",
                                 "exit", "sudo", "su", "userdel", "groupdel", "logout", "alias"}
+        # Commands that only read the system, every command of a pipeline must be one of them
+        self.read_only_command_set = {"ls", "cat", "head", "tail", "grep", "find", "wc", "pwd", "echo", "which",
+                                      "file", "stat", "du", "df", "tree", "uname", "whoami", "sort", "uniq",
+                                      "diff", "cut"}
+        # Options that make a read-only command write files or run other commands
+        self.write_option_map = {
+            "find": ("-delete", "-exec", "-ok", "-fprint", "-fls"),  # Also matches -execdir, -okdir, -fprintf
+            "sort": ("-o", "--output"),
+            "tree": ("-o",)
+        }
 
     def execute(self, args: Dict[str, Any]) -> ToolResult:
         """
@@ -39,36 +60,116 @@ class Terminal(BaseTool):
         if not self._is_safe_command(command):
             return ToolResult.fail(result=f"Command '{command}' is not allowed for security reasons.")
 
+        timeout = self.config.get("timeout", 30)
         try:
-            result = subprocess.run(
+            process = subprocess.Popen(
                 command,
                 shell=True,
-                check=True,  # Raise exception on non-zero return code
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
                 text=True,
-                timeout=self.config.get("timeout", 30)
+                # A process group of its own, so the commands started by the shell can be killed with it
+                start_new_session=os.name == "posix"
             )
-
-            return ToolResult.success({
-                "stdout": result.stdout,
-                "stderr": result.stderr,
-                "return_code": result.returncode,
-                "command": command
-            })
-        except subprocess.CalledProcessError as e:
-            # Preserve the original error handling for CalledProcessError
-            return ToolResult.fail({
-                "stdout": e.stdout,
-                "stderr": e.stderr,
-                "return_code": e.returncode,
-                "command": command
-            })
+            stdout, stderr = self._communicate(process, timeout)
         except subprocess.TimeoutExpired:
-            return ToolResult.fail(result=f"Command timed out after {self.config.get('timeout', 20)} seconds.")
+            return ToolResult.fail(result=f"Command timed out after {timeout} seconds.")
+        except TaskCancelledError as e:
+            return ToolResult.fail(result=f"Command was stopped: task {e.reason}")
         except Exception as e:
             return ToolResult.fail(result=f"Error executing command: {str(e)}")
 
+        result = {
+            "stdout": stdout,
+            "stderr": stderr,
+            "return_code": process.returncode,
+            "command": command
+        }
+        # A non-zero return code is reported as a failure
+        if process.returncode != 0:
+            return ToolResult.fail(result)
+        return ToolResult.success(result)
+
+    def _communicate(self, process: subprocess.Popen, timeout: float):
+        """
+        Wait for the command to finish, killing it when it times out or the run is cancelled.
+
+        :return: The (stdout, stderr) of the command
+        """
+        cancel_token = self.get_cancel_token()
+        deadline = time.time() + timeout
+        while True:
+            wait = deadline - time.time()
+            if cancel_token is not None:
+                # Poll the token while the command runs
+                wait = min(wait, CANCEL_POLL_INTERVAL)
+            try:
+                return process.communicate(timeout=max(wait, 0))
+            except subprocess.TimeoutExpired:
+                cancelled = cancel_token is not None and cancel_token.is_cancelled
+                if not cancelled and time.time() < deadline:
+                    continue
+                self._kill(process)
+                process.communicate()
+                if cancelled:
+                    raise TaskCancelledError(cancel_token.reason)
+                raise
+
+    @staticmethod
+    def _kill(process: subprocess.Popen):
+        """Kill the command together with the processes it started"""
+        if os.name == "posix":
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+                return
+            except OSError:
+                pass
+        process.kill()
+
+    def is_cacheable(self, params: dict) -> bool:
+        """
+        Only read-only commands are cacheable, e.g. listing or reading files.
+
+        :param params: The call params with the command
+        :return: True if the command does not change the system
+        """
+        tool_config = self.config if isinstance(self.config, dict) else {}
+        if not tool_config.get("idempotent", True):
+            return False
+        command = str(params.get("command", "")).strip()
+        # Redirections, command lists and substitutions may write files or run other commands
+        if not command or any(token in command for token in [">", ";", "&", "`", "$(", "\n"]):
+            return False
+        for part in command.split("|"):
+            cmd_parts = part.split()
+            if not cmd_parts or cmd_parts[0].lower() not in self.read_only_command_set:
+                return False
+            if self._writes_files(cmd_parts):
+                return False
+        return True
+
+    def _writes_files(self, cmd_parts: list) -> bool:
+        """
+        Check whether a read-only command is given options that write files, e.g. `sort -o out.txt in.txt`.
+
+        :param cmd_parts: The command and its arguments
+        :return: True if the command may write files or run other commands
+        """
+        base_cmd = cmd_parts[0].lower()
+        args = cmd_parts[1:]
+        if base_cmd == "uniq":
+            # A second file argument is the output file
+            return len([arg for arg in args if not arg.startswith("-")]) > 1
+        write_options = self.write_option_map.get(base_cmd, ())
+        for arg in args:
+            if any(arg.startswith(option) for option in write_options):
+                return True
+            # Short options may be combined, e.g. `sort -ro out.txt`
+            if base_cmd != "find" and "-o" in write_options and arg.startswith("-") \
+                    and not arg.startswith("--") and "o" in arg[1:]:
+                return True
+        return False
+
     def _is_safe_command(self, command: str) -> bool:
         """
         Check if a command is safe to execute.
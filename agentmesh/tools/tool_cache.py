@@ -0,0 +1,106 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from agentmesh.common import config
+
+# Scopes of the tool result cache
+TOOL_CACHE_SCOPES = ("task", "process", "off")
+
+
+class ToolResultCache:
+    """
+    In-memory LRU cache of successful results of tools that declare themselves idempotent. Every entry
+    expires after the TTL of its tool, entries of tools that read mutable state can be dropped as soon
+    as another tool may have changed that state.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        """
+        Initialize the ToolResultCache.
+
+        :param max_entries: Maximum number of results kept.
+        """
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, state_dependent, result)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str):
+        """
+        Look up a cached tool result.
+
+        :param key: The cache key, see BaseTool.get_cache_key.
+        :return: The cached ToolResult, or None on a miss.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, _, result = entry
+                if expires_at is None or expires_at > time.time():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return result
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key: str, result, ttl: Optional[float] = None, state_dependent: bool = False):
+        """
+        Store a tool result.
+
+        :param key: The cache key, see BaseTool.get_cache_key.
+        :param result: The ToolResult to cache.
+        :param ttl: Seconds the result stays valid, None or 0 means for the lifetime of the cache.
+        :param state_dependent: Whether the result must be dropped by invalidate_state_dependent.
+        """
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (expires_at, state_dependent, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_state_dependent(self):
+        """Drop the results that read mutable state, e.g. after a tool with side effects ran."""
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if entry[1]]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_process_cache = None
+_process_cache_lock = threading.Lock()
+
+
+def get_tool_cache_config() -> dict:
+    """Get the `tool_cache` config section, the cache is task-scoped by default."""
+    return config().get("tool_cache") or {}
+
+
+def create_task_tool_cache() -> Optional[ToolResultCache]:
+    """
+    Create the cache used for the tool calls of one task.
+
+    :return: A new cache for the task scope, the shared process cache for the process scope,
+             or None if tool result caching is turned off.
+    """
+    cache_config = get_tool_cache_config()
+    scope = cache_config.get("scope", "task")
+    if scope not in TOOL_CACHE_SCOPES:
+        raise ValueError(f"Invalid tool_cache scope '{scope}', must be one of {TOOL_CACHE_SCOPES}")
+    if scope == "off":
+        return None
+    if scope == "task":
+        return ToolResultCache(max_entries=cache_config.get("max_entries", 256))
+
+    global _process_cache
+    with _process_cache_lock:
+        if _process_cache is None:
+            _process_cache = ToolResultCache(max_entries=cache_config.get("max_entries", 1024))
+        return _process_cache
@@ -0,0 +1,102 @@
+"""
+Per-call overhead of pooled keep-alive connections and the effect of the read timeout.
+
+Starts a local http.server stub of a chat completions endpoint and calls it through LLMModel with the pooled
+keep-alive session of SessionPool, then with one connection per request (`keep_alive: false`). It prints the time
+per call and the connections the stub accepted. Plain HTTP on localhost has no TLS handshake and no network latency,
+so the saving against a real provider is larger.
+
+It then calls an endpoint that answers later than the configured read timeout, and prints how long the call took
+to fail compared with the delay of the endpoint.
+
+Usage: python -m benchmarks.connection_reuse [--calls 200] [--slow-delay 3] [--read-timeout 0.5]
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from agentmesh.models import LLMModel, LLMRequest
+from agentmesh.models.llm.http_session import HttpConfig, SessionPool
+from agentmesh.models.llm.retry import RetryPolicy
+
+REPLY = json.dumps({
+    "id": "chatcmpl-stub", "object": "chat.completion",
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": "ok"}, "finish_reason": "stop"}],
+    "usage": {"prompt_tokens": 5, "completion_tokens": 1, "total_tokens": 6}
+}).encode()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keeps connections open unless the client asks to close them
+    disable_nagle_algorithm = True  # Headers and body are sent apart, Nagle would delay kept-alive replies
+    connections = set()
+    slow_delay = 0.0
+
+    def setup(self):
+        super().setup()
+        StubHandler.connections.add(self.client_address)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path.startswith("/slow"):
+            time.sleep(StubHandler.slow_delay)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(REPLY)))
+        self.end_headers()
+        self.wfile.write(REPLY)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def time_calls(api_base: str, http_config: HttpConfig, calls: int):
+    """Make sequential calls, returning the seconds per call and the connections the stub accepted"""
+    SessionPool.close_all()
+    StubHandler.connections.clear()
+    model = LLMModel("gpt-4o", "stub", api_base, http_config=http_config, retry_policy=RetryPolicy(max_retries=0))
+    request = LLMRequest(messages=[{"role": "user", "content": "ping"}])
+    model.call(request)  # Warm up the imports and the first connection of the pooled session
+    start = time.perf_counter()
+    for _ in range(calls):
+        response = model.call(request)
+        assert not response.is_error, response.get_error_msg()
+    return (time.perf_counter() - start) / calls, len(StubHandler.connections)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--slow-delay", type=float, default=3.0, help="Seconds the slow endpoint waits")
+    parser.add_argument("--read-timeout", type=float, default=0.5)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    api_base = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    try:
+        pooled, pooled_connections = time_calls(api_base, HttpConfig(keep_alive=True), args.calls)
+        closed, closed_connections = time_calls(api_base, HttpConfig(keep_alive=False), args.calls)
+        print(f"{args.calls} sequential calls to {api_base}")
+        print(f"pooled keep-alive:      {pooled * 1000:.2f} ms per call, {pooled_connections} connections")
+        print(f"connection per request: {closed * 1000:.2f} ms per call, {closed_connections} connections")
+        print(f"saved per call:         {(closed - pooled) * 1000:.2f} ms ({1 - pooled / closed:.0%})")
+
+        StubHandler.slow_delay = args.slow_delay
+        model = LLMModel("gpt-4o", "stub", f"{api_base.rsplit('/v1', 1)[0]}/slow/v1",
+                         http_config=HttpConfig(read_timeout=args.read_timeout),
+                         retry_policy=RetryPolicy(max_retries=0))
+        start = time.perf_counter()
+        response = model.call(LLMRequest(messages=[{"role": "user", "content": "ping"}]))
+        elapsed = time.perf_counter() - start
+        print(f"read timeout {args.read_timeout}s:      call failed={response.is_error} after {elapsed:.2f}s, "
+              f"the endpoint answers after {args.slow_delay}s")
+    finally:
+        SessionPool.close_all()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
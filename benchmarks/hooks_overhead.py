@@ -0,0 +1,84 @@
+"""
+Overhead of the lifecycle hooks on the parser hot path.
+
+Streams a recorded reply through the XmlStreamReader of a ReAct step twice: once on a team without hooks and
+once on a team with a registered hook whose on_token does nothing. The fastest of many alternating rounds of each
+is compared, with the garbage collector paused, so noise of the machine cancels out. The end-to-end numbers still
+move by a few percent between processes on a busy machine, so the cost of the hook dispatch is also timed on its own
+and reported as a share of the reader's time per chunk.
+
+Usage: python -m benchmarks.hooks_overhead [--rounds 500] [--chunk-size 8]
+"""
+import argparse
+import contextlib
+import gc
+import io
+import time
+import timeit
+
+from agentmesh.common.utils.hooks import RunHooks
+from agentmesh.protocal import Agent, AgentTeam
+from agentmesh.protocal.agent import XmlStreamReader
+
+# A final answer of a step, so the reader consumes the whole stream
+REPLY = "<thought>" + "Looking at the files of the project before changing them. " * 20 + "</thought>\n" \
+        "<final_answer>" + "The project builds and all of its checks pass. " * 40 + "</final_answer>"
+
+
+class NoopHooks(RunHooks):
+    def on_token(self, agent, text: str):
+        pass
+
+
+def _make_agent(hooks: list) -> Agent:
+    team = AgentTeam("team", "A team", hooks=hooks)
+    team.add(Agent("agent", "system prompt", "An agent"))
+    return team.agents[0]
+
+
+def _stream(agent: Agent, chunks: list) -> float:
+    """Feed the chunks through a new reader, returning the seconds it took"""
+    reader = XmlStreamReader(agent, 0)
+    start = time.perf_counter()
+    for chunk in chunks:
+        if not reader.feed(chunk):
+            break
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=500)
+    parser.add_argument("--chunk-size", type=int, default=8, help="Characters per streamed chunk")
+    args = parser.parse_args()
+
+    chunks = [{"choices": [{"delta": {"content": REPLY[i:i + args.chunk_size]}}]}
+              for i in range(0, len(REPLY), args.chunk_size)]
+    without_hooks, with_hooks = _make_agent([]), _make_agent([NoopHooks()])
+    assert without_hooks._get_hooks() is None and with_hooks._get_hooks() is not None
+
+    baseline, hooked = [], []
+    gc.disable()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            for _ in range(args.rounds):
+                baseline.append(_stream(without_hooks, chunks))
+                hooked.append(_stream(with_hooks, chunks))
+    finally:
+        gc.enable()
+
+    # The dispatch XmlStreamReader.feed makes per chunk when hooks are registered
+    hooks, text = with_hooks._get_hooks(), chunks[0]["choices"][0]["delta"]["content"]
+    calls = 100000
+    dispatch = min(timeit.repeat(lambda: hooks.on_token(with_hooks, text), number=calls, repeat=20)) / calls
+
+    per_chunk = min(baseline) / len(chunks)
+    print(f"chunks per stream:       {len(chunks)}")
+    print(f"without hooks:           {per_chunk * 1e6:.2f} us per chunk")
+    print(f"with a no-op on_token:   {min(hooked) / len(chunks) * 1e6:.2f} us per chunk")
+    print(f"end-to-end difference:   {min(hooked) / min(baseline) - 1:+.2%}")
+    print(f"hook dispatch per chunk: {dispatch * 1e9:.0f} ns, {dispatch / per_chunk:.2%} of the reader")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Tokens and steps per task of the XML reply format and of native tool calls.
+
+Runs every task with a single agent once per tool_call_mode, against a model configured in config.yaml, and prints
+the average ReAct steps, prompt tokens and completion tokens per task of each mode. Only the ReAct steps of the
+agent are counted, the coordinator call is the same in both modes. Needs the API key of the model's provider.
+
+Usage: python -m benchmarks.tool_call_modes --model gpt-4o [--repeat 3]
+"""
+import argparse
+
+from agentmesh.common import load_config, ModelFactory
+from agentmesh.protocal import Agent, AgentTeam
+from agentmesh.protocal.agent import TOOL_CALL_MODES
+from agentmesh.protocal.result import ModelCallPurpose, TokenUsage
+from agentmesh.tools import Calculator, CurrentTime
+
+# Tasks needing one or more tool calls, some of them independent of each other
+TASKS = [
+    "What is (1234 * 5678) - 91011?",
+    "Compute the sum of the squares of 3, 4, 12 and 84, then the square root of that sum.",
+    "What is the current date, and how many days are left until the end of the month?",
+    "What is 17% of 2350, and what is 23% of 1780? Give both results.",
+    "What time is it now, and what is the number of minutes since midnight times 3?",
+]
+
+
+def run_task(model, tool_call_mode: str, task: str):
+    """Run a task with a new single-agent team, returning its TeamResult"""
+    team = AgentTeam("benchmark_team", "Answers questions with the help of tools", model=model, max_steps=15)
+    team.add(Agent("Solver", "You solve the task with the tools, one step at a time.", "Solves the task",
+                   tools=[Calculator(), CurrentTime()], max_steps=10, tool_call_mode=tool_call_mode))
+    return team.run(task, output_mode="logger")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model", default="gpt-4o", help="A model name known to ModelFactory")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs of every task per mode")
+    args = parser.parse_args()
+
+    load_config()
+    model = ModelFactory().get_model(args.model)
+
+    print(f"{'mode':<8} {'tasks':>5} {'failed':>6} {'steps/task':>10} {'prompt/task':>11} {'completion/task':>15}")
+    for mode in TOOL_CALL_MODES:
+        runs, failed, steps, usage = 0, 0, 0, TokenUsage()
+        for _ in range(args.repeat):
+            for task in TASKS:
+                result = run_task(model, mode, task)
+                runs += 1
+                if result.status != "completed" or not result.final_output:
+                    failed += 1
+                for agent_result in result.agent_results:
+                    for call in agent_result.model_calls:
+                        if call.purpose == ModelCallPurpose.REACT_STEP:
+                            steps += 1
+                            usage.add(call.usage)
+        print(f"{mode:<8} {runs:>5} {failed:>6} {steps / runs:>10.2f} {usage.prompt_tokens / runs:>11.0f} "
+              f"{usage.completion_tokens / runs:>15.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+Time to first token and early tool dispatch over a recorded trace of streamed ReAct steps.
+
+Replays the chunks of every step of a trace through the XmlStreamReader of an agent, on the recorded clock, and
+prints per step when the first token arrived, when the reader dispatched the first action and when the stream
+ended. Record one trace per history_mode to compare their time to first token, the append mode keeps the prompt
+prefix stable so providers can serve it from their prefix cache.
+
+Record a trace of a 10-step agent run, which needs the API key of the model's provider:
+    python -m benchmarks.trace_replay --record trace.json --model gpt-4o --history-mode append
+Replay it:
+    python -m benchmarks.trace_replay trace.json
+Replay a generated sample trace, to try the harness without an API key. Its timing is synthetic:
+    python -m benchmarks.trace_replay --sample
+"""
+import argparse
+import contextlib
+import io
+import json
+import queue
+import random
+import threading
+import time
+
+from agentmesh.protocal import Agent, AgentTeam
+from agentmesh.protocal.agent import XmlStreamReader
+
+RECORD_TASK = "Look at the files in the current directory and report how many Python files there are, how many " \
+              "lines the largest one has, and what today's date is. Use a separate tool call for every fact."
+
+_END = object()
+
+
+def record_streams(model, steps: list):
+    """
+    Record the chunks of every streamed call of a model with the milliseconds since its request, into steps.
+    The stream is read to its end on its own thread, also when the agent stops reading it early.
+    """
+    call_stream = model.call_stream
+
+    def recording_call_stream(request):
+        start = time.perf_counter()
+        chunks = []
+        steps.append({"chunks": chunks})
+        received = queue.Queue()
+
+        def read():
+            try:
+                for chunk in call_stream(request):
+                    chunks.append([round((time.perf_counter() - start) * 1000, 1), chunk])
+                    received.put(chunk)
+            finally:
+                received.put(_END)
+
+        threading.Thread(target=read, daemon=True).start()
+        while True:
+            chunk = received.get()
+            if chunk is _END:
+                return
+            yield chunk
+
+    model.call_stream = recording_call_stream
+
+
+def record(path: str, model_name: str, history_mode: str, task: str):
+    from agentmesh.common import load_config, ModelFactory
+    from agentmesh.tools import Calculator, CurrentTime, Terminal
+
+    load_config()
+    model = ModelFactory().get_model(model_name)
+    steps = []
+    team = AgentTeam("trace_team", "Answers questions about the working directory", model=model, max_steps=12)
+    agent = Agent("Inspector", "You inspect the working directory with the tools.", "Inspects files",
+                  tools=[Terminal(), Calculator(), CurrentTime()], max_steps=10, history_mode=history_mode)
+    team.add(agent)
+    # Only the steps of the agent are recorded, the coordinator call is not streamed
+    record_streams(model, steps)
+    team.run(task, output_mode="print")
+    # Let the recording threads read the rest of the last streams
+    time.sleep(2)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"model": model_name, "history_mode": history_mode, "synthetic": False, "steps": steps}, f,
+                  ensure_ascii=False, indent=1)
+    print(f"\nRecorded {len(steps)} steps to {path}")
+
+
+def sample_trace(steps: int = 10, seed: int = 7) -> dict:
+    """A generated trace of tool steps and a final answer, with provider-like but synthetic timing"""
+    rng = random.Random(seed)
+    trace_steps = []
+    for index in range(steps):
+        if index < steps - 1:
+            reply = f"<thought>Step {index + 1}: check the next fact about the project files.</thought>\n" \
+                    f"<action>terminal</action>\n<action_input>{{\"command\": \"wc -l file_{index}.py\"}}"
+        else:
+            reply = "<thought>All facts are known.</thought>\n<final_answer>There are 9 Python files, the " \
+                    "largest has 1704 lines.</final_answer>"
+        clock = rng.uniform(350, 900)  # Time to first token
+        chunks = []
+        for start in range(0, len(reply), 4):
+            chunks.append([round(clock, 1), {"choices": [{"delta": {"content": reply[start:start + 4]}}]}])
+            clock += rng.uniform(8, 25)
+        # The provider ends the stream, then sends the usage
+        clock += rng.uniform(60, 250)
+        chunks.append([round(clock, 1), {"choices": [{"delta": {}, "finish_reason": "stop"}]}])
+        clock += rng.uniform(5, 40)
+        chunks.append([round(clock, 1), {"choices": [], "usage": {"prompt_tokens": 900 + 150 * index,
+                                                                  "completion_tokens": len(reply) // 4}}])
+        trace_steps.append({"chunks": chunks})
+    return {"model": "sample", "history_mode": "append", "synthetic": True, "steps": trace_steps}
+
+
+def replay(trace: dict):
+    team = AgentTeam("trace_team", "Replays a trace")
+    team.add(Agent("agent", "system prompt", "Replays a trace"))
+    agent = team.agents[0]
+
+    print(f"model: {trace.get('model')}, history_mode: {trace.get('history_mode')}"
+          f"{', synthetic timing' if trace.get('synthetic') else ''}")
+    print(f"{'step':>4} {'first token':>12} {'dispatch':>10} {'end':>10} {'saved':>8}")
+    first_tokens, saved_total, end_total = [], 0.0, 0.0
+    for index, step in enumerate(trace["steps"]):
+        chunks = step["chunks"]
+        if not chunks:
+            continue
+        reader = XmlStreamReader(agent, index)
+        first_token, dispatched = None, None
+        with contextlib.redirect_stdout(io.StringIO()):
+            for at, chunk in chunks:
+                if first_token is None and _has_content(chunk):
+                    first_token = at
+                if not reader.feed(chunk):
+                    dispatched = at
+                    break
+        end = chunks[-1][0]
+        saved = end - dispatched if dispatched is not None else 0.0
+        first_tokens.append(first_token or end)
+        saved_total += saved
+        end_total += end
+        print(f"{index + 1:>4} {_ms(first_token):>12} {_ms(dispatched):>10} {_ms(end):>10} {_ms(saved):>8}")
+    if first_tokens:
+        print(f"mean time to first token: {sum(first_tokens) / len(first_tokens):.0f} ms")
+        print(f"time saved by early dispatch: {saved_total:.0f} ms of {end_total:.0f} ms of streaming")
+
+
+def _has_content(chunk) -> bool:
+    if isinstance(chunk, str):
+        return bool(chunk)
+    choices = chunk.get("choices") or [{}]
+    return bool(choices[0].get("delta", {}).get("content"))
+
+
+def _ms(value) -> str:
+    return "-" if value is None else f"{value:.0f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("trace", nargs="?", help="A trace recorded with --record")
+    parser.add_argument("--sample", action="store_true", help="Replay a generated trace with synthetic timing")
+    parser.add_argument("--record", metavar="PATH", help="Record a trace of an agent run to PATH")
+    parser.add_argument("--model", default="gpt-4o", help="The model of the recorded run")
+    parser.add_argument("--history-mode", default="append", help="The history_mode of the recorded agent")
+    parser.add_argument("--task", default=RECORD_TASK, help="The task of the recorded run")
+    args = parser.parse_args()
+
+    if args.record:
+        record(args.record, args.model, args.history_mode, args.task)
+    elif args.sample:
+        replay(sample_trace())
+    elif args.trace:
+        with open(args.trace, encoding="utf-8") as f:
+            replay(json.load(f))
+    else:
+        parser.error("give a trace, --sample or --record")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@ import argparse
 
 from agentmesh.common import logger
 from agentmesh.common import load_config, config, ModelFactory
+from agentmesh.common import Tracer, JsonlSpanExporter, set_tracer
 from agentmesh.protocal import AgentTeam, Agent, Task
 from agentmesh.tools.tool_manager import ToolManager
 
@@ -37,7 +38,9 @@ def create_team_from_config(team_name):
         description=team_config.get("description", ""),
         rule=team_config.get("rule", ""),
         model=team_model,
-        max_steps=team_max_steps
+        max_steps=team_max_steps,
+        plan_mode=team_config.get("plan_mode", "chain"),
+        fold_handoff=team_config.get("fold_handoff", False)
     )
 
     # Create and add agents to the team
@@ -57,7 +60,11 @@ def create_team_from_config(team_name):
             system_prompt=agent_config.get("system_prompt", ""),
             model=agent_model,  # Use agent's model if specified, otherwise will use team's model
             description=agent_config.get("description", ""),
-            max_steps=agent_max_steps
+            max_steps=agent_max_steps,
+            tool_call_mode=agent_config.get("tool_call_mode", "xml"),
+            history_mode=agent_config.get("history_mode", "snapshot"),
+            parallel_tool_calls=agent_config.get("parallel_tool_calls", False),
+            max_tool_workers=agent_config.get("max_tool_workers", 4)
         )
 
         # Add tools to the agent if specified
@@ -101,6 +108,7 @@ def main():
     parser.add_argument("-t", "--team", help="Specify the team to run")
     parser.add_argument("-l", "--list", action="store_true", help="List available teams")
     parser.add_argument("-q", "--query", help="Direct query to run (non-interactive mode)")
+    parser.add_argument("--trace", metavar="PATH", help="Append the trace spans of the runs to a JSONL file")
     args = parser.parse_args()
 
     # Load configuration
@@ -119,6 +127,20 @@ def main():
         parser.print_help()
         return
 
+    tracer = None
+    if args.trace:
+        tracer = Tracer([JsonlSpanExporter(args.trace)])
+        set_tracer(tracer)
+    try:
+        run_team(args)
+    finally:
+        if tracer:
+            set_tracer(None)
+            tracer.shutdown()
+
+
+def run_team(args):
+    """Run the team of the command line arguments, once for a direct query or in interactive mode"""
     # Create team from configuration
     team = create_team_from_config(args.team)
     if not team:
@@ -140,13 +162,9 @@ def main():
     print(f"Number of agents: {len(team.agents)}")
     print("\nEnter your task (type 'exit' to quit):")
 
-    count = 0
-    # Interactive loop
+    # Interactive loop, every task runs on a fresh copy of the team
     while True:
         try:
-            if count > 0:
-                team = create_team_from_config(args.team)
-            count += 1
             user_input = input("> ")
             if user_input.lower() in ["exit", "quit", "q"]:
                 print("Exiting AgentMesh. Goodbye!")
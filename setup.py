@@ -30,7 +30,7 @@ setup(
     python_requires=">=3.7",
     install_requires=requirements,
     extras_require={
-        "full": ["browser-use>=0.1.40"],
+        "full": ["browser-use>=0.1.40", "httpx[http2]>=0.24", "tiktoken>=0.7"],
     },
     include_package_data=True,
 )
@@ -0,0 +1,81 @@
+import asyncio
+import json
+import time
+
+from agentmesh.models import LLMModel, LLMResponse
+from agentmesh.protocal import Agent, AgentTeam
+from agentmesh.tools.base_tool import BaseTool, ToolResult
+
+TOOL_SECONDS = 0.3
+
+
+class SlowLookup(BaseTool):
+    """A blocking tool, arun runs it in an executor"""
+    name = "slow_lookup"
+    description = "Look up a value, slowly"
+    params = {"type": "object", "properties": {"key": {"type": "string"}}, "required": ["key"]}
+
+    def execute(self, params: dict) -> ToolResult:
+        time.sleep(TOOL_SECONDS)
+        return ToolResult.success(f"value of {params['key']} is 42")
+
+
+class AsyncOnlyModel(LLMModel):
+    """Answers with acall only: the agent looks up a value, then answers with it"""
+
+    def __init__(self):
+        super().__init__(model="gpt-4o", api_key="stub", api_base="http://stub.invalid/v1")
+
+    def call(self, request):
+        raise AssertionError("arun must not make blocking model calls")
+
+    async def acall(self, request):
+        await asyncio.sleep(0.01)
+        prompt = json.dumps(request.messages)
+        if request.json_format:
+            content = json.dumps({"id": 0, "subtask": "Look up the answer", "task_short_name": "lookup"})
+        elif "is 42" in prompt:
+            content = "<final_answer>The answer is 42</final_answer>"
+        else:
+            content = "<thought>Look it up</thought>\n<action>slow_lookup</action>\n" \
+                      "<action_input>{\"key\": \"answer\"}</action_input>"
+        return LLMResponse(success=True, data={
+            "choices": [{"message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}
+        })
+
+
+def _make_team() -> AgentTeam:
+    team = AgentTeam(name="async_team", description="Looks up answers", model=AsyncOnlyModel())
+    team.add(Agent(name="Finder", system_prompt="You look up answers", description="Looks up answers",
+                   tools=[SlowLookup()]))
+    return team
+
+
+def test_arun_answers_with_awaited_model_calls():
+    result = asyncio.run(_make_team().arun("What is the answer?"))
+    assert result.status == "completed"
+    assert result.final_output == "The answer is 42"
+    assert result.usage.total_tokens == 3 * 15
+
+
+def test_arun_does_not_block_the_event_loop_on_tools():
+    ticks = []
+
+    async def tick():
+        while True:
+            ticks.append(time.time())
+            await asyncio.sleep(0.02)
+
+    async def run():
+        ticker = asyncio.ensure_future(tick())
+        try:
+            return await _make_team().arun("What is the answer?")
+        finally:
+            ticker.cancel()
+
+    result = asyncio.run(run())
+    assert result.status == "completed"
+    # The loop kept ticking while the tool slept in the executor
+    gaps = [later - earlier for earlier, later in zip(ticks, ticks[1:])]
+    assert max(gaps) < TOOL_SECONDS / 2
@@ -0,0 +1,51 @@
+from agentmesh.models import CachedModel, LLMCache, LLMModel, LLMRequest, LLMResponse
+
+
+class FinishStubModel(LLMModel):
+    """Answers every request with the same content and the given finish_reason, counting the calls"""
+
+    def __init__(self, finish_reason: str):
+        super().__init__(model="gpt-4o", api_key="stub", api_base="http://stub.invalid/v1")
+        self.finish_reason = finish_reason
+        self.calls = 0
+
+    def call(self, request):
+        self.calls += 1
+        return LLMResponse(success=True, data={
+            "choices": [{"message": {"role": "assistant", "content": "partial"}, "finish_reason": self.finish_reason}]
+        })
+
+    def call_stream(self, request):
+        self.calls += 1
+        yield {"choices": [{"delta": {"content": "part"}, "finish_reason": None}]}
+        yield {"choices": [{"delta": {"content": "ial"}, "finish_reason": self.finish_reason}]}
+        # The usage comes after the last choice
+        yield {"choices": [], "usage": {"prompt_tokens": 3, "completion_tokens": 2}}
+
+
+def _request(stream: bool = False) -> LLMRequest:
+    return LLMRequest(messages=[{"role": "user", "content": "hi"}], temperature=0, stream=stream)
+
+
+def test_streamed_reply_keeps_the_upstream_finish_reason():
+    inner = FinishStubModel("content_filter")
+    model = CachedModel(inner, LLMCache())
+    list(model.call_stream(_request(stream=True)))
+    replayed = list(model.call_stream(_request(stream=True)))
+    assert inner.calls == 1
+    assert replayed[0]["choices"][0]["finish_reason"] == "content_filter"
+    assert replayed[0]["choices"][0]["delta"]["content"] == "partial"
+    # The stored completion keeps it too
+    assert model.call(_request()).data["choices"][0]["finish_reason"] == "content_filter"
+    assert inner.calls == 1
+
+
+def test_replies_cut_off_at_max_tokens_are_not_cached():
+    inner = FinishStubModel("length")
+    model = CachedModel(inner, LLMCache())
+    model.call(_request())
+    model.call(_request())
+    list(model.call_stream(_request(stream=True)))
+    list(model.call_stream(_request(stream=True)))
+    assert inner.calls == 4
+    assert model.cache.writes == 0
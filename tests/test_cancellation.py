@@ -0,0 +1,100 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from agentmesh.common import CancellationToken
+from agentmesh.models import HttpConfig, LLMModel, LLMResponse, RetryPolicy
+from agentmesh.protocal import Agent, AgentTeam
+from agentmesh.tools import Terminal
+
+CANCEL_AFTER = 0.5
+DECISION = json.dumps({"id": 0, "subtask": "Wait for the command", "task_short_name": "wait"})
+
+
+class SleepCommandModel(LLMModel):
+    """Selects the only agent, which runs a long command in the terminal"""
+
+    def __init__(self):
+        super().__init__(model="gpt-4o", api_key="stub", api_base="http://stub.invalid/v1")
+
+    def call(self, request):
+        content = DECISION if request.json_format else "<thought>Wait</thought>\n<action>terminal</action>\n" \
+                                                        "<action_input>{\"command\": \"sleep 30\"}</action_input>"
+        return LLMResponse(success=True, data={
+            "choices": [{"message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}
+        })
+
+
+class HangingHandler(BaseHTTPRequestHandler):
+    """
+    A chat completions endpoint that answers the coordinator but not the agent's step. A streamed step gets the
+    first chunk of its reply, a plain one not even the headers.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        if "response_format" not in body:
+            if body.get("stream"):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                chunk = {"choices": [{"index": 0, "delta": {"content": "<thought>"}, "finish_reason": None}]}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.flush()
+            self.server.release.wait(30)
+            self.close_connection = True
+            return
+        reply = json.dumps({"choices": [{"message": {"role": "assistant", "content": DECISION},
+                                         "finish_reason": "stop"}]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def hanging_api_base():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), HangingHandler)
+    server.daemon_threads = True
+    server.release = threading.Event()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/v1"
+    server.release.set()
+    server.shutdown()
+    server.server_close()
+
+
+def _run_cancelled(model: LLMModel, tools: list, output_mode: str = "logger"):
+    """Run a single-agent team, cancel its token from another thread and return the result and the run time"""
+    team = AgentTeam(name="cancel_team", description="Waits", model=model)
+    team.add(Agent(name="Waiter", system_prompt="You wait", description="Waits", tools=tools))
+    token = CancellationToken()
+    threading.Timer(CANCEL_AFTER, token.cancel).start()
+    start = time.time()
+    result = team.run("Wait", output_mode=output_mode, cancel_token=token)
+    return result, time.time() - start
+
+
+def test_cancel_stops_a_running_terminal_command():
+    result, elapsed = _run_cancelled(SleepCommandModel(), [Terminal()])
+    assert result.status == "cancelled"
+    assert elapsed < CANCEL_AFTER + 2
+
+
+@pytest.mark.parametrize("output_mode", ["logger", "print"])
+def test_cancel_stops_a_model_call_waiting_for_the_server(hanging_api_base, output_mode):
+    # The agent's call is streamed in print mode. Without the cancellation it would end at the read timeout
+    model = LLMModel("gpt-4o", "stub", hanging_api_base, http_config=HttpConfig(read_timeout=10),
+                     retry_policy=RetryPolicy(max_retries=0))
+    result, elapsed = _run_cancelled(model, [], output_mode)
+    assert result.status == "cancelled"
+    assert elapsed < CANCEL_AFTER + 2
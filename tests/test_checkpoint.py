@@ -0,0 +1,116 @@
+import asyncio
+import json
+
+from agentmesh.common import CancellationToken, RunHooks
+from agentmesh.common.utils.tracing import InMemorySpanExporter, Tracer, current_span, set_tracer, SPAN_REACT_STEP
+from agentmesh.models import LLMModel, LLMResponse
+from agentmesh.protocal import Agent, AgentTeam, FileCheckpointStore
+from agentmesh.protocal.checkpoint import RECORD_STEP
+from agentmesh.tools.base_tool import BaseTool, ToolResult
+
+
+class CountingLookup(BaseTool):
+    """Looks up a value, counting its executions over all runs"""
+    name = "lookup"
+    description = "Look up a value"
+    params = {"type": "object", "properties": {"key": {"type": "string"}}, "required": ["key"]}
+    executions = []
+
+    def execute(self, params: dict) -> ToolResult:
+        CountingLookup.executions.append(params["key"])
+        return ToolResult.success(f"value of {params['key']} is 42")
+
+
+class LookupModel(LLMModel):
+    """The agent looks up a value, then answers with it. Counts the agent's steps"""
+
+    def __init__(self):
+        super().__init__(model="gpt-4o", api_key="stub", api_base="http://stub.invalid/v1")
+        self.steps = 0
+
+    def call(self, request):
+        if request.json_format:
+            return self._reply(json.dumps({"id": 0, "subtask": "Look up the answer", "task_short_name": "lookup"}))
+        self.steps += 1
+        if "is 42" in json.dumps(request.messages):
+            return self._reply("<final_answer>The answer is 42</final_answer>")
+        return self._reply("<thought>Look it up</thought>\n<action>lookup</action>\n"
+                           "<action_input>{\"key\": \"answer\"}</action_input>")
+
+    async def acall(self, request):
+        return self.call(request)
+
+    @staticmethod
+    def _reply(content: str) -> LLMResponse:
+        return LLMResponse(success=True, data={
+            "choices": [{"message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}
+        })
+
+
+class SpanRecordingStore(FileCheckpointStore):
+    """Notes the span that is current when a step record is written"""
+
+    def __init__(self, directory: str):
+        super().__init__(directory)
+        self.step_spans = []
+
+    def append(self, task_id: str, record: dict):
+        if record["kind"] == RECORD_STEP:
+            span = current_span()
+            self.step_spans.append(span.name if span else None)
+        super().append(task_id, record)
+
+
+class CancelAfterTool(RunHooks):
+    """Interrupts the run once the tool was called, like a crash after the first step"""
+
+    def __init__(self, token: CancellationToken):
+        self.token = token
+
+    def on_tool_end(self, tool, params, result):
+        self.token.cancel()
+
+
+def _make_team(model: LLMModel, store: FileCheckpointStore) -> AgentTeam:
+    team = AgentTeam(name="resume_team", description="Looks up answers", model=model, checkpoint_store=store)
+    team.add(Agent(name="Finder", system_prompt="You look up answers", description="Looks up answers",
+                   tools=[CountingLookup()]))
+    return team
+
+
+def test_interrupted_run_resumes_after_its_last_step(tmp_path):
+    CountingLookup.executions.clear()
+    model = LookupModel()
+    store = FileCheckpointStore(str(tmp_path))
+    token = CancellationToken()
+    team = _make_team(model, store)
+    team.add_hook(CancelAfterTool(token))
+    interrupted = team.run("What is the answer?", cancel_token=token)
+    assert interrupted.status == "cancelled"
+    assert model.steps == 1
+
+    # A new team, as after a restart of the process
+    resumed = _make_team(model, FileCheckpointStore(str(tmp_path))).resume(interrupted.task.id)
+    assert resumed.status == "completed"
+    assert resumed.final_output == "The answer is 42"
+    # The finished step and its tool call are restored, only the answer is new
+    assert model.steps == 2
+    assert CountingLookup.executions == ["answer"]
+
+
+def test_async_steps_are_checkpointed_in_the_context_of_the_step(tmp_path):
+    CountingLookup.executions.clear()
+    store = SpanRecordingStore(str(tmp_path))
+    set_tracer(Tracer([InMemorySpanExporter()]))
+    try:
+        result = asyncio.run(_make_team(LookupModel(), store).arun("What is the answer?"))
+    finally:
+        set_tracer(None)
+    assert result.status == "completed"
+    # The step with the tool call is written, the answer ends the run
+    assert store.step_spans == [SPAN_REACT_STEP]
+    # Resuming a completed run returns the restored result
+    resumed = _make_team(LookupModel(), store).resume(result.task.id)
+    assert resumed.final_output == "The answer is 42"
+    assert CountingLookup.executions == ["answer"]
@@ -0,0 +1,36 @@
+import json
+
+from agentmesh.models import ClaudeModel
+
+
+def _parse(*events) -> list:
+    """Parse Claude stream events as the stream reader does, returning the chunks"""
+    model = ClaudeModel("claude-3-7-sonnet-latest", api_key="stub", api_base="http://stub.invalid/v1")
+    state = {}
+    chunks = [model._parse_stream_event("data: " + json.dumps(event), state) for event in events]
+    return [chunk for chunk in chunks if chunk is not None]
+
+
+def _finish_reason(stop_reason: str):
+    chunks = _parse({"type": "message_start", "message": {"usage": {"input_tokens": 10, "output_tokens": 1}}},
+                    {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": "hi"}},
+                    {"type": "message_delta", "delta": {"stop_reason": stop_reason, "stop_sequence": None},
+                     "usage": {"output_tokens": 5}})
+    assert [chunk["choices"][0]["finish_reason"] for chunk in chunks[:-1]] == [None, None]
+    assert chunks[-1]["usage"]["prompt_tokens"] == 10
+    return chunks[-1]["choices"][0]["finish_reason"]
+
+
+def test_stop_reasons_map_to_finish_reasons():
+    assert _finish_reason("end_turn") == "stop"
+    assert _finish_reason("stop_sequence") == "stop"
+    assert _finish_reason("tool_use") == "tool_calls"
+    assert _finish_reason("max_tokens") == "length"
+
+
+def test_error_events_become_error_chunks():
+    chunks = _parse({"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": "hi"}},
+                    {"type": "error", "error": {"type": "overloaded_error", "message": "Overloaded"}})
+    assert chunks[-1]["error"] is True
+    assert chunks[-1]["status_code"] == 529
+    assert "Overloaded" in chunks[-1]["message"]
@@ -0,0 +1,75 @@
+import contextlib
+import io
+
+from agentmesh.common.utils.hooks import HookDispatcher, RunHooks
+from agentmesh.protocal import Agent, AgentTeam
+from agentmesh.protocal.agent import XmlStreamReader
+
+CHUNKS = ["<thought>Look", " around</thought>\n", "<final_answer>Done", "</final_answer>"]
+
+
+class TokenRecorder(RunHooks):
+    def __init__(self):
+        self.tokens = []
+
+    def on_token(self, agent, text: str):
+        self.tokens.append(text)
+
+
+class FailingTokenHook(RunHooks):
+    def on_token(self, agent, text: str):
+        raise RuntimeError("broken hook")
+
+
+class StartRecorder(RunHooks):
+    """Observes team starts only, so it keeps the default on_token"""
+
+    def __init__(self):
+        self.started = []
+
+    def on_team_start(self, team, task):
+        self.started.append(task)
+
+
+def _make_agent(hooks: list) -> Agent:
+    team = AgentTeam("team", "A team", hooks=hooks)
+    team.add(Agent("agent", "system prompt", "An agent"))
+    return team.agents[0]
+
+
+def _stream(agent: Agent):
+    reader = XmlStreamReader(agent, 0)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for chunk in CHUNKS:
+            reader.feed({"choices": [{"delta": {"content": chunk}}]})
+    return reader
+
+
+def test_empty_hook_dispatcher_is_falsy():
+    assert not HookDispatcher()
+    assert _make_agent([])._get_hooks() is None
+
+
+def test_stream_reader_passes_every_chunk_to_on_token():
+    recorder = TokenRecorder()
+    reader = _stream(_make_agent([recorder]))
+    assert recorder.tokens == CHUNKS
+    assert reader.raw_response == "".join(CHUNKS)
+
+
+def test_failing_token_hook_does_not_stop_the_others():
+    recorder = TokenRecorder()
+    _stream(_make_agent([FailingTokenHook(), recorder]))
+    assert recorder.tokens == CHUNKS
+
+
+def test_only_hooks_overriding_on_token_receive_tokens():
+    recorder, start_recorder = TokenRecorder(), StartRecorder()
+    dispatcher = HookDispatcher([start_recorder])
+    assert dispatcher._token_callbacks == []
+    dispatcher.add(recorder)
+    dispatcher.on_token(None, "text")
+    assert recorder.tokens == ["text"]
+    dispatcher.remove(recorder)
+    dispatcher.on_token(None, "more")
+    assert recorder.tokens == ["text"]
@@ -0,0 +1,74 @@
+import json
+
+from agentmesh.models import LLMModel, LLMResponse
+from agentmesh.protocal import Agent, AgentTeam
+from agentmesh.tools import Calculator
+
+
+class NativeStubModel(LLMModel):
+    """
+    Rejects requests with tools with the given 400 error message, if any. Otherwise it calls the calculator
+    once, natively or in the XML reply format, and then answers with the calculator's result.
+    """
+
+    def __init__(self, tools_error: str = None):
+        super().__init__(model="gpt-4o", api_key="stub", api_base="http://stub.invalid/v1")
+        self.tools_error = tools_error
+        self.requests = []
+
+    def call(self, request):
+        self.requests.append(request)
+        if request.tools and self.tools_error:
+            return LLMResponse(success=False, error_message=self.tools_error, status_code=400)
+        prompt = json.dumps(request.messages)
+        if "42" in prompt:
+            message = {"role": "assistant", "content": "<final_answer>The result is 42</final_answer>"
+                       if not request.tools else "The result is 42"}
+        elif request.tools:
+            message = {"role": "assistant", "content": None, "tool_calls": [{
+                "id": "call_1", "type": "function",
+                "function": {"name": "calculator", "arguments": json.dumps({"expression": "40+2"})}}]}
+        else:
+            message = {"role": "assistant", "content": "<thought>Add</thought>\n<action>calculator</action>\n"
+                                                       "<action_input>{\"expression\": \"40+2\"}</action_input>"}
+        return LLMResponse(success=True, data={
+            "choices": [{"message": message, "finish_reason": "tool_calls" if message.get("tool_calls") else "stop"}],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}
+        })
+
+
+def _make_agent(model: NativeStubModel) -> Agent:
+    """Create the agent of a run, without streaming like teams running in logger mode"""
+    team = AgentTeam("team", "A team", model=model)
+    team.add(Agent("Adder", "You add numbers", "Adds numbers", tools=[Calculator()], tool_call_mode="native"))
+    agent = team.agents[0].copy(team.context)
+    agent.output_mode = "logger"
+    return agent
+
+
+def test_native_tool_calls_run_the_tools():
+    model = NativeStubModel()
+    agent = _make_agent(model)
+    agent.step()
+    assert agent.final_answer == "The result is 42"
+    assert agent.tool_call_mode == "native"
+    assert all(request.tools for request in model.requests)
+
+
+def test_falls_back_to_xml_when_the_provider_rejects_tools():
+    model = NativeStubModel(tools_error="'tools' is not supported with this model.")
+    agent = _make_agent(model)
+    agent.step()
+    assert agent.final_answer == "The result is 42"
+    assert agent.tool_call_mode == "xml"
+    assert model.requests[0].tools and not any(request.tools for request in model.requests[1:])
+
+
+def test_other_bad_requests_keep_the_native_mode():
+    model = NativeStubModel(tools_error="This model's maximum context length is 128000 tokens. "
+                                        "However, your messages resulted in 130000 tokens.")
+    agent = _make_agent(model)
+    result = agent.step()
+    assert result.is_error
+    assert agent.tool_call_mode == "native"
+    assert len(model.requests) == 1
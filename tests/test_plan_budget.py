@@ -0,0 +1,78 @@
+import asyncio
+import json
+import threading
+
+from agentmesh.models import LLMModel, LLMResponse
+from agentmesh.protocal import Agent, AgentTeam
+from agentmesh.protocal.result import AgentActionType
+from agentmesh.tools import Calculator
+
+MAX_STEPS = 4
+PLAN = {"task_short_name": "budget", "subtasks": [
+    {"id": str(i), "agent_id": 0, "subtask": f"Count part {i}", "depends_on": []} for i in range(3)
+]}
+
+
+class LoopingModel(LLMModel):
+    """Plans three independent subtasks, then keeps the agents calling the calculator without ever answering"""
+
+    def __init__(self):
+        super().__init__(model="gpt-4o", api_key="stub", api_base="http://stub.invalid/v1")
+        self.lock = threading.Lock()
+        self.step_calls = 0
+
+    def call(self, request):
+        return self._reply(request)
+
+    async def acall(self, request):
+        return self._reply(request)
+
+    def _reply(self, request) -> LLMResponse:
+        if request.json_format:
+            content = json.dumps(PLAN)
+        else:
+            with self.lock:
+                self.step_calls += 1
+            content = "<thought>Count</thought>\n<action>calculator</action>\n" \
+                      "<action_input>{\"expression\": \"1+1\"}</action_input>"
+        return LLMResponse(success=True, data={
+            "choices": [{"message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}
+        })
+
+
+def _make_team(model: LLMModel, max_steps: int = MAX_STEPS) -> AgentTeam:
+    team = AgentTeam(name="budget_team", description="Counts", model=model, max_steps=max_steps,
+                     plan_mode="parallel")
+    team.add(Agent(name="Counter", system_prompt="You count", description="Counts the parts",
+                   tools=[Calculator()]))
+    return team
+
+
+def _steps_of(result) -> int:
+    return sum(1 for agent_result in result.agent_results for action in agent_result.actions
+               if action.action_type == AgentActionType.TOOL_USE)
+
+
+def test_parallel_wave_stays_within_max_steps():
+    model = LoopingModel()
+    result = _make_team(model).run("Count all parts")
+    assert len(result.agent_results) == 3
+    assert model.step_calls <= MAX_STEPS
+    assert _steps_of(result) <= MAX_STEPS
+
+
+def test_async_parallel_wave_stays_within_max_steps():
+    model = LoopingModel()
+    result = asyncio.run(_make_team(model).arun("Count all parts"))
+    assert len(result.agent_results) == 3
+    assert model.step_calls <= MAX_STEPS
+    assert _steps_of(result) <= MAX_STEPS
+
+
+def test_branches_without_steps_left_are_skipped():
+    model = LoopingModel()
+    result = _make_team(model, max_steps=2).run("Count all parts")
+    # The third subtask would get 0 steps, it does not run
+    assert [agent_result.subtask for agent_result in result.agent_results] == ["Count part 0", "Count part 1"]
+    assert model.step_calls == 2
@@ -0,0 +1,82 @@
+import json
+import threading
+
+from agentmesh.models import LLMModel, LLMResponse
+from agentmesh.protocal import Agent, AgentTeam
+
+
+class PlanStubModel(LLMModel):
+    """
+    Answers the planning call with the given plan. The agents answer their subtask right away, except for
+    subtasks starting with "Fail", whose model call fails.
+    """
+
+    def __init__(self, plan: dict):
+        super().__init__(model="gpt-4o", api_key="stub", api_base="http://stub.invalid/v1")
+        self.plan = plan
+        self.lock = threading.Lock()
+        self.subtasks = []
+
+    def call(self, request):
+        if request.json_format:
+            return self._reply(json.dumps(self.plan))
+        prompt = json.dumps(request.messages)
+        # The answers name the subtask by id, so the outputs in the prompt match no subtask
+        item = next(item for item in self.plan["subtasks"] if item["subtask"] in prompt)
+        with self.lock:
+            self.subtasks.append(item["subtask"])
+        if item["subtask"].startswith("Fail"):
+            return LLMResponse(success=False, error_message="invalid request", status_code=400)
+        return self._reply(f"<final_answer>Done: {item['id']}</final_answer>")
+
+    @staticmethod
+    def _reply(content: str) -> LLMResponse:
+        return LLMResponse(success=True, data={
+            "choices": [{"message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}
+        })
+
+
+def _subtask(subtask_id: str, subtask: str, depends_on: list = None, agent_id: int = 0) -> dict:
+    return {"id": subtask_id, "agent_id": agent_id, "subtask": subtask, "depends_on": depends_on or []}
+
+
+def _run(*subtasks):
+    model = PlanStubModel({"task_short_name": "plan", "subtasks": list(subtasks)})
+    team = AgentTeam(name="plan_team", description="Does the work", model=model, max_steps=10,
+                     plan_mode="parallel")
+    team.add(Agent(name="Worker", system_prompt="You do the work", description="Does the work"))
+    team.add(Agent(name="Reviewer", system_prompt="You review the work", description="Reviews the work"))
+    return team.run("Do the work", output_mode="logger"), model
+
+
+def test_plan_runs_dependent_subtasks_after_their_dependencies():
+    result, model = _run(_subtask("s1", "Write part A"), _subtask("s2", "Write part B"),
+                         _subtask("s3", "Review both parts", ["s1", "s2"], agent_id=1))
+    assert result.status == "completed"
+    assert sorted(model.subtasks[:2]) == ["Write part A", "Write part B"]
+    assert model.subtasks[2] == "Review both parts"
+    assert result.final_output == "Done: s3"
+
+
+def test_plan_with_a_dependency_cycle_fails_the_run():
+    result, model = _run(_subtask("s1", "Write part A", ["s2"]), _subtask("s2", "Write part B", ["s1"]))
+    assert result.status == "failed"
+    assert model.subtasks == []
+
+
+def test_plan_with_an_unknown_agent_id_fails_the_run():
+    result, model = _run(_subtask("s1", "Write part A"), _subtask("s2", "Write part B", agent_id=5))
+    assert result.status == "failed"
+    assert model.subtasks == []
+
+
+def test_subtasks_depending_on_a_failed_branch_are_skipped():
+    result, model = _run(_subtask("s1", "Fail to write part A"), _subtask("s2", "Write part B"),
+                         _subtask("s3", "Review part A", ["s1"], agent_id=1),
+                         _subtask("s4", "Summarize the review", ["s3"]),
+                         _subtask("s5", "Review part B", ["s2"], agent_id=1))
+    # The subtasks after the failed one do not run, the independent ones do
+    assert sorted(model.subtasks) == ["Fail to write part A", "Review part B", "Write part B"]
+    assert [agent_result.subtask for agent_result in result.agent_results] == \
+           ["Fail to write part A", "Write part B", "Review part B"]
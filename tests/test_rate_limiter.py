@@ -0,0 +1,64 @@
+import asyncio
+import threading
+import time
+
+from agentmesh.common import CancellationToken
+from agentmesh.models import LLMModel, LLMRequest, LLMResponse, RateLimiter
+
+
+class SlowPostModel(LLMModel):
+    """Answers every call after `delay` seconds, without a server"""
+
+    def __init__(self, rate_limiter: RateLimiter, delay: float = 0.0):
+        super().__init__(model="gpt-4o", api_key="stub", api_base="http://stub.invalid/v1",
+                         rate_limiter=rate_limiter)
+        self.delay = delay
+
+    def _post(self, request, reserved):
+        time.sleep(self.delay)
+        return LLMResponse(success=True, data={"choices": [{"message": {"content": "ok"}}]})
+
+    async def _apost(self, request, reserved):
+        await asyncio.sleep(self.delay)
+        return LLMResponse(success=True, data={"choices": [{"message": {"content": "ok"}}]})
+
+
+def _request(cancel_token=None) -> LLMRequest:
+    return LLMRequest(messages=[{"role": "user", "content": "hi"}], cancel_token=cancel_token)
+
+
+def test_budget_is_reserved_before_the_slot():
+    limiter = RateLimiter("test_budget_order", rpm=600, max_concurrency=1)
+    in_flight = []
+    acquire = limiter.acquire
+
+    def recording_acquire(tokens=0):
+        in_flight.append(limiter.in_flight)
+        return acquire(tokens)
+
+    limiter.acquire = recording_acquire
+    model = SlowPostModel(limiter)
+    assert model.call(_request()).success
+    assert in_flight == [0]
+
+
+def test_async_slot_wait_stops_when_the_token_is_cancelled():
+    limiter = RateLimiter("test_async_slot_cancel", max_concurrency=1)
+    model = SlowPostModel(limiter, delay=1.0)
+
+    async def run():
+        holder = asyncio.ensure_future(model.acall(_request()))
+        await asyncio.sleep(0.1)
+        token = CancellationToken()
+        # Cancelled from another thread, like a team run stopped by the caller
+        threading.Timer(0.2, token.cancel).start()
+        start = time.time()
+        response = await model.acall(_request(token))
+        waited = time.time() - start
+        assert (await holder).success
+        return response, waited
+
+    response, waited = asyncio.run(run())
+    assert response.status_code == 499
+    assert waited < 0.8
+    assert limiter.in_flight == 0
@@ -0,0 +1,147 @@
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from agentmesh.common.utils.hooks import RunHooks
+from agentmesh.models import LLMModel, LLMResponse
+from agentmesh.protocal import Agent, AgentTeam
+from agentmesh.tools import Calculator
+
+TASKS = [f"Summarize the findings of TASK-{i}" for i in range(24)]
+TASK_PATTERN = re.compile(r"TASK-(\d+)")
+# Runs that mix up their state may never end, they time out instead
+RUN_TIMEOUT = 10
+
+
+class StubModel(LLMModel):
+    """
+    Answers every request from its prompt without network access: the coordinator selects the researcher,
+    the researcher calls the calculator once and answers, then the writer answers and the chain ends.
+    Replies are delayed at random, so concurrent runs interleave.
+    """
+
+    def __init__(self):
+        super().__init__(model="gpt-4o", api_key="stub", api_base="http://stub.invalid/v1")
+
+    def call(self, request):
+        time.sleep(random.uniform(0, 0.01))
+        return self._reply(request)
+
+    async def acall(self, request):
+        await asyncio.sleep(random.uniform(0, 0.01))
+        return self._reply(request)
+
+    def _reply(self, request) -> LLMResponse:
+        prompt = json.dumps(request.messages, ensure_ascii=False)
+        task = TASK_PATTERN.search(prompt).group(0)
+        number = int(task.split("-")[1])
+        if request.json_format and "team decision expert" in prompt:
+            # Runs of the writer have the writer's output in the decision prompt
+            content = {"id": -1} if f"article on {task}" in prompt else \
+                {"id": 1, "subtask": f"Write the article on {task}"}
+        elif request.json_format:
+            content = {"id": 0, "subtask": f"Research {task}", "task_short_name": task.lower()}
+        elif "Your role: Writer" in prompt:
+            content = f"<final_answer>The article on {task}</final_answer>"
+        elif str(1000 + number) in prompt:
+            content = f"<final_answer>Notes on {task}: {1000 + number}</final_answer>"
+        else:
+            content = f"<thought>Count {task}</thought>\n<action>calculator</action>\n" \
+                      f"<action_input>{{\"expression\": \"1000+{number}\"}}</action_input>"
+        if not isinstance(content, str):
+            content = json.dumps(content)
+        return LLMResponse(success=True, data={
+            "choices": [{"message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}
+        })
+
+
+class RunRecorder(RunHooks):
+    """Records the per-run state of every run as the runs end"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.agent_outputs = {}  # task -> texts of the outputs in the team context of its run
+        self.captured_actions = []  # (task, texts of the actions an agent captured in its run)
+
+    def on_agent_end(self, agent, agent_result):
+        with self.lock:
+            self.captured_actions.append((agent.team_context.user_task,
+                                          [str(action.content) for action in agent.captured_actions]))
+
+    def on_team_end(self, team, result):
+        with self.lock:
+            self.agent_outputs[result.task.get_text()] = [output.output for output in team.context.agent_outputs]
+
+
+def _make_team(recorder: RunRecorder) -> AgentTeam:
+    model = StubModel()
+    team = AgentTeam(name="research_team", description="Researches and writes", model=model, max_steps=10,
+                     hooks=[recorder])
+    team.add(Agent(name="Researcher", system_prompt="You research", description="Researches the task",
+                   tools=[Calculator()]))
+    team.add(Agent(name="Writer", system_prompt="You write", description="Writes the article"))
+    return team
+
+
+def _task_ids(text: str) -> set:
+    return set(TASK_PATTERN.findall(text))
+
+
+def _assert_isolated(team: AgentTeam, results: list, recorder: RunRecorder):
+    assert sorted(result.task.get_text() for result in results) == sorted(TASKS)
+    for result in results:
+        own = _task_ids(result.task.get_text())
+        assert result.status == "completed"
+        # Everything the run produced only mentions its own task
+        assert _task_ids(json.dumps(result.to_dict(), ensure_ascii=False)) == own
+        assert [agent_result.agent_name for agent_result in result.agent_results] == ["Researcher", "Writer"]
+        assert result.final_output == f"The article on TASK-{own.pop()}"
+
+    assert len(recorder.agent_outputs) == len(TASKS)
+    for task, outputs in recorder.agent_outputs.items():
+        assert len(outputs) == 2
+        assert all(_task_ids(output) == _task_ids(task) for output in outputs)
+    assert len(recorder.captured_actions) == 2 * len(TASKS)
+    for task, actions in recorder.captured_actions:
+        assert actions and all(_task_ids(action) <= _task_ids(task) for action in actions)
+
+    # The template team and its agents hold no state of any run
+    assert team.context.agent_outputs == []
+    assert team.context.current_steps == 0
+    for agent in team.agents:
+        assert agent.subtask == ""
+        assert agent.action_history == []
+        assert agent.captured_actions == []
+        assert agent.final_answer == ""
+        assert agent.conversation_history == []
+
+
+def test_threads_isolate_concurrent_runs():
+    recorder = RunRecorder()
+    team = _make_team(recorder)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda task: team.run(task, timeout=RUN_TIMEOUT), TASKS))
+    _assert_isolated(team, results, recorder)
+
+
+def test_run_many_isolates_concurrent_runs():
+    recorder = RunRecorder()
+    team = _make_team(recorder)
+    results = list(team.run_many(TASKS, concurrency=8, timeout=RUN_TIMEOUT))
+    _assert_isolated(team, results, recorder)
+
+
+def test_arun_isolates_concurrent_runs():
+    recorder = RunRecorder()
+    team = _make_team(recorder)
+
+    async def run_all():
+        return await asyncio.gather(*(team.arun(task, timeout=RUN_TIMEOUT) for task in TASKS))
+
+    results = asyncio.run(run_all())
+    _assert_isolated(team, results, recorder)
@@ -0,0 +1,108 @@
+import json
+import re
+import threading
+
+from agentmesh.common.utils.cancellation import CANCELLED_STATUS_CODE
+from agentmesh.models import LLMModel, LLMResponse
+from agentmesh.protocal import Agent, AgentTeam, BatchStats
+
+# A task "Wait 0.3 for job-1" is answered after 0.3 seconds
+TASK_PATTERN = re.compile(r"Wait ([\d.]+) for (job-\d+)")
+TOKENS_PER_CALL = 15
+
+
+class WaitingModel(LLMModel):
+    """
+    Selects the only agent, which answers after the delay named in its task. The wait ends early when the run
+    is cancelled, like a real model call. Records the agent steps in flight at the same time.
+    """
+
+    def __init__(self):
+        super().__init__(model="gpt-4o", api_key="stub", api_base="http://stub.invalid/v1")
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def call(self, request):
+        prompt = json.dumps(request.messages)
+        delay, job = TASK_PATTERN.search(prompt).groups()
+        if request.json_format:
+            # The coordinator selects the agent, a single agent has no next member to decide on
+            return self._reply(json.dumps({"id": 0, "subtask": f"Wait {delay} for {job}", "task_short_name": job}))
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if request.cancel_token.wait(float(delay)):
+                return LLMResponse(success=False, error_message=f"Request {request.cancel_token.reason}",
+                                   status_code=CANCELLED_STATUS_CODE)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+        return self._reply(f"<final_answer>Done with {job}</final_answer>")
+
+    @staticmethod
+    def _reply(content: str) -> LLMResponse:
+        return LLMResponse(success=True, data={
+            "choices": [{"message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": TOKENS_PER_CALL}
+        })
+
+
+def _make_team(model: LLMModel) -> AgentTeam:
+    team = AgentTeam(name="batch_team", description="Waits for jobs", model=model)
+    team.add(Agent(name="Waiter", system_prompt="You wait for jobs", description="Waits for jobs"))
+    return team
+
+
+def _job(result) -> str:
+    return TASK_PATTERN.search(result.task.get_text()).group(2)
+
+
+def test_results_are_yielded_in_the_order_runs_complete():
+    tasks = ["Wait 0.6 for job-0", "Wait 0.05 for job-1", "Wait 0.3 for job-2"]
+    results = list(_make_team(WaitingModel()).run_many(tasks, concurrency=3))
+    assert [_job(result) for result in results] == ["job-1", "job-2", "job-0"]
+    assert all(result.status == "completed" for result in results)
+
+
+def test_runs_are_capped_at_the_concurrency():
+    model = WaitingModel()
+    taken = []
+
+    def tasks():
+        for index in range(6):
+            taken.append(index)
+            yield f"Wait 0.1 for job-{index}"
+
+    results = _make_team(model).run_many(tasks(), concurrency=2)
+    next(results)
+    # Tasks are taken from the iterable only when a worker is free
+    assert len(taken) <= 3
+    assert len(list(results)) == 5
+    assert model.max_in_flight == 2
+
+
+def test_run_that_exceeds_its_timeout_is_stopped():
+    tasks = ["Wait 5 for job-0", "Wait 0.05 for job-1"]
+    stats = BatchStats()
+    results = list(_make_team(WaitingModel()).run_many(tasks, concurrency=2, timeout=0.5, stats=stats))
+    assert {_job(result): result.status for result in results} == {"job-0": "timeout", "job-1": "completed"}
+    assert stats.elapsed < 3
+    assert stats.statuses == {"timeout": 1, "completed": 1}
+
+
+def test_batch_stats_count_the_runs():
+    tasks = [f"Wait 0.05 for job-{index}" for index in range(5)]
+    stats = BatchStats()
+    results = list(_make_team(WaitingModel()).run_many(tasks, concurrency=2, stats=stats))
+    assert stats.tasks == 5
+    assert stats.statuses == {"completed": 5}
+    assert stats.latencies == [result.execution_time for result in results]
+    # Every run makes the coordinator call and the agent step
+    assert stats.total_tokens == sum(result.usage.total_tokens for result in results) == 5 * 2 * TOKENS_PER_CALL
+    assert stats.elapsed >= max(stats.latencies)
+    assert stats.p50_latency <= stats.p95_latency == max(stats.latencies)
+    summary = stats.to_dict()
+    assert summary["tasks_per_second"] == stats.tasks / stats.elapsed
+    assert summary["tokens_per_second"] == stats.total_tokens / stats.elapsed
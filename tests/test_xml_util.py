@@ -0,0 +1,75 @@
+import contextlib
+import io
+
+from agentmesh.common.utils.xml_util import XmlResParser
+
+TWO_CALLS = "<thought>Search both</thought>\n" \
+            "<action>google_search</action>\n<action_input>{\"query\": \"first\"}</action_input>\n" \
+            "<action>google_search</action>\n<action_input>{\"query\": \"second\"}</action_input>\n" \
+            "Observation:"
+
+
+def _parser(*chunks, parallel_tool_calls=False) -> XmlResParser:
+    parser = XmlResParser(parallel_tool_calls=parallel_tool_calls)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for chunk in chunks:
+            parser.process_chunk(chunk)
+    return parser
+
+
+def _parsed_data(parser: XmlResParser):
+    """Get the parsed data and what get_parsed_data printed"""
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        parsed = parser.get_parsed_data()
+    return parsed, out.getvalue()
+
+
+def test_several_tool_calls_are_collected_in_parallel_mode():
+    parsed, printed = _parsed_data(_parser(TWO_CALLS, parallel_tool_calls=True))
+    assert parsed["actions"] == [{"action": "google_search", "action_input": {"query": "first"}},
+                                 {"action": "google_search", "action_input": {"query": "second"}}]
+    # The last call is printed like a single one, the others are left to the caller
+    assert printed.count("google_search") == 1
+
+
+def test_several_tool_calls_are_not_collected_without_parallel_mode():
+    parsed, printed = _parsed_data(_parser(TWO_CALLS))
+    assert "actions" not in parsed
+    assert printed.count("google_search") == 1
+
+
+def test_tool_calls_end_at_text_between_them():
+    reply = "<action>calculator</action><action_input>{\"expression\": \"1+1\"}</action_input>\n" \
+            "Observation: 2\n<action>calculator</action><action_input>{\"expression\": \"2+2\"}</action_input>"
+    assert _parser(reply).get_tool_calls() == [{"action": "calculator", "action_input": {"expression": "1+1"}}]
+
+
+def test_tool_call_is_complete_once_the_json_input_is_closed():
+    parser = _parser("<action>terminal</action>\n<action_input>{\"command\": \"echo {\"")
+    assert not parser.is_tool_call_complete()
+    parser = _parser("<action>terminal</action>\n<action_input>{\"command\": \"echo }\"}")
+    assert parser.is_tool_call_complete()
+    # The closing tag is streamed in pieces, the content is still the closed object
+    parser = _parser("<action>terminal</action>\n<action_input>{\"command\": \"ls\"}\n</action_in")
+    assert parser.is_tool_call_complete()
+
+
+def test_tool_call_is_not_complete_with_text_after_the_json_input():
+    parser = _parser("<action>terminal</action>\n<action_input>{\"command\": \"ls\"} {\"command\": \"pwd\"}")
+    assert not parser.is_tool_call_complete()
+    parser = _parser("<action>terminal</action>\n<action_input>{\"command\": \"ls\"} and }")
+    assert not parser.is_tool_call_complete()
+
+
+def test_tool_call_is_complete_once_the_input_tag_is_closed():
+    parser = _parser("<action>current_time</action>\n<action_input>null</action_input>")
+    assert parser.is_tool_call_complete()
+    assert not _parser("<action>null</action>\n<action_input>{}").is_tool_call_complete()
+
+
+def test_tool_batch_is_complete_once_the_reply_moves_past_the_calls():
+    reply = TWO_CALLS[:TWO_CALLS.rindex("Observation:")]
+    assert not _parser(reply, parallel_tool_calls=True).is_tool_batch_complete()
+    assert not _parser(reply + "<act", parallel_tool_calls=True).is_tool_batch_complete()
+    assert _parser(TWO_CALLS, parallel_tool_calls=True).is_tool_batch_complete()